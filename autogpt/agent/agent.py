@@ -1,3 +1,6 @@
+import asyncio
+import threading
+
 from colorama import Fore, Style
 
 from autogpt.app import execute_command, get_command
@@ -48,6 +51,10 @@ class Agent:
         self.next_action_count = next_action_count
         self.system_prompt = system_prompt
         self.triggering_prompt = triggering_prompt
+        # Memories are written on an event loop of their own, so that the write
+        # of one step overlaps with the completion request of the next.
+        self._memory_loop = None
+        self._memory_write = None
 
     def start_interaction_loop(self):
         # Interaction Loop
@@ -181,7 +188,7 @@ class Agent:
                 f"\nHuman Feedback: {user_input} "
             )
 
-            self.memory.add(memory_to_add)
+            self.add_memory(memory_to_add, {"kind": "interaction"})
 
             # Check if there's a result from the command append it to the message
             # history
@@ -195,3 +202,30 @@ class Agent:
                 logger.typewriter_log(
                     "SYSTEM: ", Fore.YELLOW, "Unable to execute command"
                 )
+
+        self.wait_for_memory()
+
+    def add_memory(self, data, metadata=None):
+        """Start adding a memory in the background, once the previous one is in.
+
+        Args:
+            data: The data to add.
+            metadata: The metadata fields of the data.
+        """
+        self.wait_for_memory()
+        if self._memory_loop is None:
+            self._memory_loop = asyncio.new_event_loop()
+            threading.Thread(target=self._memory_loop.run_forever, daemon=True).start()
+        self._memory_write = asyncio.run_coroutine_threadsafe(
+            self.memory.aadd(data, metadata), self._memory_loop
+        )
+
+    def wait_for_memory(self):
+        """Wait until the memory being added in the background is in."""
+        if self._memory_write is None:
+            return
+        try:
+            self._memory_write.result()
+        except Exception as e:
+            logger.error("Error adding to memory: \n", str(e))
+        self._memory_write = None
@@ -143,7 +143,7 @@ def execute_command(command_name: str, arguments):
             return safe_message.decode("utf-8")
         elif command_name == "memory_add":
             memory = get_memory(CFG)
-            return memory.add(arguments["string"])
+            return memory.add(arguments["string"], {"kind": "note"})
         elif command_name == "start_agent":
             return start_agent(
                 arguments["name"], arguments["task"], arguments["prompt"]
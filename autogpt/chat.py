@@ -4,6 +4,7 @@ from openai.error import RateLimitError
 
 from autogpt import token_counter
 from autogpt.config import Config
+from autogpt.embedding_cache import get_embedding_cache
 from autogpt.llm_utils import create_chat_completion
 from autogpt.logs import logger
 
@@ -82,10 +83,21 @@ def chat_with_ai(
             relevant_memory = (
                 ""
                 if len(full_message_history) == 0
-                else permanent_memory.get_relevant(str(full_message_history[-9:]), 10)
+                else [
+                    memory.text
+                    for memory in permanent_memory.get_relevant_scored(
+                        str(full_message_history[-9:]),
+                        10,
+                        min_score=cfg.memory_min_score,
+                        mmr_lambda=cfg.memory_mmr_lambda,
+                    )
+                ]
             )
 
             logger.debug(f"Memory Stats: {permanent_memory.get_stats()}")
+            embedding_cache = get_embedding_cache()
+            if embedding_cache is not None:
+                logger.debug(f"Embedding Cache Stats: {embedding_cache.stats()}")
 
             (
                 next_message_to_add_index,
@@ -107,7 +107,7 @@ def ingest_file(
     maximum length and overlap, and adding the chunks to the memory storage.
 
     :param filename: The name of the file to ingest
-    :param memory: An object with an add() method to store the chunks in memory
+    :param memory: An object with an add_many() method to store the chunks in memory
     :param max_length: The maximum length of each chunk, default is 4000
     :param overlap: The number of overlapping characters between chunks, default is 200
     """
@@ -120,13 +120,17 @@ def ingest_file(
         chunks = list(split_file(content, max_length=max_length, overlap=overlap))
 
         num_chunks = len(chunks)
-        for i, chunk in enumerate(chunks):
-            print(f"Ingesting chunk {i + 1} / {num_chunks} into memory")
-            memory_to_add = (
+        print(f"Ingesting {num_chunks} chunks into memory")
+        memory.add_many(
+            [
                 f"Filename: {filename}\n" f"Content part#{i + 1}/{num_chunks}: {chunk}"
-            )
-
-            memory.add(memory_to_add)
+                for i, chunk in enumerate(chunks)
+            ],
+            [
+                {"source": filename, "kind": "file_content", "chunk": i}
+                for i in range(num_chunks)
+            ],
+        )
 
         print(f"Done ingesting {num_chunks} chunks from {filename}.")
     except Exception as e:
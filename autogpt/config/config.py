@@ -67,6 +67,12 @@ class Config(metaclass=Singleton):
 
         self.pinecone_api_key = os.getenv("PINECONE_API_KEY")
         self.pinecone_region = os.getenv("PINECONE_ENV")
+        # Defaults to MEMORY_INDEX and the agent's name, so that every agent
+        # has its own.
+        self.pinecone_namespace = os.getenv("PINECONE_NAMESPACE", "")
+        self.wipe_pinecone_on_start = (
+            os.getenv("WIPE_PINECONE_ON_START", "False") == "True"
+        )
 
         self.weaviate_host = os.getenv("WEAVIATE_HOST")
         self.weaviate_port = os.getenv("WEAVIATE_PORT")
@@ -79,10 +85,33 @@ class Config(metaclass=Singleton):
         self.use_weaviate_embedded = (
             os.getenv("USE_WEAVIATE_EMBEDDED", "False") == "True"
         )
+        # The batch new objects are added to, and how it is sent.
+        self.weaviate_batch_size = int(os.getenv("WEAVIATE_BATCH_SIZE", 100))
+        self.weaviate_batch_dynamic = (
+            os.getenv("WEAVIATE_BATCH_DYNAMIC", "True") == "True"
+        )
+        self.weaviate_batch_workers = int(os.getenv("WEAVIATE_BATCH_WORKERS", 1))
+        # Search results must be this certain, or this close when a distance is set.
+        self.weaviate_certainty = float(os.getenv("WEAVIATE_CERTAINTY", 0.7))
+        weaviate_distance = os.getenv("WEAVIATE_DISTANCE")
+        self.weaviate_distance = float(weaviate_distance) if weaviate_distance else None
 
         # milvus configuration, e.g., localhost:19530.
         self.milvus_addr = os.getenv("MILVUS_ADDR", "localhost:19530")
         self.milvus_collection = os.getenv("MILVUS_COLLECTION", "autogpt")
+        # The partition of the collection this agent reads and writes.
+        self.milvus_partition = os.getenv("MILVUS_PARTITION", "")
+        # New memories are inserted this many at a time, or after this many seconds.
+        self.milvus_write_buffer = int(os.getenv("MILVUS_WRITE_BUFFER", 0))
+        self.milvus_flush_interval = float(os.getenv("MILVUS_FLUSH_INTERVAL", 5))
+        self.milvus_index_type = os.getenv("MILVUS_INDEX_TYPE", "HNSW")
+        self.milvus_hnsw_m = int(os.getenv("MILVUS_HNSW_M", 8))
+        self.milvus_hnsw_ef_construction = int(
+            os.getenv("MILVUS_HNSW_EF_CONSTRUCTION", 64)
+        )
+        self.milvus_ivf_nlist = int(os.getenv("MILVUS_IVF_NLIST", 128))
+        self.milvus_search_ef = int(os.getenv("MILVUS_SEARCH_EF", 64))
+        self.milvus_search_nprobe = int(os.getenv("MILVUS_SEARCH_NPROBE", 8))
 
         self.image_provider = os.getenv("IMAGE_PROVIDER")
         self.image_size = int(os.getenv("IMAGE_SIZE", 256))
@@ -113,10 +142,71 @@ class Config(metaclass=Singleton):
         self.redis_port = os.getenv("REDIS_PORT", "6379")
         self.redis_password = os.getenv("REDIS_PASSWORD", "")
         self.wipe_redis_on_start = os.getenv("WIPE_REDIS_ON_START", "True") == "True"
+        self.redis_max_connections = int(os.getenv("REDIS_MAX_CONNECTIONS", 0))
+        # New memories are written to redis this many at a time.
+        self.redis_write_buffer = int(os.getenv("REDIS_WRITE_BUFFER", 0))
+        # The vector index of redis: HNSW or FLAT, and how vectors are stored.
+        self.redis_index_algorithm = os.getenv("REDIS_INDEX_ALGORITHM", "HNSW")
+        self.redis_vector_type = os.getenv("REDIS_VECTOR_TYPE", "FLOAT32")
+        self.redis_hnsw_m = int(os.getenv("REDIS_HNSW_M", 16))
+        self.redis_hnsw_ef_construction = int(
+            os.getenv("REDIS_HNSW_EF_CONSTRUCTION", 200)
+        )
+        self.redis_hnsw_ef_runtime = int(os.getenv("REDIS_HNSW_EF_RUNTIME", 10))
         self.memory_index = os.getenv("MEMORY_INDEX", "auto-gpt")
         # Note that indexes must be created on db 0 in redis, this is not configurable.
 
         self.memory_backend = os.getenv("MEMORY_BACKEND", "local")
+        # Memories scoring below this are not put into the context.
+        self.memory_min_score = float(os.getenv("MEMORY_MIN_SCORE", 0.0))
+        # Below 1, relevant memories are re-ranked for diversity (MMR).
+        self.memory_mmr_lambda = float(os.getenv("MEMORY_MMR_LAMBDA", 1.0))
+        # Skip memories that repeat or nearly repeat a stored one.
+        self.memory_dedup = os.getenv("MEMORY_DEDUP", "False") == "True"
+        self.memory_dedup_threshold = float(os.getenv("MEMORY_DEDUP_THRESHOLD", 0.98))
+        # The hybrid backend fuses keyword search with this vector backend.
+        self.hybrid_vector_backend = os.getenv("HYBRID_VECTOR_BACKEND", "local")
+        self.hybrid_rrf_k = int(os.getenv("HYBRID_RRF_K", 60))
+        self.hybrid_lexical_skip_score = float(
+            os.getenv("HYBRID_LEXICAL_SKIP_SCORE", 0.0)
+        )
+        # The tiered backend keeps a hot in-process tier in front of this backend.
+        self.tiered_remote_backend = os.getenv("TIERED_REMOTE_BACKEND", "redis")
+        self.tiered_hot_size = int(os.getenv("TIERED_HOT_SIZE", 1000))
+        self.tiered_hot_min_score = float(os.getenv("TIERED_HOT_MIN_SCORE", 0.9))
+        self.tiered_write_behind = os.getenv("TIERED_WRITE_BEHIND", "True") == "True"
+
+        # Approximate nearest neighbour search for the local memory backend.
+        self.local_ann = os.getenv("LOCAL_ANN", "False") == "True"
+        self.local_ann_min_rows = int(os.getenv("LOCAL_ANN_MIN_ROWS", 10000))
+        self.local_ann_lists = int(os.getenv("LOCAL_ANN_LISTS", 0))
+        self.local_ann_probe = int(os.getenv("LOCAL_ANN_PROBE", 16))
+        self.local_embedding_dtype = os.getenv("LOCAL_EMBEDDING_DTYPE", "float32")
+        self.local_embedding_rescore = (
+            os.getenv("LOCAL_EMBEDDING_RESCORE", "True") == "True"
+        )
+        # Bound the local memory, evicting memories by a policy when it is full.
+        self.local_max_memories = int(os.getenv("LOCAL_MAX_MEMORIES", 0))
+        self.local_max_bytes = int(os.getenv("LOCAL_MAX_BYTES", 0))
+        self.local_eviction_policy = os.getenv("LOCAL_EVICTION_POLICY", "lru")
+        self.local_eviction_archive = (
+            os.getenv("LOCAL_EVICTION_ARCHIVE", "False") == "True"
+        )
+
+        # The model texts are embedded with: openai, or hashing and
+        # sentence-transformers, which run locally.
+        self.embedding_provider = os.getenv("EMBEDDING_PROVIDER", "openai")
+        self.embedding_model = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.embedding_dimension = int(os.getenv("EMBEDDING_DIMENSION", 384))
+
+        # Embeddings of identical texts are looked up here instead of recomputed.
+        self.embedding_cache = os.getenv("EMBEDDING_CACHE", "True") == "True"
+        self.embedding_cache_path = os.getenv(
+            "EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"
+        )
+        self.embedding_cache_max_entries = int(
+            os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 10000)
+        )
         # Initialize the OpenAI API client
         openai.api_key = self.openai_api_key
 
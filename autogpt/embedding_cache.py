@@ -0,0 +1,158 @@
+"""A persistent cache for embeddings, keyed by a hash of the model and the text."""
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Callable
+
+from autogpt.config import Config
+
+
+class EmbeddingCache:
+    """Stores embeddings in an SQLite file so that identical texts are embedded once.
+
+    Entries are keyed by sha256(model, text). Every hit refreshes the entry's
+    last-used time and the least recently used entries are evicted once the cache
+    holds more than `max_entries` of them.
+    """
+
+    def __init__(self, filename: str, max_entries: int) -> None:
+        self.filename = filename
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cnx = sqlite3.connect(filename, check_same_thread=False)
+        self._cnx.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._cnx.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used"
+            " ON embeddings (last_used)"
+        )
+        self._cnx.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """Look up the cached embeddings of texts, None for the ones not cached."""
+        keys = [self.key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay below SQLite's limit on the number of query parameters.
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ", ".join("?" * len(batch))
+                found.update(
+                    self._cnx.execute(
+                        "SELECT key, vector FROM embeddings"
+                        f" WHERE key IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                )
+            if found:
+                now = time.time()
+                self._cnx.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._cnx.commit()
+
+        vectors = [
+            array("f", found[key]).tolist() if key in found else None for key in keys
+        ]
+        hits = sum(vector is not None for vector in vectors)
+        self.hits += hits
+        self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(
+        self, model: str, texts: list[str], vectors: list[list[float]]
+    ) -> None:
+        """Store the embeddings of texts, evicting the least recently used ones."""
+        now = time.time()
+        rows = [
+            (self.key(model, text), array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+            if vector is not None
+        ]
+        # The connection commits, or rolls back on errors, when the block exits.
+        with self._lock, self._cnx:
+            # Other processes may share the file, so the entries are counted in
+            # the same write transaction as the eviction.
+            self._cnx.execute("BEGIN IMMEDIATE")
+            self._cnx.executemany(
+                "INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?)", rows
+            )
+            size = self._cnx.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if size > self.max_entries:
+                self._cnx.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    " SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (size - self.max_entries,),
+                )
+
+    def get_or_create(
+        self,
+        model: str,
+        texts: list[str],
+        create: Callable[[list[str]], list[list[float]]],
+    ) -> list[list[float]]:
+        """Return the embeddings of texts, calling `create` only for the misses."""
+        vectors = self.get_many(model, texts)
+        missing = list(
+            dict.fromkeys(text for text, v in zip(texts, vectors) if v is None)
+        )
+        if missing:
+            created = dict(zip(missing, create(missing)))
+            self.put_many(model, list(created), list(created.values()))
+            vectors = [
+                created[text] if vector is None else vector
+                for text, vector in zip(texts, vectors)
+            ]
+        return vectors
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._cnx.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return {
+            "entries": entries[0],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_embedding_cache = None
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Return the shared embedding cache, or None if it is disabled."""
+    global _embedding_cache
+    cfg = Config()
+    if not cfg.embedding_cache:
+        return None
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(
+            cfg.embedding_cache_path, cfg.embedding_cache_max_entries
+        )
+    return _embedding_cache
+
+
+def cached_embeddings(
+    model: str, texts: list[str], create: Callable[[list[str]], list[list[float]]]
+) -> list[list[float]]:
+    """Embed texts through the shared cache if it is enabled."""
+    cache = get_embedding_cache()
+    if cache is None:
+        return create(texts)
+    return cache.get_or_create(model, texts, create)
@@ -1,17 +1,25 @@
 from __future__ import annotations
 
+import abc
+import hashlib
+import re
 import time
 from ast import List
 
+import numpy as np
 import openai
 from colorama import Fore, Style
 from openai.error import APIError, RateLimitError
 
 from autogpt.config import Config
+from autogpt.embedding_cache import cached_embeddings
 from autogpt.logs import logger
 
 CFG = Config()
 
+# The embeddings endpoint takes a list of inputs; this many are sent per request.
+EMBEDDING_BATCH_SIZE = 100
+
 openai.api_key = CFG.openai_api_key
 
 
@@ -138,32 +146,149 @@ def create_chat_completion(
     return response.choices[0].message["content"]
 
 
-def create_embedding_with_ada(text) -> list:
-    """Create an embedding with text-ada-002 using the OpenAI SDK"""
+class EmbeddingProvider(abc.ABC):
+    """Turns texts into embeddings of a fixed dimension."""
+
+    # Identifies the embeddings in the embedding cache.
+    name: str
+    dimension: int
+    # Whether embedding is slow enough to be worth the embedding cache.
+    cached = True
+
+    @abc.abstractmethod
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        pass
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """text-embedding-ada-002 through the OpenAI API"""
+
+    name = "text-embedding-ada-002"
+    dimension = 1536
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return _create_embeddings(texts)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Hashes the words and word pairs of a text into signed buckets.
+
+    Texts sharing words get similar embeddings, without a model or a network,
+    which is enough for tests and for offline runs that mostly need exact
+    recall.
+    """
+
+    cached = False
+
+    def __init__(self, dimension: int) -> None:
+        self.name = f"hashing-{dimension}"
+        self.dimension = dimension
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for embedding, text in zip(embeddings, texts):
+            words = re.findall(r"\w+", text.lower())
+            for feature in words + [" ".join(pair) for pair in zip(words, words[1:])]:
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest, "little")
+                embedding[bucket % self.dimension] += 1 if bucket >> 63 else -1
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.maximum(norms, 1e-12)).tolist()
+
+
+class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
+    """A sentence-transformers model, run locally on the CPU"""
+
+    def __init__(self, model: str) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        self.name = f"sentence-transformers/{model}"
+        self._model = SentenceTransformer(model, device="cpu")
+        self.dimension = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return self._model.encode(
+            texts, batch_size=EMBEDDING_BATCH_SIZE, normalize_embeddings=True
+        ).tolist()
+
+
+_embedding_provider = None
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Return the embedding provider chosen by EMBEDDING_PROVIDER."""
+    global _embedding_provider
+    if _embedding_provider is None:
+        if CFG.embedding_provider == "hashing":
+            _embedding_provider = HashingEmbeddingProvider(CFG.embedding_dimension)
+        elif CFG.embedding_provider == "sentence-transformers":
+            try:
+                _embedding_provider = SentenceTransformerEmbeddingProvider(
+                    CFG.embedding_model
+                )
+            except ImportError:
+                print(
+                    "Error: sentence-transformers is not installed. Please install"
+                    " sentence-transformers to embed texts locally."
+                )
+        if _embedding_provider is None:
+            _embedding_provider = OpenAIEmbeddingProvider()
+    return _embedding_provider
+
+
+def create_embedding(text) -> list:
+    """Create an embedding with the configured embedding provider"""
+    return create_embeddings([text])[0]
+
+
+def create_embeddings(texts: list[str]) -> list[list]:
+    """Create embeddings for many texts with the configured embedding provider
+
+    Texts already in the embedding cache are not embedded again. OpenAI is sent
+    the rest EMBEDDING_BATCH_SIZE at a time, so embedding a batch costs one
+    request per batch instead of one per text. Newlines are replaced by spaces
+    first, here only, so that every backend embeds and caches the same text.
+    """
+    texts = [text.replace("\n", " ") for text in texts]
+    provider = get_embedding_provider()
+    if not provider.cached:
+        return provider.embed(texts)
+    return cached_embeddings(provider.name, texts, provider.embed)
+
+
+def _create_embeddings(texts: list[str]) -> list[list]:
+    embeddings = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        embeddings.extend(
+            _create_embedding_batch(texts[start : start + EMBEDDING_BATCH_SIZE])
+        )
+    return embeddings
+
+
+def _create_embedding_batch(texts: list[str]) -> list[list]:
     num_retries = 10
     for attempt in range(num_retries):
         backoff = 2 ** (attempt + 2)
         try:
             if CFG.use_azure:
-                return openai.Embedding.create(
-                    input=[text],
+                response = openai.Embedding.create(
+                    input=texts,
                     engine=CFG.get_azure_deployment_id_for_model(
                         "text-embedding-ada-002"
                     ),
-                )["data"][0]["embedding"]
-            else:
-                return openai.Embedding.create(
-                    input=[text], model="text-embedding-ada-002"
-                )["data"][0]["embedding"]
-        except RateLimitError:
-            pass
-        except APIError as e:
-            if e.http_status == 502:
-                pass
+                )
             else:
-                raise
+                response = openai.Embedding.create(
+                    input=texts, model="text-embedding-ada-002"
+                )
+            data = sorted(response["data"], key=lambda item: item["index"])
+            return [item["embedding"] for item in data]
+        except (RateLimitError, APIError) as e:
+            # The last error is raised, so that no missing embedding is stored.
             if attempt == num_retries - 1:
                 raise
+            if isinstance(e, APIError) and e.http_status != 502:
+                raise
         if CFG.debug_mode:
             print(
                 Fore.RED + "Error: ",
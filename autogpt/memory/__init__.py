@@ -1,9 +1,11 @@
+from autogpt.memory.hybrid import HybridMemory
 from autogpt.memory.local import LocalCache
 from autogpt.memory.no_memory import NoMemory
+from autogpt.memory.tiered import TieredMemory
 
 # List of supported memory backends
 # Add a backend to this list if the import attempt is successful
-supported_memory = ["local", "no_memory"]
+supported_memory = ["local", "no_memory", "hybrid", "tiered"]
 
 try:
     from autogpt.memory.redismem import RedisMemory
@@ -38,9 +40,10 @@ except ImportError:
     MilvusMemory = None
 
 
-def get_memory(cfg, init=False):
+def get_memory(cfg, init=False, backend=None):
+    backend = backend or cfg.memory_backend
     memory = None
-    if cfg.memory_backend == "pinecone":
+    if backend == "pinecone":
         if not PineconeMemory:
             print(
                 "Error: Pinecone is not installed. Please install pinecone"
@@ -48,9 +51,9 @@ def get_memory(cfg, init=False):
             )
         else:
             memory = PineconeMemory(cfg)
-            if init:
+            if init and cfg.wipe_pinecone_on_start:
                 memory.clear()
-    elif cfg.memory_backend == "redis":
+    elif backend == "redis":
         if not RedisMemory:
             print(
                 "Error: Redis is not installed. Please install redis-py to"
@@ -58,7 +61,7 @@ def get_memory(cfg, init=False):
             )
         else:
             memory = RedisMemory(cfg)
-    elif cfg.memory_backend == "weaviate":
+    elif backend == "weaviate":
         if not WeaviateMemory:
             print(
                 "Error: Weaviate is not installed. Please install weaviate-client to"
@@ -66,7 +69,7 @@ def get_memory(cfg, init=False):
             )
         else:
             memory = WeaviateMemory(cfg)
-    elif cfg.memory_backend == "milvus":
+    elif backend == "milvus":
         if not MilvusMemory:
             print(
                 "Error: Milvus sdk is not installed."
@@ -74,8 +77,24 @@ def get_memory(cfg, init=False):
             )
         else:
             memory = MilvusMemory(cfg)
-    elif cfg.memory_backend == "no_memory":
+    elif backend == "no_memory":
         memory = NoMemory(cfg)
+    elif backend == "hybrid":
+        if cfg.hybrid_vector_backend == "hybrid":
+            print("Error: HYBRID_VECTOR_BACKEND cannot be hybrid itself.")
+        else:
+            vector_memory = get_memory(cfg, init, cfg.hybrid_vector_backend)
+            memory = HybridMemory(cfg, vector_memory)
+            # The keyword index holds the texts of the vector memory, so it is
+            # only wiped along with them.
+            if init and cleared_on_init(cfg, vector_memory):
+                memory.lexical.clear()
+    elif backend == "tiered":
+        if cfg.tiered_remote_backend == "tiered":
+            print("Error: TIERED_REMOTE_BACKEND cannot be tiered itself.")
+        else:
+            remote_memory = get_memory(cfg, init, cfg.tiered_remote_backend)
+            memory = TieredMemory(cfg, remote_memory)
 
     if memory is None:
         memory = LocalCache(cfg)
@@ -84,6 +103,17 @@ def get_memory(cfg, init=False):
     return memory
 
 
+def cleared_on_init(cfg, memory):
+    """Whether get_memory(cfg, init=True) clears a memory it has made."""
+    if isinstance(memory, TieredMemory):
+        return cleared_on_init(cfg, memory.remote)
+    if RedisMemory is not None and isinstance(memory, RedisMemory):
+        return cfg.wipe_redis_on_start
+    if PineconeMemory is not None and isinstance(memory, PineconeMemory):
+        return cfg.wipe_pinecone_on_start
+    return isinstance(memory, LocalCache)
+
+
 def get_supported_memory_backends():
     return supported_memory
 
@@ -91,6 +121,8 @@ def get_supported_memory_backends():
 __all__ = [
     "get_memory",
     "LocalCache",
+    "HybridMemory",
+    "TieredMemory",
     "RedisMemory",
     "PineconeMemory",
     "NoMemory",
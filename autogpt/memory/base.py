@@ -1,29 +1,150 @@
 """Base class for memory providers."""
+from __future__ import annotations
+
 import abc
+import asyncio
+import dataclasses
+import time
+from typing import Any
+
+import numpy as np
+
+from autogpt.config import AbstractSingleton
+from autogpt.memory.ranking import maximal_marginal_relevance
+
+# MMR re-ranks this many times num_relevant of the best candidates.
+MMR_CANDIDATE_FACTOR = 4
+# The metadata fields a memory can carry, with their types. Every backend stores
+# them in fields of their own, so that searches can be filtered on them.
+METADATA_FIELDS = {
+    "source": str,
+    "kind": str,
+    "session": str,
+    "chunk": int,
+    "timestamp": float,
+}
+# Filters match the metadata fields, except that `since` and `until` bound the
+# timestamp instead of matching it.
+FILTER_KEYS = {"source", "kind", "session", "chunk", "since", "until"}
+
+
+def build_metadata(metadata: dict[str, Any] | None) -> dict[str, Any]:
+    """Check the metadata of a new memory and stamp it with the current time.
+
+    Fields set to None are left out.
+
+    Raises:
+        ValueError: If a field is not one of METADATA_FIELDS.
+    """
+    metadata = dict(metadata or {})
+    unknown = set(metadata) - set(METADATA_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown memory metadata fields: {sorted(unknown)}")
+    metadata.setdefault("timestamp", time.time())
+    return {
+        field: METADATA_FIELDS[field](value)
+        for field, value in metadata.items()
+        if value is not None
+    }
+
+
+def check_filters(filters: dict[str, Any] | None) -> dict[str, Any]:
+    """Check a search filter and drop its unset keys.
+
+    `source`, `kind`, `session` and `chunk` match a single value or any value of
+    a list. `since` and `until` bound the timestamp, inclusively.
 
-import openai
+    Raises:
+        ValueError: If a key is not one of FILTER_KEYS.
+    """
+    filters = {
+        key: value for key, value in (filters or {}).items() if value is not None
+    }
+    unknown = set(filters) - FILTER_KEYS
+    if unknown:
+        raise ValueError(f"Unknown memory filter keys: {sorted(unknown)}")
+    return filters
 
-from autogpt.config import AbstractSingleton, Config
 
-cfg = Config()
+def filter_values(value: Any) -> list[Any]:
+    """The values a filter key matches, for a single value or a list of them."""
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
 
 
-def get_ada_embedding(text):
-    text = text.replace("\n", " ")
-    if cfg.use_azure:
-        return openai.Embedding.create(
-            input=[text],
-            engine=cfg.get_azure_deployment_id_for_model("text-embedding-ada-002"),
-        )["data"][0]["embedding"]
-    else:
-        return openai.Embedding.create(input=[text], model="text-embedding-ada-002")[
-            "data"
-        ][0]["embedding"]
+@dataclasses.dataclass
+class ScoredMemory:
+    """A memory returned by `get_relevant_scored`.
+
+    `score` is the cosine similarity to the query, whatever the backend, so the
+    same `min_score` means the same thing everywhere.
+    """
+
+    text: str
+    score: float
+    id: str | None = None
+    metadata: dict[str, Any] = dataclasses.field(default_factory=dict)
+    embedding: Any = dataclasses.field(default=None, repr=False, compare=False)
+
+
+def rank_scored(
+    candidates: list[ScoredMemory],
+    num_relevant: int,
+    min_score: float | None = None,
+    mmr_lambda: float | None = None,
+) -> list[ScoredMemory]:
+    """Rank the candidates of get_relevant_scored, see its arguments.
+
+    The candidates need their embeddings when mmr_lambda is below 1.
+    """
+    if min_score is not None:
+        candidates = [memory for memory in candidates if memory.score >= min_score]
+    candidates.sort(key=lambda memory: memory.score, reverse=True)
+    if mmr_lambda is None or mmr_lambda >= 1 or not candidates:
+        return candidates[:num_relevant]
+    picked = maximal_marginal_relevance(
+        np.array([memory.score for memory in candidates]),
+        np.array([memory.embedding for memory in candidates]),
+        num_relevant,
+        mmr_lambda,
+    )
+    return [candidates[i] for i in picked]
+
+
+def near_duplicates(
+    embeddings: np.ndarray, nearest_scores: np.ndarray, threshold: float
+) -> np.ndarray:
+    """Flag the embeddings whose nearest stored memory scores at least threshold,
+    and those within threshold of an earlier embedding that is not flagged
+    itself, comparing the batch with itself in a single matrix product.
+
+    Args:
+        embeddings: The unit-length embeddings of a batch, one row each.
+        nearest_scores: The score of the nearest stored memory of each row.
+        threshold: The score at which two memories are duplicates.
+    """
+    duplicates = np.asarray(nearest_scores) >= threshold
+    similarity = embeddings @ embeddings.T
+    for i in range(len(embeddings)):
+        if not duplicates[i]:
+            duplicates[i + 1 :] |= similarity[i, i + 1 :] >= threshold
+    return duplicates
 
 
 class MemoryProviderSingleton(AbstractSingleton):
+    """A memory backend.
+
+    Every method has a coroutine counterpart prefixed with `a`. By default these
+    run the synchronous method in a worker thread, so backends must tolerate a
+    write in one thread while another thread searches; backends with an asyncio
+    client override them.
+    """
+
+    # Backends set this from MEMORY_DEDUP_THRESHOLD when MEMORY_DEDUP is enabled.
+    dedup_threshold = None
+    duplicates_skipped = 0
+
     @abc.abstractmethod
-    def add(self, data):
+    def add(self, data, metadata=None):
         pass
 
     @abc.abstractmethod
@@ -35,9 +156,156 @@ class MemoryProviderSingleton(AbstractSingleton):
         pass
 
     @abc.abstractmethod
-    def get_relevant(self, data, num_relevant=5):
+    def get_relevant(self, data, num_relevant=5, filters=None):
         pass
 
     @abc.abstractmethod
     def get_stats(self):
         pass
+
+    def add_many(self, data, metadata=None):
+        """Add many data points, with a metadata dict (or None) for each. Backends
+        override this to embed and write them in batches instead of one at a time."""
+        metadata = metadata or [None for _ in data]
+        return [self.add(item, meta) for item, meta in zip(data, metadata)]
+
+    def get_relevant_many(self, data, num_relevant=5, filters=None):
+        """Return the relevant data for each of many queries."""
+        return [self.get_relevant(item, num_relevant, filters) for item in data]
+
+    def add_embedded(self, data, embeddings, metadata=None):
+        """Add many data points with their embeddings, in the backend's bulk write
+        path and without embedding anything. Duplicates are skipped as by
+        add_many."""
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support adding embedded data"
+        )
+
+    def export_batches(self, batch_size=1000):
+        """Yield every stored memory, in batches of up to batch_size, as
+        (ids, texts, metadata, embeddings) tuples with the embeddings in a float32
+        array of one row per memory."""
+        raise NotImplementedError(f"{type(self).__name__} does not support exporting")
+
+    async def aadd(self, data, metadata=None):
+        """Coroutine counterpart of add."""
+        return await asyncio.to_thread(self.add, data, metadata)
+
+    async def aadd_many(self, data, metadata=None):
+        """Coroutine counterpart of add_many."""
+        return await asyncio.to_thread(self.add_many, data, metadata)
+
+    async def aget_relevant(self, data, num_relevant=5, filters=None):
+        """Coroutine counterpart of get_relevant."""
+        return await asyncio.to_thread(self.get_relevant, data, num_relevant, filters)
+
+    async def aget_relevant_many(self, data, num_relevant=5, filters=None):
+        """Coroutine counterpart of get_relevant_many."""
+        return await asyncio.to_thread(
+            self.get_relevant_many, data, num_relevant, filters
+        )
+
+    async def aget_relevant_scored(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        min_score: float | None = None,
+        mmr_lambda: float | None = None,
+        filters: dict[str, Any] | None = None,
+    ) -> list[ScoredMemory]:
+        """Coroutine counterpart of get_relevant_scored."""
+        return await asyncio.to_thread(
+            self.get_relevant_scored,
+            data,
+            num_relevant,
+            min_score=min_score,
+            mmr_lambda=mmr_lambda,
+            filters=filters,
+        )
+
+    def get_relevant_scored(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        min_score: float | None = None,
+        mmr_lambda: float | None = None,
+        filters: dict[str, Any] | None = None,
+    ) -> list[ScoredMemory]:
+        """
+        Returns the memories most relevant to the given data, with their scores.
+
+        Args:
+            data: The data to compare to.
+            num_relevant: The maximum number of memories to return.
+            min_score: Memories with a lower score than this are dropped.
+            mmr_lambda: Below 1, the memories are re-ranked with maximal marginal
+                relevance, trading relevance (1) for diversity (0) to drop
+                near-duplicates.
+            filters: Only memories whose metadata match these are searched, see
+                check_filters.
+
+        Returns: A list of ScoredMemory, best first.
+        """
+        diversify = mmr_lambda is not None and mmr_lambda < 1
+        candidates = self._get_scored_candidates(
+            data,
+            num_relevant * MMR_CANDIDATE_FACTOR if diversify else num_relevant,
+            with_embeddings=diversify,
+            filters=check_filters(filters),
+        )
+        return rank_scored(candidates, num_relevant, min_score, mmr_lambda)
+
+    def _get_scored_candidates(
+        self,
+        data: str,
+        num_candidates: int,
+        with_embeddings: bool,
+        filters: dict[str, Any],
+        embedding: Any = None,
+    ) -> list[ScoredMemory]:
+        """Return up to num_candidates scored memories for data, in any order.
+
+        Backends fill in `embedding` when with_embeddings is set, and only search
+        the memories that match the checked filters. The embedding of data, when
+        given, is searched for instead of embedding data again.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support scored retrieval"
+        )
+
+    def _find_duplicates(self, data, embeddings):
+        """
+        Flags the data to skip when deduplication is enabled: data whose nearest
+        stored memory, or an earlier data point, scores at least dedup_threshold,
+        which includes exact copies. The stored memories are searched for the
+        whole batch at once, and nothing is embedded again.
+
+        Args:
+            data: The data about to be added.
+            embeddings: The embedding of each data point.
+
+        Returns: A bool for each data point, True for duplicates.
+        """
+        if self.dedup_threshold is None or not data:
+            return [False for _ in data]
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(data), -1)
+        duplicates = near_duplicates(
+            embeddings, self._nearest_scores(embeddings), self.dedup_threshold
+        )
+        self.duplicates_skipped += int(duplicates.sum())
+        return duplicates.tolist()
+
+    def _drop_duplicates(self, data, positions, embeddings):
+        """Drop the duplicates among the data at positions, whose embeddings are
+        given in the same order, and return the positions and embeddings kept."""
+        duplicates = self._find_duplicates([data[i] for i in positions], embeddings)
+        kept = [j for j, duplicate in enumerate(duplicates) if not duplicate]
+        return [positions[j] for j in kept], [embeddings[j] for j in kept]
+
+    def _nearest_scores(self, embeddings):
+        """Return the score of the nearest stored memory for each embedding, -inf
+        where there is none. Backends that deduplicate override this to search
+        for all of the embeddings in as few requests as they can."""
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support deduplication"
+        )
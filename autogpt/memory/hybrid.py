@@ -0,0 +1,246 @@
+"""Keyword search over the permanent memory, fused with a vector memory."""
+from __future__ import annotations
+
+import re
+from typing import Any
+
+import numpy as np
+
+from autogpt.llm_utils import create_embeddings
+from autogpt.memory.base import (
+    MMR_CANDIDATE_FACTOR,
+    MemoryProviderSingleton,
+    ScoredMemory,
+    check_filters,
+)
+from autogpt.memory.ranking import maximal_marginal_relevance, reciprocal_rank_fusion
+from autogpt.permanent_memory.sqlite3_store import MemoryDB
+
+# Longer queries, like the message history, are cut to their first terms.
+MAX_QUERY_TERMS = 64
+
+
+def match_query(text: str) -> str:
+    """Turn free text into an FTS5 query matching any of its words.
+
+    Every whitespace-separated term is quoted as a phrase, so identifiers like
+    `file.txt` match their parts next to each other and FTS5 operators in the
+    text are taken literally.
+    """
+    terms = [term for term in text.split() if re.search(r"\w", term)]
+    terms = list(dict.fromkeys(terms))[:MAX_QUERY_TERMS]
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class HybridMemory(MemoryProviderSingleton):
+    """Searches a vector memory and a full-text index of the same texts, and
+    fuses both rankings with reciprocal-rank fusion.
+
+    The texts are indexed in an FTS5 table of the permanent memory store,
+    `<memory_index>-lexical.sqlite3`, and ranked by BM25. Keywords catch the
+    exact identifiers, file names and error strings that embeddings miss. With
+    `HYBRID_LEXICAL_SKIP_SCORE` set, a query whose best keyword match scores at
+    least that much is answered from the matches above it alone, without an
+    embedding call.
+
+    Filtered searches only search the vector memory, as the full-text index has
+    no metadata.
+    """
+
+    def __init__(self, cfg, vector_memory: MemoryProviderSingleton) -> None:
+        """
+        Initializes the hybrid memory provider.
+
+        Args:
+            cfg: The config object.
+            vector_memory: The memory provider to fuse the keyword search with.
+
+        Returns: None
+        """
+        self.vector = vector_memory
+        self.lexical = MemoryDB(f"{cfg.memory_index}-lexical.sqlite3")
+        self.rrf_k = cfg.hybrid_rrf_k
+        self.skip_score = cfg.hybrid_lexical_skip_score
+        self.embeddings_skipped = 0
+
+    def add(self, data: str, metadata: dict[str, Any] | None = None) -> str:
+        """
+        Adds a data point to the vector memory and the keyword index.
+
+        Args:
+            data: The data to add.
+            metadata: The metadata fields of the data point.
+
+        Returns: The message of the vector memory.
+        """
+        return self.add_many([data], None if metadata is None else [metadata])[0]
+
+    def add_many(
+        self, data: list[str], metadata: list[dict[str, Any] | None] | None = None
+    ) -> list[str]:
+        """
+        Adds many data points to the vector memory, and indexes the ones it has
+        not skipped.
+
+        Args:
+            data: The data to add.
+            metadata: The metadata fields of each data point.
+
+        Returns: The message of the vector memory for each data point.
+        """
+        messages = self.vector.add_many(data, metadata)
+        self.lexical.insert_many(
+            [item for item, message in zip(data, messages) if message]
+        )
+        return messages
+
+    def add_embedded(
+        self,
+        data: list[str],
+        embeddings: Any,
+        metadata: list[dict[str, Any] | None] | None = None,
+    ) -> list[str]:
+        """
+        Adds many data points with their embeddings to the vector memory, and
+        indexes the ones it has not skipped.
+
+        Args:
+            data: The data to add.
+            embeddings: The embedding of each data point.
+            metadata: The metadata fields of each data point.
+
+        Returns: The message of the vector memory for each data point.
+        """
+        messages = self.vector.add_embedded(data, embeddings, metadata)
+        self.lexical.insert_many(
+            [item for item, message in zip(data, messages) if message]
+        )
+        return messages
+
+    def export_batches(self, batch_size: int = 1000):
+        """
+        Yields the memories of the vector memory, which holds the same texts as
+        the keyword index.
+        """
+        return self.vector.export_batches(batch_size)
+
+    def get(self, data: str) -> list[Any] | None:
+        """
+        Gets the data from the memory that is most relevant to the given data.
+
+        Args:
+            data: The data to compare to.
+
+        Returns: The most relevant data.
+        """
+        return self.get_relevant(data, 1)
+
+    def clear(self) -> str:
+        """
+        Clears the vector memory and the keyword index.
+
+        Returns: A message indicating that the memory has been cleared.
+        """
+        self.lexical.clear()
+        return self.vector.clear()
+
+    def get_relevant(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        filters: dict[str, Any] | None = None,
+    ) -> list[Any]:
+        """
+        Returns the data most relevant to the given data, by keywords and by
+        embedding.
+
+        Args:
+            data: The data to compare to.
+            num_relevant: The number of relevant data to return.
+            filters: Only search the data whose metadata match these.
+
+        Returns: A list of the most relevant data.
+        """
+        return [
+            memory.text
+            for memory in self.get_relevant_scored(data, num_relevant, filters=filters)
+        ]
+
+    def get_relevant_scored(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        min_score: float | None = None,
+        mmr_lambda: float | None = None,
+        filters: dict[str, Any] | None = None,
+    ) -> list[ScoredMemory]:
+        """
+        Returns the memories most relevant to the given data, in the fused order.
+
+        See MemoryProviderSingleton.get_relevant_scored. The score stays the
+        cosine similarity, embedding the keyword matches the vector search did
+        not return. Memories answered from keywords alone, without an embedding,
+        score 1.
+        """
+        filters = check_filters(filters)
+        diversify = mmr_lambda is not None and mmr_lambda < 1
+        num_candidates = (
+            num_relevant * MMR_CANDIDATE_FACTOR if diversify else num_relevant
+        )
+        lexical = []
+        query = match_query(data)
+        if query and not filters:
+            lexical = self.lexical.search_ranked(query, num_candidates)
+        if self.skip_score and lexical and lexical[0][1] >= self.skip_score:
+            self.embeddings_skipped += 1
+            return [
+                ScoredMemory(text=text, score=1.0)
+                for text, score in lexical[:num_relevant]
+                if score >= self.skip_score
+            ]
+
+        vector = self.vector._get_scored_candidates(
+            data, num_candidates, diversify, filters
+        )
+        vector.sort(key=lambda memory: memory.score, reverse=True)
+        memories = {}
+        for memory in vector:
+            memories.setdefault(memory.text, memory)
+        missing = [text for text, _ in lexical if text not in memories]
+        if missing:
+            # Usually in the embedding cache, as the texts were embedded when added.
+            query_embedding, *embeddings = create_embeddings([data, *missing])
+            for text, embedding in zip(missing, embeddings):
+                memories[text] = ScoredMemory(
+                    text=text,
+                    score=float(np.dot(query_embedding, embedding)),
+                    embedding=embedding,
+                )
+        ranked = [
+            memories[text]
+            for text in reciprocal_rank_fusion(
+                [[memory.text for memory in vector], [text for text, _ in lexical]],
+                self.rrf_k,
+            )
+        ]
+        if min_score is not None:
+            ranked = [memory for memory in ranked if memory.score >= min_score]
+        if not diversify or not ranked:
+            return ranked[:num_relevant]
+        picked = maximal_marginal_relevance(
+            np.array([memory.score for memory in ranked]),
+            np.array([memory.embedding for memory in ranked]),
+            num_relevant,
+            mmr_lambda,
+        )
+        return [ranked[i] for i in picked]
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        Returns: The stats of the vector memory and of the keyword index.
+        """
+        return {
+            "vector": self.vector.get_stats(),
+            "lexical_memories": self.lexical.count(),
+            "embeddings_skipped": self.embeddings_skipped,
+        }
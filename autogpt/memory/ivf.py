@@ -0,0 +1,68 @@
+"""An inverted-file (IVF) index for approximate nearest neighbour search in NumPy."""
+from __future__ import annotations
+
+import numpy as np
+
+# Vectors each k-means iteration trains on, per list.
+SAMPLES_PER_LIST = 256
+# Rows scored per matrix product when assigning vectors to lists.
+ASSIGN_CHUNK_SIZE = 4096
+
+
+def train_centroids(
+    vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0
+) -> np.ndarray:
+    """Cluster vectors into n_lists groups with spherical k-means.
+
+    Args:
+        vectors: The vectors to cluster, one per row.
+        n_lists: The number of clusters.
+        iterations: The number of k-means iterations.
+        seed: Seed for sampling the training vectors and initial centroids.
+
+    Returns:
+        np.ndarray: The unit-length centroids, one per row.
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = min(len(vectors), n_lists * SAMPLES_PER_LIST)
+    sample = np.asarray(
+        vectors[np.sort(rng.choice(len(vectors), n_samples, replace=False))],
+        dtype=np.float32,
+    )
+    centroids = sample[rng.choice(n_samples, n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=n_lists)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.add.reduceat(sample[order], starts[filled], axis=0)
+        centroids[filled] = sums
+        # Restart empty clusters from random samples.
+        centroids[~filled] = sample[rng.choice(n_samples, int((~filled).sum()))]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Return the index of the closest centroid for every vector."""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE):
+        chunk = np.asarray(vectors[start : start + ASSIGN_CHUNK_SIZE])
+        labels[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return labels
+
+
+def probe_candidates(
+    query: np.ndarray, centroids: np.ndarray, assignments: np.ndarray, n_probe: int
+) -> np.ndarray:
+    """Return the rows in the n_probe lists whose centroids are closest to query.
+
+    Probing more lists finds more of the true nearest neighbours at the cost of
+    scoring more rows.
+    """
+    scores = centroids @ query
+    n_probe = min(n_probe, len(centroids))
+    probed = np.argpartition(scores, -n_probe)[-n_probe:]
+    return np.flatnonzero(np.isin(assignments, probed))
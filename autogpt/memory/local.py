@@ -1,33 +1,310 @@
 from __future__ import annotations
 
+import contextlib
 import dataclasses
+import hashlib
+import math
 import os
-from typing import Any, List
+import threading
+import time
+from collections.abc import Sequence
+from typing import Any
 
 import numpy as np
 import orjson
 
-from autogpt.llm_utils import create_embedding_with_ada
-from autogpt.memory.base import MemoryProviderSingleton
+from autogpt.llm_utils import create_embeddings, get_embedding_provider
+from autogpt.memory.base import (
+    MMR_CANDIDATE_FACTOR,
+    MemoryProviderSingleton,
+    ScoredMemory,
+    build_metadata,
+    check_filters,
+    filter_values,
+    near_duplicates,
+    rank_scored,
+)
+from autogpt.memory.ivf import assign_lists, probe_candidates, train_centroids
+from autogpt.memory.quantization import (
+    QUANTIZED_DTYPES,
+    QuantizedMatrix,
+    quantize,
+    score,
+)
+from autogpt.memory.ranking import top_k
 
-EMBED_DIM = 1536
-SAVE_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SERIALIZE_DATACLASS
+try:
+    import fcntl
+except ImportError:  # Windows, where a cache is only safe in a single process.
+    fcntl = None
 
+# Caches that do not record the dimension of their embeddings hold ada ones.
+LEGACY_EMBED_DIM = 1536
+OFFSET_DTYPE = np.uint64
+# Marks the preallocated, unused entries at the end of the offsets file. Offsets
+# only ever increase, so the number of used entries can be found by bisection.
+UNUSED_OFFSET = np.iinfo(OFFSET_DTYPE).max
+MIN_CAPACITY = 64
+# The IVF index is retrained once the cache has grown this many times over.
+RETRAIN_GROWTH = 4
+# Quantized scores pick this many times k candidates to rescore in float32.
+RESCORE_FACTOR = 4
+# Rows converted at a time when the storage dtype of a cache changes.
+CONVERT_CHUNK_SIZE = 16384
+# The metadata of every row, for filtering. Strings are stored as 1-based ids
+# into the vocabulary, 0 if unset. An unset chunk is -1.
+METADATA_DTYPE = np.dtype(
+    [
+        ("source", np.int32),
+        ("kind", np.int32),
+        ("session", np.int32),
+        ("chunk", np.int32),
+        ("timestamp", np.float64),
+    ]
+)
+VOCABULARY_FIELDS = ("source", "kind", "session")
+# How much every row has been retrieved, for eviction. `importance` sums the
+# scores of the retrievals that returned the row.
+USAGE_DTYPE = np.dtype(
+    [
+        ("hits", np.uint32),
+        ("last_used", np.float64),
+        ("importance", np.float32),
+    ]
+)
+# New memories count as retrieved once with a perfect score, so that they are
+# not the first ones evicted by importance.
+INITIAL_IMPORTANCE = 1.0
+# A full cache evicts down to this fraction of its limits at once, so that it
+# is not compacted again on every add.
+EVICTION_HEADROOM = 0.9
+# Sort keys for np.lexsort, primary key last, that put the rows to evict first.
+EVICTION_POLICIES = {
+    "lru": lambda usage, metadata: (usage["last_used"],),
+    "oldest": lambda usage, metadata: (metadata["timestamp"],),
+    "importance": lambda usage, metadata: (usage["last_used"], usage["importance"]),
+}
 
-def create_default_embeddings():
-    return np.zeros((0, EMBED_DIM)).astype(np.float32)
+
+def create_default_embeddings(dim: int = LEGACY_EMBED_DIM):
+    return np.zeros((0, dim)).astype(np.float32)
+
+
+def text_hash(text: str) -> int:
+    """A 64-bit hash of a text, to find exact duplicates."""
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+
+
+def empty_metadata(count: int) -> np.ndarray:
+    rows = np.zeros(count, dtype=METADATA_DTYPE)
+    rows["chunk"] = -1
+    return rows
+
+
+def new_usage(last_used: np.ndarray) -> np.ndarray:
+    rows = np.zeros(len(last_used), dtype=USAGE_DTYPE)
+    rows["last_used"] = last_used
+    rows["importance"] = INITIAL_IMPORTANCE
+    return rows
+
+
+def map_rows(filename: str, dtype, count: int, dim: int | None = None) -> np.ndarray:
+    """Memory-map at most the first `count` rows of a raw array file, read-only."""
+    row_shape = () if dim is None else (dim,)
+    row_size = np.dtype(dtype).itemsize * (dim or 1)
+    count = min(count, os.path.getsize(filename) // row_size)
+    if count == 0:
+        return np.zeros((0, *row_shape), dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode="r", shape=(count, *row_shape))
+
+
+class GrowableArray:
+    """A raw array file, memory-mapped, that grows by doubling its capacity.
+
+    Only the first `count` rows are in use and `view` returns them. The rows
+    after them are preallocated, so appending a row is amortized O(1) instead of
+    copying the whole array every time.
+    """
+
+    def __init__(
+        self, filename: str, dtype, dim: int | None = None, fill: Any = 0
+    ) -> None:
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.row_shape = () if dim is None else (dim,)
+        self.fill = fill
+        self.count = 0
+        self._array = self._map(os.path.getsize(filename) // self.row_size)
+
+    @property
+    def row_size(self) -> int:
+        return self.dtype.itemsize * int(np.prod(self.row_shape))
+
+    @property
+    def capacity(self) -> int:
+        return len(self._array)
+
+    @property
+    def allocated(self) -> np.ndarray:
+        """All rows, including the preallocated ones past `count`."""
+        return self._array
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._array[: self.count]
+
+    def _map(self, capacity: int) -> np.ndarray:
+        if capacity == 0:
+            # Empty files cannot be memory-mapped.
+            return np.zeros((0, *self.row_shape), dtype=self.dtype)
+        # np.memmap extends the file when the requested shape does not fit.
+        return np.memmap(
+            self.filename,
+            dtype=self.dtype,
+            mode="r+",
+            shape=(capacity, *self.row_shape),
+        )
+
+    def reserve(self, capacity: int) -> None:
+        """Make room for at least `capacity` rows, doubling the current size."""
+        old_capacity = self.capacity
+        if capacity <= old_capacity:
+            return
+        capacity = max(capacity, 2 * old_capacity, MIN_CAPACITY)
+        self.flush()
+        if self.fill:
+            # Write the filler before mapping, so that a crash never leaves
+            # zeroed rows behind.
+            with open(self.filename, "ab") as f:
+                np.full(
+                    (capacity - old_capacity, *self.row_shape), self.fill, self.dtype
+                ).tofile(f)
+        self._array = self._map(capacity)
+
+    def refresh(self) -> None:
+        """Map the rows another process has added past the current capacity."""
+        capacity = os.path.getsize(self.filename) // self.row_size
+        if capacity > self.capacity:
+            self._array = self._map(capacity)
+
+    def append(self, rows: np.ndarray) -> None:
+        rows = np.asarray(rows, dtype=self.dtype).reshape(-1, *self.row_shape)
+        self.reserve(self.count + len(rows))
+        self._array[self.count : self.count + len(rows)] = rows
+        self.count += len(rows)
+
+    def truncate(self, count: int) -> None:
+        """Drop every row from `count` on, keeping the allocated capacity."""
+        tail = self._array[count:]
+        tail[tail != self.fill] = self.fill
+        self.count = count
+
+    def flush(self) -> None:
+        if isinstance(self._array, np.memmap):
+            self._array.flush()
+
+
+class TextLog(Sequence):
+    """The texts of a LocalCache, read from the append-only log on demand.
+
+    Only the offsets of the records are kept in memory, so opening a large log
+    costs nothing until a text is actually looked up.
+    """
+
+    def __init__(self, filename: str, offsets: GrowableArray) -> None:
+        self.filename = filename
+        self.offsets = offsets
+        self._file = None
+
+    def __len__(self) -> int:
+        return self.offsets.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.record(index)["text"]
+
+    def record(self, index: int) -> dict[str, Any]:
+        """The whole JSON record of a memory, with its text and metadata."""
+        return orjson.loads(self.read_line(int(self.offsets.view[index])))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def read_line(self, offset: int) -> bytes:
+        if self._file is None:
+            self._file = open(self.filename, "rb")
+        self._file.seek(offset)
+        return self._file.readline()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
 
 
 @dataclasses.dataclass
 class CacheContent:
-    texts: List[str] = dataclasses.field(default_factory=list)
+    texts: Sequence[str] = dataclasses.field(default_factory=list)
     embeddings: np.ndarray = dataclasses.field(
         default_factory=create_default_embeddings
     )
 
 
 class LocalCache(MemoryProviderSingleton):
-    """A class that stores the memory in a local file"""
+    """A class that stores the memory in a local file
+
+    The memory is persisted as these files next to each other:
+    `<memory_index>-texts.jsonl` is an append-only log with one JSON record per
+    memory, `<memory_index>-embeddings.bin` holds the matching float32 rows and
+    `<memory_index>-offsets.bin` holds the byte offset of every record in the text
+    log. `<memory_index>-metadata.bin` repeats the metadata of the records in
+    fixed-size rows, with strings interned in `<memory_index>-vocabulary.jsonl`, so
+    that filtered searches can select their rows without reading the text log.
+    `<memory_index>-hashes.bin` holds a hash of every text, to skip exact
+    duplicates when `MEMORY_DEDUP` is enabled. The binary files are memory-mapped
+    and preallocated with doubling capacity, so adding a memory costs O(1) and
+    opening a cache does not depend on its size.
+    The offset is written last and marks a memory as complete. An old
+    `<memory_index>.json` file is imported once if no such files exist yet.
+
+    With `LOCAL_ANN` enabled, caches of at least `LOCAL_ANN_MIN_ROWS` memories are
+    searched through an IVF index: `<memory_index>-ivf.npz` holds k-means
+    centroids and `<memory_index>-lists.bin` the centroid each row belongs to.
+    Only the rows of the `LOCAL_ANN_PROBE` closest centroids are scored, so
+    probing more lists trades latency for recall. Smaller caches are searched
+    exactly.
+
+    `LOCAL_EMBEDDING_DTYPE` can store the rows as float16 or as int8 with a
+    float32 scale per row (`<memory_index>-embeddings-<dtype>.bin` and
+    `<memory_index>-scales.bin`), and searches score those directly. With
+    `LOCAL_EMBEDDING_RESCORE` the float32 file is kept as well and only read to
+    rescore the best candidates. `<memory_index>-meta.json` records the layout,
+    and a cache is converted when the setting changes. It also records the
+    dimension of the embeddings, which comes from `EMBEDDING_PROVIDER`; a cache
+    has to be cleared before switching to a provider of another dimension.
+
+    `LOCAL_MAX_MEMORIES` and `LOCAL_MAX_BYTES` bound the cache. Every retrieval
+    is recorded in `<memory_index>-usage.bin` by the next write of the process
+    that made it, and once a limit is exceeded the
+    rows chosen by `LOCAL_EVICTION_POLICY` are removed, optionally appended to
+    `<memory_index>-archive.jsonl` first. Removing rows rewrites the files
+    without them, and `<memory_index>-compaction.json` lists the rewritten files
+    until they have all replaced the old ones, so that an interrupted compaction
+    is completed on the next start. Row ids change when rows are removed.
+
+    The files are created on first use rather than when the cache is made.
+    Several processes can share a cache. Adding, clearing and anything else
+    that writes holds an exclusive `flock` on `<memory_index>.lock`, searches
+    hold a shared one. On taking the lock a process maps the memories others
+    have appended since, from the tail of the offsets. The lock file also holds
+    a generation counter that is bumped whenever files are rewritten rather
+    than appended to, upon which the other processes reopen the cache. All of
+    the processes need the same `LOCAL_*` settings. Within a process, `flock`
+    does not keep threads apart, so they also take turns on a thread lock.
+    """
 
     def __init__(self, cfg) -> None:
         """Initialize a class instance
@@ -38,65 +315,799 @@ class LocalCache(MemoryProviderSingleton):
         Returns:
             None
         """
-        self.filename = f"{cfg.memory_index}.json"
-        if os.path.exists(self.filename):
+        self.legacy_filename = f"{cfg.memory_index}.json"
+        self.texts_filename = f"{cfg.memory_index}-texts.jsonl"
+        self.embeddings_filename = f"{cfg.memory_index}-embeddings.bin"
+        self.offsets_filename = f"{cfg.memory_index}-offsets.bin"
+        self.ivf_filename = f"{cfg.memory_index}-ivf.npz"
+        self.lists_filename = f"{cfg.memory_index}-lists.bin"
+        self.meta_filename = f"{cfg.memory_index}-meta.json"
+        self.metadata_filename = f"{cfg.memory_index}-metadata.bin"
+        self.vocabulary_filename = f"{cfg.memory_index}-vocabulary.jsonl"
+        self.hashes_filename = f"{cfg.memory_index}-hashes.bin"
+        self.scales_filename = f"{cfg.memory_index}-scales.bin"
+        self.usage_filename = f"{cfg.memory_index}-usage.bin"
+        self.archive_filename = f"{cfg.memory_index}-archive.jsonl"
+        self.compaction_filename = f"{cfg.memory_index}-compaction.json"
+        self.lock_filename = f"{cfg.memory_index}.lock"
+        self.codes_filenames = {
+            dtype: f"{cfg.memory_index}-embeddings-{dtype}.bin"
+            for dtype in QUANTIZED_DTYPES
+        }
+        self.dim = get_embedding_provider().dimension
+        self.embedding_dtype = cfg.local_embedding_dtype
+        self.keep_float32 = (
+            self.embedding_dtype == "float32" or cfg.local_embedding_rescore
+        )
+        self.ann = cfg.local_ann
+        self.ann_min_rows = cfg.local_ann_min_rows
+        self.ann_lists = cfg.local_ann_lists
+        self.ann_probe = cfg.local_ann_probe
+        self.dedup_threshold = cfg.memory_dedup_threshold if cfg.memory_dedup else None
+        self.duplicates_skipped = 0
+        if cfg.local_eviction_policy not in EVICTION_POLICIES:
+            raise ValueError(
+                f"Unknown LOCAL_EVICTION_POLICY {cfg.local_eviction_policy!r},"
+                f" expected one of {sorted(EVICTION_POLICIES)}"
+            )
+        self.max_memories = cfg.local_max_memories
+        self.max_bytes = cfg.local_max_bytes
+        self.eviction_policy = cfg.local_eviction_policy
+        self.archive = cfg.local_eviction_archive
+        self.evicted = 0
+
+        self._lock_fd = None
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+        self._generation = None
+        self.data = CacheContent(embeddings=create_default_embeddings(self.dim))
+        self._seen_hashes = set() if self.dedup_threshold is not None else None
+        # The retrievals not written yet, per row: hits, importance, last_used.
+        self._pending_hits = {}
+        self._pending_generation = None
+        # Modules make their memory on import, so a new cache is only created on
+        # first use. An existing one is opened at once.
+        if any(
+            os.path.exists(filename)
+            for filename in (
+                self.lock_filename,
+                self.texts_filename,
+                self.legacy_filename,
+            )
+        ):
+            self._create()
+
+    def _create(self) -> None:
+        """Open the cache, creating its files if they do not exist yet."""
+        self._lock_fd = os.open(self.lock_filename, os.O_RDWR | os.O_CREAT)
+        with self._locked(exclusive=True):
+            self._finish_compaction()
+            if os.path.exists(self.texts_filename) and (
+                os.path.exists(self.embeddings_filename)
+                or os.path.exists(self.meta_filename)
+            ):
+                if not os.path.exists(self.offsets_filename):
+                    self._rebuild_offsets()
+            elif os.path.exists(self.legacy_filename):
+                self._rewrite(*self._load_legacy())
+            else:
+                self._rewrite([], create_default_embeddings(self.dim))
+            self._convert_storage()
+            self._open()
+            self._generation = self._read_generation()
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool = False):
+        """Hold the lock of the cache and catch up with the other processes.
+
+        Nested calls are covered by the outermost one, which must be exclusive
+        if any of them is.
+        """
+        with self._thread_lock:
+            if self._lock_fd is None:
+                self._create()
+            outermost = self._lock_depth == 0
+            if outermost and fcntl is not None:
+                fcntl.flock(
+                    self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+                )
+            self._lock_depth += 1
             try:
-                with open(self.filename, "w+b") as f:
-                    file_content = f.read()
-                    if not file_content.strip():
-                        file_content = b"{}"
-                        f.write(file_content)
-
-                    loaded = orjson.loads(file_content)
-                    self.data = CacheContent(**loaded)
-            except orjson.JSONDecodeError:
-                print(f"Error: The file '{self.filename}' is not in JSON format.")
-                self.data = CacheContent()
-        else:
+                if outermost and self._generation is not None:
+                    self._refresh()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if outermost and fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _read_generation(self) -> int:
+        os.lseek(self._lock_fd, 0, os.SEEK_SET)
+        return int.from_bytes(os.read(self._lock_fd, 8), "little")
+
+    def _bump_generation(self) -> None:
+        """Make the other processes reopen the files, which were rewritten."""
+        self._generation = self._read_generation() + 1
+        os.lseek(self._lock_fd, 0, os.SEEK_SET)
+        os.write(self._lock_fd, self._generation.to_bytes(8, "little"))
+
+    def _refresh(self) -> None:
+        """Map the memories other processes have added since the last call, or
+        reopen the cache if they have rewritten its files."""
+        generation = self._read_generation()
+        if generation != self._generation:
+            self._close()
+            self._open()
+            self._generation = generation
+            return
+        self._offsets.refresh()
+        committed = int(np.searchsorted(self._offsets.allocated, UNUSED_OFFSET))
+        count = self._offsets.count
+        if committed == count:
+            return
+        arrays = [self._offsets, *self._row_arrays()]
+        if self._lists is not None:
+            arrays.append(self._lists)
+        for array in arrays:
+            array.refresh()
+            array.count = committed
+        self._read_vocabulary()
+        if self._seen_hashes is not None:
+            self._seen_hashes.update(self._hashes.view[count:].tolist())
+        self.data.embeddings = self._matrix()
+
+    def _close(self) -> None:
+        """Drop the mappings, before the files underneath them are replaced."""
+        self.data.texts.close()
+        self.data = self._offsets = self._lists = None
+        self._metadata = self._hashes = self._usage = None
+        self._embeddings = self._codes = self._scales = None
+
+    def _open(self) -> None:
+        """Map the files of the cache, cutting off anything not fully written.
+
+        A crash in the middle of `add` can leave the text log ahead of the
+        offsets, so everything after the last complete memory is dropped.
+        """
+        self._embeddings = self._codes = self._scales = None
+        if self.keep_float32:
+            self._embeddings = GrowableArray(
+                self.embeddings_filename, np.float32, self.dim
+            )
+        if self.embedding_dtype in QUANTIZED_DTYPES:
+            self._codes = GrowableArray(
+                self.codes_filenames[self.embedding_dtype],
+                QUANTIZED_DTYPES[self.embedding_dtype],
+                self.dim,
+            )
+        if self.embedding_dtype == "int8":
+            self._scales = GrowableArray(self.scales_filename, np.float32)
+        self._offsets = GrowableArray(
+            self.offsets_filename, OFFSET_DTYPE, fill=UNUSED_OFFSET
+        )
+        committed = int(np.searchsorted(self._offsets.allocated, UNUSED_OFFSET))
+        if not os.path.exists(self.metadata_filename):
+            # Memories added before metadata existed have none.
+            empty_metadata(committed).tofile(self.metadata_filename)
+        self._metadata = GrowableArray(self.metadata_filename, METADATA_DTYPE)
+        if not os.path.exists(self.hashes_filename):
+            self._rebuild_hashes(committed)
+        self._hashes = GrowableArray(self.hashes_filename, np.uint64)
+        if not os.path.exists(self.usage_filename):
+            # Memories added before usage was recorded were last used when added.
+            new_usage(self._metadata.allocated[:committed]["timestamp"]).tofile(
+                self.usage_filename
+            )
+        self._usage = GrowableArray(self.usage_filename, USAGE_DTYPE)
+        self._open_vocabulary()
+        count = min(committed, *(array.capacity for array in self._row_arrays()))
+        self._offsets.truncate(count)
+        for array in self._row_arrays():
+            array.count = count
+
+        texts = TextLog(self.texts_filename, self._offsets)
+        texts_end = 0
+        if count:
+            last_offset = int(self._offsets.view[-1])
+            texts_end = last_offset + len(texts.read_line(last_offset))
+            texts.close()
+        if os.path.getsize(self.texts_filename) > texts_end:
+            print(
+                "Warning: Dropping incomplete memory at the end of "
+                f"'{self.texts_filename}'."
+            )
+            os.truncate(self.texts_filename, texts_end)
+
+        self.data = CacheContent(texts, self._matrix())
+        self._recall = None
+        self._seen_hashes = None
+        if self.dedup_threshold is not None:
+            self._seen_hashes = set(self._hashes.view.tolist())
+        self._open_ivf()
+
+    def _row_arrays(self) -> list[GrowableArray]:
+        """The arrays with a row per memory, next to the offsets."""
+        return [
+            array
+            for array in (
+                self._embeddings,
+                self._codes,
+                self._scales,
+                self._metadata,
+                self._hashes,
+                self._usage,
+            )
+            if array is not None
+        ]
+
+    def _rebuild_hashes(self, count: int) -> None:
+        """Hash the texts of a cache that was written without a hashes file."""
+        offsets = GrowableArray(self.offsets_filename, OFFSET_DTYPE, fill=UNUSED_OFFSET)
+        offsets.count = count
+        texts = TextLog(self.texts_filename, offsets)
+        hashes = np.array([text_hash(text) for text in texts], dtype=np.uint64)
+        texts.close()
+        hashes.tofile(self.hashes_filename)
+
+    def _open_vocabulary(self) -> None:
+        """Load the interned metadata strings, dropping an incomplete last one."""
+        self._vocabulary = {}
+        self._vocabulary_size = 0
+        if not os.path.exists(self.vocabulary_filename):
+            open(self.vocabulary_filename, "wb").close()
+        self._read_vocabulary()
+        if os.path.getsize(self.vocabulary_filename) > self._vocabulary_size:
+            os.truncate(self.vocabulary_filename, self._vocabulary_size)
+
+    def _read_vocabulary(self) -> None:
+        """Load the strings interned since the vocabulary was last read."""
+        with open(self.vocabulary_filename, "rb") as f:
+            f.seek(self._vocabulary_size)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._vocabulary[orjson.loads(line)] = len(self._vocabulary) + 1
+                self._vocabulary_size += len(line)
+
+    def _intern(self, values: list[str]) -> None:
+        """Add the strings that are not in the vocabulary yet."""
+        new = [
+            value for value in dict.fromkeys(values) if value not in self._vocabulary
+        ]
+        if not new:
+            return
+        with open(self.vocabulary_filename, "ab") as f:
+            for value in new:
+                f.write(orjson.dumps(value) + b"\n")
+                self._vocabulary[value] = len(self._vocabulary) + 1
+            self._vocabulary_size = f.tell()
+
+    def _metadata_rows(self, metadata: list[dict[str, Any]]) -> np.ndarray:
+        self._intern(
+            [
+                meta[field]
+                for meta in metadata
+                for field in VOCABULARY_FIELDS
+                if field in meta
+            ]
+        )
+        rows = empty_metadata(len(metadata))
+        for row, meta in zip(rows, metadata):
+            for field in VOCABULARY_FIELDS:
+                if field in meta:
+                    row[field] = self._vocabulary[meta[field]]
+            row["chunk"] = meta.get("chunk", -1)
+            row["timestamp"] = meta.get("timestamp", 0)
+        return rows
+
+    def _filter_mask(self, filters: dict[str, Any]) -> np.ndarray | None:
+        """Select the rows whose metadata match the filters, None for all rows."""
+        if not filters:
+            return None
+        rows = self._metadata.view
+        mask = np.ones(len(rows), dtype=bool)
+        for field in VOCABULARY_FIELDS:
+            if field in filters:
+                ids = [
+                    self._vocabulary.get(value, -1)
+                    for value in filter_values(filters[field])
+                ]
+                mask &= np.isin(rows[field], ids)
+        if "chunk" in filters:
+            mask &= np.isin(rows["chunk"], filter_values(filters["chunk"]))
+        if "since" in filters:
+            mask &= rows["timestamp"] >= filters["since"]
+        if "until" in filters:
+            mask &= rows["timestamp"] <= filters["until"]
+        return mask
+
+    def _matrix(self):
+        """The embedding matrix searches score, float32 or quantized."""
+        if self._codes is None:
+            return self._embeddings.view
+        return QuantizedMatrix(
+            self._codes.view, None if self._scales is None else self._scales.view
+        )
+
+    def _convert_storage(self) -> None:
+        """Rewrite the stored rows if `LOCAL_EMBEDDING_DTYPE` or rescoring changed.
+
+        Rows are converted in chunks from the float32 file when there is one and
+        from the quantized rows otherwise, which loses their precision for good.
+
+        Raises:
+            ValueError: If the cache holds embeddings of another dimension than
+                those of the embedding provider.
+        """
+        stored = {"dtype": "float32", "float32": True}
+        if os.path.exists(self.meta_filename):
+            with open(self.meta_filename, "rb") as f:
+                stored = orjson.loads(f.read())
+        stored.setdefault("dim", LEGACY_EMBED_DIM)
+        requested = {
+            "dtype": self.embedding_dtype,
+            "float32": self.keep_float32,
+            "dim": self.dim,
+        }
+        if stored == requested:
+            return
+
+        outputs = {}
+        if requested["float32"] and not stored["float32"]:
+            outputs["float32"] = self.embeddings_filename
+        if requested["dtype"] not in (stored["dtype"], "float32"):
+            outputs["codes"] = self.codes_filenames[requested["dtype"]]
+            if requested["dtype"] == "int8":
+                outputs["scales"] = self.scales_filename
+        source = self._stored_matrix(stored)
+        if len(source) and stored["dim"] != self.dim:
+            raise ValueError(
+                f"'{self.texts_filename}' holds embeddings of dimension"
+                f" {stored['dim']}, but {get_embedding_provider().name} embeddings"
+                f" have {self.dim}. Clear the memory or use another MEMORY_INDEX."
+            )
+        if len(source):
             print(
-                f"Warning: The file '{self.filename}' does not exist. "
-                "Local memory would not be saved to a file."
+                f"Converting {len(source)} memories in '{self.texts_filename}'"
+                f" to {requested['dtype']} storage."
+            )
+        with contextlib.ExitStack() as stack:
+            files = {
+                name: stack.enter_context(open(f"{filename}.tmp", "wb"))
+                for name, filename in outputs.items()
+            }
+            for start in range(0, len(source), CONVERT_CHUNK_SIZE):
+                vectors = np.asarray(
+                    source[start : start + CONVERT_CHUNK_SIZE], dtype=np.float32
+                )
+                if "float32" in files:
+                    vectors.tofile(files["float32"])
+                if "codes" in files:
+                    codes, scales = quantize(vectors, requested["dtype"])
+                    codes.tofile(files["codes"])
+                    if scales is not None:
+                        scales.tofile(files["scales"])
+        # Release the mappings before their files are replaced or removed.
+        del source
+        for filename in outputs.values():
+            os.replace(f"{filename}.tmp", filename)
+
+        obsolete = []
+        if not requested["float32"]:
+            obsolete.append(self.embeddings_filename)
+        if stored["dtype"] not in (requested["dtype"], "float32"):
+            obsolete.append(self.codes_filenames[stored["dtype"]])
+            if stored["dtype"] == "int8" and "scales" not in outputs:
+                obsolete.append(self.scales_filename)
+        for filename in obsolete:
+            if os.path.exists(filename):
+                os.remove(filename)
+        with open(self.meta_filename, "wb") as f:
+            f.write(orjson.dumps(requested))
+        self._bump_generation()
+
+    def _stored_matrix(self, stored: dict[str, Any]):
+        """Map the committed rows of the layout described by `stored`, read-only."""
+        offsets = np.fromfile(self.offsets_filename, dtype=OFFSET_DTYPE)
+        count = int(np.searchsorted(offsets, UNUSED_OFFSET))
+        if stored["float32"]:
+            return map_rows(self.embeddings_filename, np.float32, count, stored["dim"])
+        dtype = stored["dtype"]
+        codes = map_rows(
+            self.codes_filenames[dtype], QUANTIZED_DTYPES[dtype], count, stored["dim"]
+        )
+        if dtype != "int8":
+            return QuantizedMatrix(codes)
+        scales = map_rows(self.scales_filename, np.float32, len(codes))
+        return QuantizedMatrix(codes[: len(scales)], scales)
+
+    def _open_ivf(self) -> None:
+        """Load the IVF index and assign any rows it does not cover yet."""
+        self._centroids = self._lists = None
+        self._trained_rows = 0
+        if not self.ann:
+            return
+        if os.path.exists(self.ivf_filename) and os.path.exists(self.lists_filename):
+            with np.load(self.ivf_filename) as ivf:
+                self._centroids = ivf["centroids"]
+                self._trained_rows = int(ivf["trained_rows"])
+            self._lists = GrowableArray(self.lists_filename, np.int32, fill=-1)
+            unassigned = np.flatnonzero(self._lists.allocated < 0)
+            assigned = unassigned[0] if len(unassigned) else self._lists.capacity
+            self._lists.truncate(min(assigned, self._offsets.count))
+            # Rows added while the index was disabled.
+            self._lists.append(
+                assign_lists(self.data.embeddings[self._lists.count :], self._centroids)
+            )
+        self._train_ivf()
+
+    def _train_ivf(self) -> None:
+        """(Re)build the IVF index once the cache is big enough to need one."""
+        count = self._offsets.count
+        if count < self.ann_min_rows or (
+            self._centroids is not None and count < RETRAIN_GROWTH * self._trained_rows
+        ):
+            return
+        n_lists = self.ann_lists or int(np.sqrt(count))
+        centroids = train_centroids(self.data.embeddings, n_lists)
+        lists = assign_lists(self.data.embeddings, centroids)
+
+        for filename in (self.lists_filename, self.ivf_filename):
+            if os.path.exists(filename):
+                os.remove(filename)
+        lists.tofile(self.lists_filename)
+        np.savez(self.ivf_filename, centroids=centroids, trained_rows=count)
+
+        self._centroids = centroids
+        self._trained_rows = count
+        self._lists = GrowableArray(self.lists_filename, np.int32, fill=-1)
+        self._lists.count = count
+        self._bump_generation()
+
+    def _rebuild_offsets(self) -> None:
+        """Index a text log that was written without an offsets file."""
+        offsets = []
+        position = 0
+        with open(self.texts_filename, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offsets.append(position)
+                position += len(line)
+        np.array(offsets, dtype=OFFSET_DTYPE).tofile(self.offsets_filename)
+
+    def _load_legacy(self) -> tuple[list[str], np.ndarray]:
+        """Read the single-file JSON format written by older versions."""
+        try:
+            with open(self.legacy_filename, "rb") as f:
+                file_content = f.read()
+            if not file_content.strip():
+                return [], create_default_embeddings()
+            loaded = orjson.loads(file_content)
+        except orjson.JSONDecodeError:
+            print(f"Error: The file '{self.legacy_filename}' is not in JSON format.")
+            return [], create_default_embeddings()
+
+        embeddings = np.array(loaded.get("embeddings", []), dtype=np.float32)
+        embeddings = embeddings.reshape(-1, LEGACY_EMBED_DIM)
+        print(
+            f"Importing {len(embeddings)} memories from '{self.legacy_filename}'"
+            f" into '{self.texts_filename}'."
+        )
+        return loaded.get("texts", []), embeddings
+
+    def _rewrite(self, texts: Sequence[str], embeddings: np.ndarray) -> None:
+        """Write the whole cache out from scratch. Only used on import and clear."""
+        offsets = []
+        with open(self.texts_filename, "wb") as f:
+            for text in texts:
+                offsets.append(f.tell())
+                f.write(orjson.dumps({"text": text}) + b"\n")
+        np.ascontiguousarray(embeddings, dtype=np.float32).tofile(
+            self.embeddings_filename
+        )
+        np.array(offsets, dtype=OFFSET_DTYPE).tofile(self.offsets_filename)
+        empty_metadata(len(texts)).tofile(self.metadata_filename)
+        hashes = [text_hash(text) for text in texts]
+        np.array(hashes, dtype=np.uint64).tofile(self.hashes_filename)
+        new_usage(np.full(len(texts), time.time())).tofile(self.usage_filename)
+        open(self.vocabulary_filename, "wb").close()
+        with open(self.meta_filename, "wb") as f:
+            f.write(
+                orjson.dumps(
+                    {"dtype": "float32", "float32": True, "dim": embeddings.shape[1]}
+                )
             )
-            self.data = CacheContent()
+        self._bump_generation()
 
-    def add(self, text: str):
+    def add(self, text: str, metadata: dict[str, Any] | None = None):
         """
         Add text to our list of texts, add embedding as row to our
             embeddings-matrix
 
         Args:
             text: str
+            metadata: The metadata fields of the memory, see METADATA_FIELDS
 
         Returns: None
         """
-        if "Command Error:" in text:
-            return ""
-        self.data.texts.append(text)
+        return self.add_many([text], None if metadata is None else [metadata])[0]
 
-        embedding = create_embedding_with_ada(text)
+    def add_many(
+        self, texts: list[str], metadata: list[dict[str, Any] | None] | None = None
+    ) -> list[str]:
+        """
+        Add many texts at once, embedding them in batched requests and appending
+            their rows to the files in one go
 
-        vector = np.array(embedding).astype(np.float32)
-        vector = vector[np.newaxis, :]
-        self.data.embeddings = np.concatenate(
-            [
-                self.data.embeddings,
-                vector,
-            ],
-            axis=0,
+        Args:
+            texts: list[str]
+            metadata: The metadata fields of each memory, see METADATA_FIELDS
+
+        Returns: The added texts, with "" for the ones that were skipped
+        """
+        metadata = metadata or [None for _ in texts]
+        positions = [i for i, text in enumerate(texts) if "Command Error:" not in text]
+        if self.dedup_threshold is not None:
+            # Spares embedding the texts that are known duplicates already.
+            positions = self._drop_exact_duplicates(texts, positions)
+        embeddings = create_default_embeddings(self.dim)
+        if positions:
+            embeddings = create_embeddings([texts[i] for i in positions])
+            embeddings = np.array(embeddings, dtype=np.float32)
+        # The texts are embedded before locking, so that other processes are
+        # not kept waiting on the API.
+        with self._locked(exclusive=True):
+            positions = self._append(texts, metadata, positions, embeddings)
+        added_positions = set(positions)
+        return [text if i in added_positions else "" for i, text in enumerate(texts)]
+
+    def add_embedded(
+        self,
+        texts: list[str],
+        embeddings,
+        metadata: list[dict[str, Any] | None] | None = None,
+    ) -> list[str]:
+        """
+        Add many texts with their embeddings, appending their rows to the files
+            in one go without embedding anything
+
+        Args:
+            texts: list[str]
+            embeddings: One embedding per text
+            metadata: The metadata fields of each memory, see METADATA_FIELDS
+
+        Returns: The added texts, with "" for the ones that were skipped
+        """
+        metadata = metadata or [None for _ in texts]
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+        if texts and embeddings.shape[1] != self.dim:
+            raise ValueError(
+                f"The embeddings have {embeddings.shape[1]} dimensions, the local"
+                f" memory {self.dim}."
+            )
+        with self._locked(exclusive=True):
+            positions = self._append(
+                texts, metadata, list(range(len(texts))), embeddings
+            )
+        added_positions = set(positions)
+        return [text if i in added_positions else "" for i, text in enumerate(texts)]
+
+    def _append(
+        self,
+        texts: list[str],
+        metadata: list[dict[str, Any] | None],
+        positions: list[int],
+        embeddings: np.ndarray,
+    ) -> list[int]:
+        """Append the texts at some positions, with their embeddings, unless they
+        are duplicates. Returns the positions that were added."""
+        self._apply_hits()
+        if positions and self.dedup_threshold is not None:
+            # Other processes may have added the same texts in the meantime.
+            kept = self._drop_exact_duplicates(texts, positions)
+            embeddings = embeddings[np.isin(positions, kept)]
+            positions = kept
+            unique = ~self._near_duplicates(embeddings)
+            self.duplicates_skipped += len(positions) - int(unique.sum())
+            positions = [i for i, keep in zip(positions, unique) if keep]
+            embeddings = embeddings[unique]
+        added = [texts[i] for i in positions]
+        added_metadata = [build_metadata(metadata[i]) for i in positions]
+        if added:
+            if self._embeddings is not None:
+                self._embeddings.append(embeddings)
+            if self._codes is not None:
+                codes, scales = quantize(embeddings, self.embedding_dtype)
+                self._codes.append(codes)
+                if self._scales is not None:
+                    self._scales.append(scales)
+            if self._centroids is not None:
+                self._lists.append(assign_lists(embeddings, self._centroids))
+            self._metadata.append(self._metadata_rows(added_metadata))
+            self._usage.append(new_usage(np.full(len(added), time.time())))
+            hashes = [text_hash(text) for text in added]
+            self._hashes.append(hashes)
+            if self._seen_hashes is not None:
+                self._seen_hashes.update(hashes)
+
+            offsets = []
+            with open(self.texts_filename, "ab") as f:
+                for text, meta in zip(added, added_metadata):
+                    offsets.append(f.tell())
+                    f.write(orjson.dumps({"text": text, "metadata": meta}) + b"\n")
+            self._offsets.append(offsets)
+
+            self.data.embeddings = self._matrix()
+            if self.ann:
+                self._train_ivf()
+            self._evict()
+        return positions
+
+    def _drop_exact_duplicates(
+        self, texts: list[str], positions: list[int]
+    ) -> list[int]:
+        """Drop the texts that are stored already or repeat an earlier one."""
+        unique = []
+        seen = set()
+        for i in positions:
+            hash_ = text_hash(texts[i])
+            if hash_ in self._seen_hashes or hash_ in seen:
+                self.duplicates_skipped += 1
+            else:
+                unique.append(i)
+                seen.add(hash_)
+        return unique
+
+    def _near_duplicates(self, embeddings: np.ndarray) -> np.ndarray:
+        """Flag the embeddings within dedup_threshold of a stored or earlier one."""
+        scores = np.full(len(embeddings), -np.inf)
+        if self._offsets.count and len(embeddings):
+            # The lists an IVF search probes can be empty, then nothing is near.
+            found = [
+                (i, rows[0])
+                for i, rows in enumerate(self._search(embeddings, 1))
+                if len(rows)
+            ]
+            if found:
+                queries, nearest = map(np.array, zip(*found))
+                scores[queries] = np.einsum(
+                    "ij,ij->i", self._vectors(nearest), embeddings[queries]
+                )
+        return near_duplicates(embeddings, scores, self.dedup_threshold)
+
+    def _stored_bytes(self) -> int:
+        """The size of the committed memories in the files of the cache."""
+        arrays = [self._offsets, *self._row_arrays()]
+        if self._lists is not None:
+            arrays.append(self._lists)
+        row_bytes = sum(array.row_size for array in arrays)
+        return os.path.getsize(self.texts_filename) + self._offsets.count * row_bytes
+
+    def _evict(self) -> None:
+        """Remove memories by the eviction policy while the cache is over a limit."""
+        count = self._offsets.count
+        excess = 0
+        if self.max_memories and count > self.max_memories:
+            excess = count - max(int(self.max_memories * EVICTION_HEADROOM), 1)
+        if self.max_bytes:
+            size = self._stored_bytes()
+            if size > self.max_bytes:
+                row_bytes = size / count
+                overflow = size - self.max_bytes * EVICTION_HEADROOM
+                excess = max(excess, math.ceil(overflow / row_bytes))
+        if not excess:
+            return
+        keys = EVICTION_POLICIES[self.eviction_policy](
+            self._usage.view, self._metadata.view
         )
+        evicted = np.sort(np.lexsort(keys)[: min(excess, count)])
+        if self.archive:
+            self._archive_rows(evicted)
+        self._compact(np.setdiff1d(np.arange(count), evicted, assume_unique=True))
+        self.evicted += len(evicted)
+
+    def _archive_rows(self, rows: np.ndarray) -> None:
+        """Append the records of some rows, with their embeddings, to the archive."""
+        vectors = self._vectors(rows)
+        with open(self.archive_filename, "ab") as f:
+            for i, vector in zip(rows.tolist(), vectors):
+                record = self.data.texts.record(i)
+                record["embedding"] = vector
+                f.write(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
 
-        with open(self.filename, "wb") as f:
-            out = orjson.dumps(self.data, option=SAVE_OPTIONS)
-            f.write(out)
-        return text
+    def _compact(self, keep: np.ndarray) -> None:
+        """Rewrite the cache with only the rows in `keep`, then reopen it."""
+        arrays = self._row_arrays()
+        if self._lists is not None:
+            arrays.append(self._lists)
+        offsets = np.empty(len(keep), dtype=OFFSET_DTYPE)
+        with open(f"{self.texts_filename}.tmp", "wb") as f:
+            for j, offset in enumerate(self._offsets.view[keep].tolist()):
+                offsets[j] = f.tell()
+                f.write(self.data.texts.read_line(offset))
+        for array in arrays:
+            np.ascontiguousarray(array.view[keep]).tofile(f"{array.filename}.tmp")
+        offsets.tofile(f"{self.offsets_filename}.tmp")
+
+        # The offsets go last, like when appending.
+        filenames = [
+            self.texts_filename,
+            *(array.filename for array in arrays),
+            self.offsets_filename,
+        ]
+        with open(f"{self.compaction_filename}.tmp", "wb") as f:
+            f.write(orjson.dumps(filenames))
+        os.replace(f"{self.compaction_filename}.tmp", self.compaction_filename)
+
+        self._close()
+        self._finish_compaction()
+        self._bump_generation()
+        self._open()
+
+    def _finish_compaction(self) -> None:
+        """Move the files of a started compaction into place."""
+        if not os.path.exists(self.compaction_filename):
+            return
+        with open(self.compaction_filename, "rb") as f:
+            filenames = orjson.loads(f.read())
+        for filename in filenames:
+            if os.path.exists(f"{filename}.tmp"):
+                os.replace(f"{filename}.tmp", filename)
+        os.remove(self.compaction_filename)
+
+    def _record_hits(self, rows: np.ndarray, scores: np.ndarray) -> None:
+        """Count a retrieval of some rows, for eviction.
+
+        Searches only hold the shared lock, so the usage file is updated by the
+        next write, which holds the exclusive one, before it evicts anything. They
+        are summed per row meanwhile, so processes that only read stay bounded.
+        """
+        if self._pending_generation != self._generation:
+            # The files were rewritten, so the rows of those have moved.
+            self._pending_hits = {}
+            self._pending_generation = self._generation
+        now = time.time()
+        for row, row_score in zip(rows.tolist(), scores.tolist()):
+            hits, importance, _ = self._pending_hits.get(row, (0, 0.0, now))
+            self._pending_hits[row] = (hits + 1, importance + row_score, now)
+
+    def _apply_hits(self) -> None:
+        """Write the pending retrievals to the usage file, under the exclusive
+        lock. Those counted before the files were rewritten are dropped, as
+        their rows have moved."""
+        if self._pending_hits and self._pending_generation == self._generation:
+            usage = self._usage.view
+            rows = np.fromiter(self._pending_hits, dtype=np.intp)
+            hits, importance, last_used = zip(*self._pending_hits.values())
+            usage["hits"][rows] += np.array(hits, dtype=usage["hits"].dtype)
+            usage["importance"][rows] += np.array(
+                importance, dtype=usage["importance"].dtype
+            )
+            usage["last_used"][rows] = last_used
+        self._pending_hits = {}
+
+    def _record_scored_hits(self, memories: list[ScoredMemory]) -> None:
+        self._record_hits(
+            np.array([int(memory.id) for memory in memories], dtype=np.intp),
+            np.array([memory.score for memory in memories], dtype=np.float32),
+        )
 
     def clear(self) -> str:
         """
-        Clears the redis server.
+        Clears the local cache and truncates its files.
 
         Returns: A message indicating that the memory has been cleared.
         """
-        self.data = CacheContent()
+        with self._locked(exclusive=True):
+            self._pending_hits = {}
+            self._close()
+            for filename in (self.lists_filename, self.ivf_filename):
+                if os.path.exists(filename):
+                    os.remove(filename)
+            self._rewrite([], create_default_embeddings(self.dim))
+            self._convert_storage()
+            self._open()
         return "Obliviated"
 
     def get(self, data: str) -> list[Any] | None:
@@ -110,7 +1121,9 @@ class LocalCache(MemoryProviderSingleton):
         """
         return self.get_relevant(data, 1)
 
-    def get_relevant(self, text: str, k: int) -> list[Any]:
+    def get_relevant(
+        self, text: str, k: int, filters: dict[str, Any] | None = None
+    ) -> list[Any]:
         """ "
         matrix-vector mult to find score-for-each-row-of-matrix
          get indices for top-k winning scores
@@ -118,19 +1131,225 @@ class LocalCache(MemoryProviderSingleton):
         Args:
             text: str
             k: int
+            filters: Only search the memories whose metadata match these
 
         Returns: List[str]
         """
-        embedding = create_embedding_with_ada(text)
+        return self.get_relevant_many([text], k, filters)[0]
 
-        scores = np.dot(self.data.embeddings, embedding)
+    def get_relevant_many(
+        self, texts: list[str], k: int = 5, filters: dict[str, Any] | None = None
+    ) -> list[list[Any]]:
+        """
+        matrix-matrix mult to score every row for every query at once
+        Args:
+            texts: list[str]
+            k: int
+            filters: Only search the memories whose metadata match these
+
+        Returns: List[List[str]], the top-k texts for each query
+        """
+        embeddings = np.array(create_embeddings(texts), dtype=np.float32)
 
-        top_k_indices = np.argsort(scores)[-k:][::-1]
+        with self._locked():
+            top_k_indices = self._search(
+                embeddings, k, mask=self._filter_mask(check_filters(filters))
+            )
+            for query, indices in zip(embeddings, top_k_indices):
+                self._record_hits(indices, np.dot(self._vectors(indices), query))
+
+            return [[self.data.texts[i] for i in indices] for indices in top_k_indices]
 
-        return [self.data.texts[i] for i in top_k_indices]
+    def get_relevant_scored(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        min_score: float | None = None,
+        mmr_lambda: float | None = None,
+        filters: dict[str, Any] | None = None,
+    ) -> list[ScoredMemory]:
+        """See MemoryProviderSingleton.get_relevant_scored. The returned memories
+        count as retrieved for eviction."""
+        diversify = mmr_lambda is not None and mmr_lambda < 1
+        query = np.array(create_embeddings([data]), dtype=np.float32)
+        with self._locked():
+            candidates = self._score_candidates(
+                query,
+                num_relevant * MMR_CANDIDATE_FACTOR if diversify else num_relevant,
+                diversify,
+                check_filters(filters),
+            )
+            memories = rank_scored(candidates, num_relevant, min_score, mmr_lambda)
+            self._record_scored_hits(memories)
+        return memories
 
-    def get_stats(self) -> tuple[int, tuple[int, ...]]:
+    def _get_scored_candidates(
+        self,
+        data: str,
+        num_candidates: int,
+        with_embeddings: bool,
+        filters: dict[str, Any],
+        embedding: Any = None,
+    ) -> list[ScoredMemory]:
+        """See MemoryProviderSingleton._get_scored_candidates. The backends
+        wrapping this one search through it, so it takes the lock itself, and the
+        candidates count as retrieved for eviction."""
+        query = np.array(
+            create_embeddings([data]) if embedding is None else [embedding],
+            dtype=np.float32,
+        )
+        with self._locked():
+            candidates = self._score_candidates(
+                query, num_candidates, with_embeddings, filters
+            )
+            self._record_scored_hits(candidates)
+        return candidates
+
+    def _score_candidates(
+        self,
+        query: np.ndarray,
+        num_candidates: int,
+        with_embeddings: bool,
+        filters: dict[str, Any],
+    ) -> list[ScoredMemory]:
+        mask = self._filter_mask(filters)
+        indices = self._search(query, num_candidates, mask=mask)[0]
+        vectors = self._vectors(indices)
+        scores = np.dot(vectors, query[0])
+        records = [self.data.texts.record(i) for i in indices.tolist()]
+        return [
+            ScoredMemory(
+                text=record["text"],
+                score=float(row_score),
+                id=str(i),
+                metadata=record.get("metadata", {}),
+                embedding=vector if with_embeddings else None,
+            )
+            for i, record, row_score, vector in zip(
+                indices.tolist(), records, scores, vectors
+            )
+        ]
+
+    def _vectors(self, indices: np.ndarray) -> np.ndarray:
+        """The embeddings of some rows, in float32 when those rows are kept."""
+        if self._embeddings is None:
+            return np.asarray(self.data.embeddings[indices], dtype=np.float32)
+        return np.asarray(self._embeddings.view[indices], dtype=np.float32)
+
+    def _search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        exact: bool = False,
+        mask: np.ndarray | None = None,
+    ) -> list[np.ndarray]:
+        """Return the rows with the top-k scores for each query, best first.
+
+        Uses the IVF index when there is one, unless `exact` is set. Quantized
+        rows are scored as stored, and the best of them are rescored in float32
+        when the float32 rows are kept. With a mask only the selected rows are
+        scored, exactly when there are too few of them to need the index.
+        """
+        rescore = self._codes is not None and self._embeddings is not None
+        n = k * RESCORE_FACTOR if rescore else k
+        rows = None if mask is None else np.flatnonzero(mask)
+        if rows is not None and (
+            exact or self._centroids is None or len(rows) < self.ann_min_rows
+        ):
+            scores = score(self.data.embeddings[rows], queries)
+            top_k_indices = [rows[indices] for indices in top_k(scores, n)]
+        elif exact or self._centroids is None:
+            top_k_indices = list(top_k(score(self.data.embeddings, queries), n))
+        else:
+            top_k_indices = []
+            for query in queries:
+                candidates = probe_candidates(
+                    query, self._centroids, self._lists.view, self.ann_probe
+                )
+                if mask is not None:
+                    candidates = candidates[mask[candidates]]
+                scores = np.dot(self.data.embeddings[candidates], query)
+                top_k_indices.append(candidates[top_k(scores, n)])
+        if rescore:
+            top_k_indices = [
+                self._rescore(query, indices, k)
+                for query, indices in zip(queries, top_k_indices)
+            ]
+        return top_k_indices
+
+    def _rescore(self, query: np.ndarray, indices: np.ndarray, k: int) -> np.ndarray:
+        """Reorder candidate rows by their float32 scores and keep the top k."""
+        indices = np.sort(indices)
+        scores = np.dot(self._embeddings.view[indices], query)
+        return indices[top_k(scores, k)]
+
+    def _estimate_recall(self, k: int = 10, n_queries: int = 32) -> float | None:
+        """Estimate recall@k of the quantized scores against float32 scores.
+
+        Rows of the cache serve as queries. Only possible while the float32 rows
+        are kept, and cached until the cache has doubled in size.
+        """
+        count = self._offsets.count
+        if self._codes is None or self._embeddings is None or count == 0:
+            return None
+        if self._recall is not None and count < 2 * self._recall[0]:
+            return self._recall[1]
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(count, min(n_queries, count), replace=False))
+        queries = np.asarray(self._embeddings.view[sample])
+        k = min(k, count)
+        exact = np.argsort(np.dot(queries, self._embeddings.view.T), axis=1)[:, -k:]
+        approx = np.argsort(score(self.data.embeddings, queries), axis=1)[:, -k:]
+        recall = float(
+            np.mean(
+                [
+                    len(set(a) & set(b)) / k
+                    for a, b in zip(exact.tolist(), approx.tolist())
+                ]
+            )
+        )
+        self._recall = (count, recall)
+        return recall
+
+    def export_batches(self, batch_size: int = 1000):
+        """
+        Yields every memory in batches of (ids, texts, metadata, embeddings),
+            holding the shared lock throughout so that the export is consistent.
+            Rows stored as int8 without float32 rows are exported dequantized.
+        """
+        with self._locked():
+            count = self._offsets.count
+            for start in range(0, count, batch_size):
+                rows = np.arange(start, min(start + batch_size, count))
+                records = [self.data.texts.record(i) for i in rows.tolist()]
+                yield (
+                    [str(i) for i in rows.tolist()],
+                    [record["text"] for record in records],
+                    [record.get("metadata", {}) for record in records],
+                    self._vectors(rows),
+                )
+
+    def get_stats(self) -> dict[str, Any]:
         """
         Returns: The stats of the local cache.
         """
-        return len(self.data.texts), self.data.embeddings.shape
+        with self._locked():
+            return self._get_stats()
+
+    def _get_stats(self) -> dict[str, Any]:
+        embeddings = self.data.embeddings
+        float32_bytes = len(embeddings) * self.dim * np.dtype(np.float32).itemsize
+        stats = {
+            "memories": len(self.data.texts),
+            "shape": embeddings.shape,
+            "dtype": self.embedding_dtype,
+            "embedding_bytes": embeddings.nbytes,
+            "bytes_saved": float32_bytes - embeddings.nbytes,
+            "duplicates_skipped": self.duplicates_skipped,
+            "stored_bytes": self._stored_bytes(),
+            "evicted": self.evicted,
+        }
+        if self._codes is not None:
+            stats["rescore"] = self._embeddings is not None
+            stats["recall_at_10"] = self._estimate_recall()
+        return stats
@@ -1,11 +1,127 @@
 """ Milvus memory storage provider."""
-from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, connections
+import atexit
+import json
+import threading
 
-from autogpt.memory.base import MemoryProviderSingleton, get_ada_embedding
+import numpy as np
+from pymilvus import (
+    Collection,
+    CollectionSchema,
+    DataType,
+    FieldSchema,
+    connections,
+    utility,
+)
+
+from autogpt.llm_utils import (
+    create_embedding,
+    create_embeddings,
+    get_embedding_provider,
+)
+from autogpt.memory.base import (
+    MemoryProviderSingleton,
+    ScoredMemory,
+    build_metadata,
+    check_filters,
+    filter_values,
+)
+
+METADATA_FIELD_SCHEMAS = [
+    FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=65535),
+    FieldSchema(name="kind", dtype=DataType.VARCHAR, max_length=256),
+    FieldSchema(name="session", dtype=DataType.VARCHAR, max_length=256),
+    FieldSchema(name="chunk", dtype=DataType.INT64),
+    FieldSchema(name="timestamp", dtype=DataType.DOUBLE),
+]
+# Scalar fields cannot be null, so unset metadata is stored as these.
+UNSET_METADATA = {
+    "source": "",
+    "kind": "",
+    "session": "",
+    "chunk": -1,
+    "timestamp": 0.0,
+}
+# The build parameters of each index type, and the search parameter it uses.
+INDEX_TYPES = {
+    "HNSW": ("M", "efConstruction"),
+    "IVF_FLAT": ("nlist",),
+    "FLAT": (),
+}
+SEARCH_PARAMS = {"HNSW": "ef", "IVF_FLAT": "nprobe", "FLAT": None}
+
+
+def connect(address) -> None:
+    """Connect to a Milvus server at host:port, or to a Milvus Lite database
+    file when the address ends with .db.
+    """
+    if address.endswith(".db"):
+        connections.connect(uri=address)
+    else:
+        connections.connect(address=address)
+
+
+def index_params(cfg) -> dict:
+    """The index of the embeddings field configured in cfg.
+
+    Raises:
+        ValueError: If the index type is not supported.
+    """
+    index_type = cfg.milvus_index_type
+    if index_type not in INDEX_TYPES:
+        raise ValueError(
+            f"Unsupported MILVUS_INDEX_TYPE {index_type},"
+            f" expected one of {', '.join(INDEX_TYPES)}"
+        )
+    values = {
+        "M": cfg.milvus_hnsw_m,
+        "efConstruction": cfg.milvus_hnsw_ef_construction,
+        "nlist": cfg.milvus_ivf_nlist,
+    }
+    return {
+        "metric_type": "IP",
+        "index_type": index_type,
+        "params": {name: values[name] for name in INDEX_TYPES[index_type]},
+    }
+
+
+def filter_expression(filters, fields):
+    """Translate checked memory filters into a Milvus boolean expression.
+
+    Args:
+        filters (dict): The checked filters.
+        fields (list[str]): The metadata fields the collection has.
+
+    Returns:
+        str | None: The expression, None to search everything.
+    """
+    for key in filters:
+        field = "timestamp" if key in ("since", "until") else key
+        if field not in fields:
+            raise ValueError(
+                f"The Milvus collection has no {field} field;"
+                " clear the memory to recreate it with metadata fields."
+            )
+    clauses = []
+    for field in ("source", "kind", "session", "chunk"):
+        if field in filters:
+            clauses.append(f"{field} in {json.dumps(filter_values(filters[field]))}")
+    if "since" in filters:
+        clauses.append(f"timestamp >= {float(filters['since'])}")
+    if "until" in filters:
+        clauses.append(f"timestamp <= {float(filters['until'])}")
+    return " and ".join(clauses) or None
 
 
 class MilvusMemory(MemoryProviderSingleton):
-    """Milvus memory storage provider."""
+    """Milvus memory storage provider.
+
+    With `MILVUS_PARTITION` set, memories are inserted into that partition of
+    the collection and searches only look there, so agents sharing a collection
+    keep their memories apart. With `MILVUS_WRITE_BUFFER` set, new memories are
+    inserted that many at a time, or `MILVUS_FLUSH_INTERVAL` seconds after the
+    first of them was buffered; the buffer is flushed before every search and
+    at exit.
+    """
 
     def __init__(self, cfg) -> None:
         """Construct a milvus memory storage connection.
@@ -13,48 +129,218 @@ class MilvusMemory(MemoryProviderSingleton):
         Args:
             cfg (Config): Auto-GPT global config.
         """
-        # connect to milvus server.
-        connections.connect(address=cfg.milvus_addr)
+        # connect to milvus server, or open a milvus lite database.
+        connect(cfg.milvus_addr)
         fields = [
             FieldSchema(name="pk", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="embeddings", dtype=DataType.FLOAT_VECTOR, dim=1536),
+            FieldSchema(
+                name="embeddings",
+                dtype=DataType.FLOAT_VECTOR,
+                dim=get_embedding_provider().dimension,
+            ),
             FieldSchema(name="raw_text", dtype=DataType.VARCHAR, max_length=65535),
+            *METADATA_FIELD_SCHEMAS,
         ]
 
+        self.dedup_threshold = cfg.memory_dedup_threshold if cfg.memory_dedup else None
+        self.index_params = index_params(cfg)
+        self.search_param = SEARCH_PARAMS[self.index_params["index_type"]]
+        self.search_value = {
+            "ef": cfg.milvus_search_ef,
+            "nprobe": cfg.milvus_search_nprobe,
+        }.get(self.search_param)
+        self.partition = cfg.milvus_partition or None
+        self.write_buffer_size = cfg.milvus_write_buffer
+        self.flush_interval = cfg.milvus_flush_interval
+        self._buffer = []
+        self._buffer_lock = threading.RLock()
+        self._flush_timer = None
+
         # create collection if not exist and load it.
         self.milvus_collection = cfg.milvus_collection
         self.schema = CollectionSchema(fields, "auto-gpt memory storage")
-        self.collection = Collection(self.milvus_collection, self.schema)
-        # create index if not exist.
-        if not self.collection.has_index():
-            self.collection.release()
-            self.collection.create_index(
-                "embeddings",
-                {
-                    "metric_type": "IP",
-                    "index_type": "HNSW",
-                    "params": {"M": 8, "efConstruction": 64},
-                },
-                index_name="embeddings",
-            )
+        if utility.has_collection(self.milvus_collection):
+            # Collections created before metadata existed keep their schema
+            # until they are cleared.
+            self.collection = Collection(self.milvus_collection)
+        else:
+            self.collection = Collection(self.milvus_collection, self.schema)
+        self._create_index()
+        self._create_partition()
         self.collection.load()
+        atexit.register(self.flush)
+
+    def _create_index(self) -> None:
+        """Create the index of the embeddings if there is none, or rebuild it
+        when its type or build parameters differ from the configured ones.
+        """
+        if self.collection.has_index():
+            current = self.collection.index().params
+            if current.get("index_type") == self.index_params["index_type"] and {
+                name: str(value) for name, value in current.get("params", {}).items()
+            } == {
+                name: str(value) for name, value in self.index_params["params"].items()
+            }:
+                return
+            self.collection.release()
+            self.collection.drop_index()
+        else:
+            self.collection.release()
+        self.collection.create_index(
+            "embeddings", self.index_params, index_name="embeddings"
+        )
+
+    def _create_partition(self) -> None:
+        """Create the partition of the session if it does not exist."""
+        if self.partition and not self.collection.has_partition(self.partition):
+            self.collection.create_partition(self.partition)
+
+    @property
+    def _partition_names(self) -> list | None:
+        """The partitions searched, None for the whole collection."""
+        return [self.partition] if self.partition else None
+
+    def _search(self, embeddings, limit, expr, output_fields):
+        """Search the embeddings in the partition of the session."""
+        self.flush()
+        params = {}
+        if self.search_param == "ef":
+            # HNSW cannot search fewer candidates than the results it returns.
+            params["ef"] = max(self.search_value, limit)
+        elif self.search_param:
+            params[self.search_param] = self.search_value
+        return self.collection.search(
+            embeddings,
+            "embeddings",
+            {"metric_type": "IP", "params": params},
+            limit,
+            expr=expr,
+            output_fields=output_fields,
+            partition_names=self._partition_names,
+        )
+
+    def _metadata_fields(self) -> list:
+        """The metadata fields of the collection, in schema order."""
+        return [
+            field.name
+            for field in self.collection.schema.fields
+            if field.name in UNSET_METADATA
+        ]
 
-    def add(self, data) -> str:
+    def add(self, data, metadata=None) -> str:
         """Add an embedding of data into memory.
 
         Args:
             data (str): The raw text to construct embedding index.
+            metadata (dict, optional): The metadata fields of the text.
 
         Returns:
             str: log.
         """
-        embedding = get_ada_embedding(data)
-        result = self.collection.insert([[embedding], [data]])
-        _text = (
-            "Inserting data into memory at primary key: "
-            f"{result.primary_keys[0]}:\n data: {data}"
+        return self.add_many([data], None if metadata is None else [metadata])[0]
+
+    def add_many(self, data, metadata=None) -> list:
+        """Add the embeddings of many texts into memory with a single insert.
+
+        Args:
+            data (list[str]): The raw texts to construct embedding index.
+            metadata (list[dict], optional): The metadata fields of each text.
+
+        Returns:
+            list[str]: log for each text.
+        """
+        metadata = metadata or [None for _ in data]
+        if not data:
+            return []
+        unique, embeddings = self._drop_duplicates(
+            data, list(range(len(data))), create_embeddings(data)
+        )
+        if not unique:
+            return ["" for _ in data]
+        return self._insert(data, metadata, unique, embeddings)
+
+    def add_embedded(self, data, embeddings, metadata=None) -> list:
+        """Add many texts with their embeddings in a single insert, without
+        embedding anything.
+
+        Args:
+            data (list[str]): The raw texts.
+            embeddings (list): The embedding of each text.
+            metadata (list[dict], optional): The metadata fields of each text.
+
+        Returns:
+            list[str]: log for each text.
+        """
+        metadata = metadata or [None for _ in data]
+        if not data:
+            return []
+        unique, embeddings = self._drop_duplicates(
+            data, list(range(len(data))), embeddings
+        )
+        if not unique:
+            return ["" for _ in data]
+        return self._insert(data, metadata, unique, embeddings)
+
+    def _nearest_scores(self, embeddings):
+        """Search the nearest memory of every embedding in a single request."""
+        results = self._search(
+            [list(map(float, embedding)) for embedding in embeddings], 1, None, []
         )
-        return _text
+        return np.array([hits[0].distance if hits else -np.inf for hits in results])
+
+    def _insert(self, data, metadata, unique, embeddings) -> list:
+        messages = ["" for _ in data]
+        texts = [data[i] for i in unique]
+        unique_metadata = [build_metadata(metadata[i]) for i in unique]
+        rows = [
+            (list(map(float, embedding)), text, meta)
+            for embedding, text, meta in zip(embeddings, texts, unique_metadata)
+        ]
+        if self.write_buffer_size:
+            with self._buffer_lock:
+                self._buffer.extend(rows)
+                if len(self._buffer) >= self.write_buffer_size:
+                    self.flush()
+                elif self._flush_timer is None and self.flush_interval > 0:
+                    self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+            for i in unique:
+                messages[i] = (
+                    f"Buffering data for insert into memory:\n data: {data[i]}"
+                )
+            return messages
+        for i, primary_key in zip(unique, self._insert_rows(rows)):
+            messages[i] = (
+                f"Inserting data into memory at primary key: {primary_key}:\n"
+                f" data: {data[i]}"
+            )
+        return messages
+
+    def _insert_rows(self, rows) -> list:
+        """Insert (embedding, text, metadata) rows into the partition of the
+        session.
+
+        Returns:
+            list: The primary key of each row.
+        """
+        columns = [[row[0] for row in rows], [row[1] for row in rows]]
+        for field in self._metadata_fields():
+            columns.append([row[2].get(field, UNSET_METADATA[field]) for row in rows])
+        return self.collection.insert(
+            columns, partition_name=self.partition
+        ).primary_keys
+
+    def flush(self) -> None:
+        """Insert the buffered memories in a single request."""
+        with self._buffer_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            self._insert_rows(rows)
 
     def get(self, data):
         """Return the most relevant data in memory.
@@ -64,52 +350,149 @@ class MilvusMemory(MemoryProviderSingleton):
         return self.get_relevant(data, 1)
 
     def clear(self) -> str:
-        """Drop the index in memory.
+        """Drop the memories of the session partition, or the whole collection
+        when there is no partition or its schema predates the metadata fields.
 
         Returns:
             str: log.
         """
-        self.collection.drop()
-        self.collection = Collection(self.milvus_collection, self.schema)
-        self.collection.create_index(
-            "embeddings",
-            {
-                "metric_type": "IP",
-                "index_type": "HNSW",
-                "params": {"M": 8, "efConstruction": 64},
-            },
-            index_name="embeddings",
-        )
+        with self._buffer_lock:
+            self._buffer = []
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        if self.partition and len(self._metadata_fields()) == len(UNSET_METADATA):
+            self.collection.release()
+            if self.collection.has_partition(self.partition):
+                self.collection.drop_partition(self.partition)
+        else:
+            self.collection.drop()
+            self.collection = Collection(self.milvus_collection, self.schema)
+            self._create_index()
+        self._create_partition()
         self.collection.load()
         return "Obliviated"
 
-    def get_relevant(self, data: str, num_relevant: int = 5):
+    def get_relevant(self, data: str, num_relevant: int = 5, filters=None):
         """Return the top-k relevant data in memory.
         Args:
             data: The data to compare to.
             num_relevant (int, optional): The max number of relevant data.
                 Defaults to 5.
+            filters (dict, optional): Only search the data whose metadata match
+                these.
 
         Returns:
             list: The top-k relevant data.
         """
-        # search the embedding and return the most relevant text.
-        embedding = get_ada_embedding(data)
-        search_params = {
-            "metrics_type": "IP",
-            "params": {"nprobe": 8},
-        }
-        result = self.collection.search(
-            [embedding],
-            "embeddings",
-            search_params,
+        return self.get_relevant_many([data], num_relevant, filters)[0]
+
+    def get_relevant_many(self, data, num_relevant: int = 5, filters=None):
+        """Return the top-k relevant data in memory for each of many queries,
+        searching all of them in one request.
+        Args:
+            data (list[str]): The data to compare to.
+            num_relevant (int, optional): The max number of relevant data.
+                Defaults to 5.
+            filters (dict, optional): Only search the data whose metadata match
+                these.
+
+        Returns:
+            list: The top-k relevant data for each query.
+        """
+        # search the embeddings and return the most relevant texts.
+        result = self._search(
+            create_embeddings(data),
             num_relevant,
+            expr=filter_expression(check_filters(filters), self._metadata_fields()),
             output_fields=["raw_text"],
         )
-        return [item.entity.value_of_field("raw_text") for item in result[0]]
+        return [
+            [item.entity.value_of_field("raw_text") for item in hits] for hits in result
+        ]
+
+    def _get_scored_candidates(
+        self,
+        data: str,
+        num_candidates: int,
+        with_embeddings: bool,
+        filters: dict,
+        embedding=None,
+    ) -> list[ScoredMemory]:
+        """Return the scored top candidates for data.
+
+        The index uses the inner product, which is the cosine similarity of the
+        unit-length embeddings.
+        """
+        fields = self._metadata_fields()
+        hits = self._search(
+            [create_embedding(data) if embedding is None else embedding],
+            num_candidates,
+            expr=filter_expression(filters, fields),
+            output_fields=["raw_text", *fields],
+        )[0]
+        texts = [hit.entity.value_of_field("raw_text") for hit in hits]
+        # Search results do not carry vectors, but the embeddings of stored texts
+        # are usually still in the embedding cache.
+        embeddings = create_embeddings(texts) if with_embeddings and texts else None
+        return [
+            ScoredMemory(
+                text=text,
+                score=hit.distance,
+                id=str(hit.id),
+                metadata={
+                    field: hit.entity.value_of_field(field)
+                    for field in fields
+                    if hit.entity.value_of_field(field) != UNSET_METADATA[field]
+                },
+                embedding=None if embeddings is None else embeddings[i],
+            )
+            for i, (hit, text) in enumerate(zip(hits, texts))
+        ]
+
+    def export_batches(self, batch_size=1000):
+        """Yield every entity of the session partition, or of the collection
+        without one, in batches of (ids, texts, metadata, embeddings), through a
+        query iterator.
+
+        Args:
+            batch_size (int): The number of entities per batch.
+        """
+        self.flush()
+        fields = self._metadata_fields()
+        iterator = self.collection.query_iterator(
+            batch_size=batch_size,
+            expr="pk >= 0",
+            output_fields=["raw_text", "embeddings", *fields],
+            partition_names=self._partition_names,
+        )
+        while True:
+            entities = iterator.next()
+            if not entities:
+                iterator.close()
+                return
+            yield (
+                [str(entity["pk"]) for entity in entities],
+                [entity["raw_text"] for entity in entities],
+                [
+                    {
+                        field: entity[field]
+                        for field in fields
+                        if entity[field] != UNSET_METADATA[field]
+                    }
+                    for entity in entities
+                ],
+                np.array(
+                    [entity["embeddings"] for entity in entities], dtype=np.float32
+                ),
+            )
 
     def get_stats(self) -> str:
         """
         Returns: The stats of the milvus cache.
         """
-        return f"Entities num: {self.collection.num_entities}"
+        self.flush()
+        return (
+            f"Entities num: {self.collection.num_entities},"
+            f" duplicates skipped: {self.duplicates_skipped}"
+        )
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 from typing import Any
 
-from autogpt.memory.base import MemoryProviderSingleton
+from autogpt.memory.base import MemoryProviderSingleton, ScoredMemory
 
 
 class NoMemory(MemoryProviderSingleton):
@@ -22,17 +22,36 @@ class NoMemory(MemoryProviderSingleton):
         """
         pass
 
-    def add(self, data: str) -> str:
+    def add(self, data: str, metadata: dict[str, Any] | None = None) -> str:
         """
         Adds a data point to the memory. No action is taken in NoMemory.
 
         Args:
             data: The data to add.
+            metadata: The metadata fields of the data point.
 
         Returns: An empty string.
         """
         return ""
 
+    def add_embedded(
+        self,
+        data: list[str],
+        embeddings: Any,
+        metadata: list[dict[str, Any] | None] | None = None,
+    ) -> list[str]:
+        """
+        Adds data points with their embeddings. No action is taken in NoMemory.
+
+        Args:
+            data: The data to add.
+            embeddings: The embedding of each data point.
+            metadata: The metadata fields of each data point.
+
+        Returns: An empty string for each data point.
+        """
+        return ["" for _ in data]
+
     def get(self, data: str) -> list[Any] | None:
         """
         Gets the data from the memory that is most relevant to the given data.
@@ -53,7 +72,12 @@ class NoMemory(MemoryProviderSingleton):
         """
         return ""
 
-    def get_relevant(self, data: str, num_relevant: int = 5) -> list[Any] | None:
+    def get_relevant(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        filters: dict[str, Any] | None = None,
+    ) -> list[Any] | None:
         """
         Returns all the data in the memory that is relevant to the given data.
         NoMemory always returns None.
@@ -61,11 +85,35 @@ class NoMemory(MemoryProviderSingleton):
         Args:
             data: The data to compare to.
             num_relevant: The number of relevant data to return.
+            filters: The metadata the data must match.
 
         Returns: None
         """
         return None
 
+    def get_relevant_scored(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        min_score: float | None = None,
+        mmr_lambda: float | None = None,
+        filters: dict[str, Any] | None = None,
+    ) -> list[ScoredMemory]:
+        """
+        Returns the memories relevant to the given data, with their scores.
+        NoMemory always returns an empty list.
+
+        Args:
+            data: The data to compare to.
+            num_relevant: The number of relevant data to return.
+            min_score: The minimum score of the data to return.
+            mmr_lambda: The trade-off between relevance and diversity.
+            filters: The metadata the data must match.
+
+        Returns: An empty list
+        """
+        return []
+
     def get_stats(self):
         """
         Returns: An empty dictionary as there are no stats in NoMemory.
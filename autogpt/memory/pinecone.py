@@ -1,25 +1,85 @@
+import hashlib
+import re
+import time
+
+import numpy as np
 import pinecone
 from colorama import Fore, Style
 
-from autogpt.llm_utils import create_embedding_with_ada
+from autogpt.config.ai_config import AIConfig
+from autogpt.llm_utils import (
+    create_embedding,
+    create_embeddings,
+    get_embedding_provider,
+)
 from autogpt.logs import logger
-from autogpt.memory.base import MemoryProviderSingleton
+from autogpt.memory.base import (
+    MemoryProviderSingleton,
+    ScoredMemory,
+    build_metadata,
+    check_filters,
+    filter_values,
+)
+
+# Pinecone recommends upserting at most 100 vectors per request.
+UPSERT_BATCH_SIZE = 100
+# The requests of a large add are sent over this many connections at once.
+UPSERT_THREADS = 4
+# Queries that return vectors return at most this many.
+QUERY_VALUES_LIMIT = 1000
+
+
+def vector_id(text):
+    """The id of the vector of a text, the same in every run and process."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def agent_namespace(cfg):
+    """MEMORY_INDEX followed by the name of the agent in AI_SETTINGS_FILE, or
+    MEMORY_INDEX alone before the agent has a name."""
+    ai_name = AIConfig.load(cfg.ai_settings_file).ai_name
+    slug = re.sub(r"[^a-z0-9]+", "-", ai_name.lower()).strip("-")
+    return f"{cfg.memory_index}-{slug}" if slug else cfg.memory_index
+
+
+def metadata_filter(filters):
+    """Translate checked memory filters into a Pinecone metadata filter."""
+    if not filters:
+        return None
+    conditions = {}
+    for field in ("source", "kind", "session", "chunk"):
+        if field in filters:
+            conditions[field] = {"$in": filter_values(filters[field])}
+    timestamp = {}
+    if "since" in filters:
+        timestamp["$gte"] = filters["since"]
+    if "until" in filters:
+        timestamp["$lte"] = filters["until"]
+    if timestamp:
+        conditions["timestamp"] = timestamp
+    return conditions
 
 
 class PineconeMemory(MemoryProviderSingleton):
+    """Stores the memories in the `PINECONE_NAMESPACE` namespace of the auto-gpt
+    index, so that agents sharing the index keep apart. It defaults to one per
+    agent, see agent_namespace, resolved on first use as the memory is made
+    before the agent is named. Vector ids are hashes of the texts, so a new run
+    resumes on the memories of the last one, and adding a text again overwrites
+    its vector instead of duplicating it."""
+
     def __init__(self, cfg):
         pinecone_api_key = cfg.pinecone_api_key
         pinecone_region = cfg.pinecone_region
         pinecone.init(api_key=pinecone_api_key, environment=pinecone_region)
-        dimension = 1536
+        dimension = get_embedding_provider().dimension
         metric = "cosine"
         pod_type = "p1"
         table_name = "auto-gpt"
-        # this assumes we don't start with memory.
-        # for now this works.
-        # we'll need a more complicated and robust system if we want to start with
-        #  memory.
-        self.vec_num = 0
+        self.dimension = dimension
+        self.cfg = cfg
+        self._namespace = cfg.pinecone_namespace or None
+        self.dedup_threshold = cfg.memory_dedup_threshold if cfg.memory_dedup else None
 
         try:
             pinecone.whoami()
@@ -41,35 +101,221 @@ class PineconeMemory(MemoryProviderSingleton):
             pinecone.create_index(
                 table_name, dimension=dimension, metric=metric, pod_type=pod_type
             )
-        self.index = pinecone.Index(table_name)
+        self.index = pinecone.Index(table_name, pool_threads=UPSERT_THREADS)
+
+    @property
+    def namespace(self):
+        if self._namespace is None:
+            self._namespace = agent_namespace(self.cfg)
+        return self._namespace
 
-    def add(self, data):
-        vector = create_embedding_with_ada(data)
-        # no metadata here. We may wish to change that long term.
-        self.index.upsert([(str(self.vec_num), vector, {"raw_text": data})])
-        _text = f"Inserting data into memory at index: {self.vec_num}:\n data: {data}"
-        self.vec_num += 1
-        return _text
+    def add(self, data, metadata=None):
+        return self.add_many([data], None if metadata is None else [metadata])[0]
+
+    def add_many(self, data, metadata=None):
+        """
+        Adds many data points with one embedding request, and upserts of up to
+        UPSERT_BATCH_SIZE vectors sent concurrently.
+        :param data: The data to add.
+        :param metadata: The metadata fields of each data point.
+        """
+        metadata = metadata or [None for _ in data]
+        unique, vectors = self._drop_duplicates(
+            data, list(range(len(data))), create_embeddings(data)
+        )
+        return self._upsert(data, metadata, unique, vectors)
+
+    def add_embedded(self, data, embeddings, metadata=None):
+        """
+        Adds many data points with their embeddings, upserting them in batches
+        without embedding anything.
+        :param data: The data to add.
+        :param embeddings: The embedding of each data point.
+        :param metadata: The metadata fields of each data point.
+        """
+        metadata = metadata or [None for _ in data]
+        unique, vectors = self._drop_duplicates(
+            data, list(range(len(data))), embeddings
+        )
+        return self._upsert(data, metadata, unique, vectors)
+
+    def _nearest_scores(self, embeddings):
+        """Queries the nearest vector of every embedding concurrently."""
+        requests = [
+            self.index.query(
+                [float(value) for value in embedding],
+                top_k=1,
+                namespace=self.namespace,
+                async_req=True,
+            )
+            for embedding in embeddings
+        ]
+        return np.array(
+            [
+                matches[0].score if matches else -np.inf
+                for matches in (request.get().matches for request in requests)
+            ]
+        )
+
+    def _upsert(self, data, metadata, unique, vectors):
+        messages = ["" for _ in data]
+        records = []
+        for i, vector in zip(unique, vectors):
+            item, meta = data[i], metadata[i]
+            id_ = vector_id(item)
+            records.append(
+                (
+                    id_,
+                    [float(value) for value in vector],
+                    {"raw_text": item, **build_metadata(meta)},
+                )
+            )
+            messages[i] = f"Inserting data into memory at id: {id_}:\n data: {item}"
+        requests = [
+            self.index.upsert(
+                records[start : start + UPSERT_BATCH_SIZE],
+                namespace=self.namespace,
+                async_req=True,
+            )
+            for start in range(0, len(records), UPSERT_BATCH_SIZE)
+        ]
+        for request in requests:
+            request.get()
+        return messages
 
     def get(self, data):
         return self.get_relevant(data, 1)
 
     def clear(self):
-        self.index.delete(deleteAll=True)
+        self.index.delete(delete_all=True, namespace=self.namespace)
         return "Obliviated"
 
-    def get_relevant(self, data, num_relevant=5):
+    def get_relevant(self, data, num_relevant=5, filters=None):
         """
         Returns all the data in the memory that is relevant to the given data.
         :param data: The data to compare to.
         :param num_relevant: The number of relevant data to return. Defaults to 5
+        :param filters: Only search the data whose metadata match these.
+        """
+        query_embedding = create_embedding(data)
+        return self._query(query_embedding, num_relevant, check_filters(filters))
+
+    def get_relevant_many(self, data, num_relevant=5, filters=None):
+        """
+        Returns the relevant data for each of many queries, embedding all of the
+        queries in one request.
+        :param data: The data to compare to.
+        :param num_relevant: The number of relevant data to return per query.
+        :param filters: Only search the data whose metadata match these.
         """
-        query_embedding = create_embedding_with_ada(data)
+        filters = check_filters(filters)
+        query_embeddings = create_embeddings(data)
+        return [
+            self._query(query_embedding, num_relevant, filters)
+            for query_embedding in query_embeddings
+        ]
+
+    def _query(self, query_embedding, num_relevant, filters):
         results = self.index.query(
-            query_embedding, top_k=num_relevant, include_metadata=True
+            query_embedding,
+            top_k=num_relevant,
+            include_metadata=True,
+            filter=metadata_filter(filters),
+            namespace=self.namespace,
         )
         sorted_results = sorted(results.matches, key=lambda x: x.score)
         return [str(item["metadata"]["raw_text"]) for item in sorted_results]
 
+    def _get_scored_candidates(
+        self, data, num_candidates, with_embeddings, filters, embedding=None
+    ):
+        if embedding is None:
+            embedding = create_embedding(data)
+        results = self.index.query(
+            embedding,
+            top_k=num_candidates,
+            include_metadata=True,
+            include_values=with_embeddings,
+            filter=metadata_filter(filters),
+            namespace=self.namespace,
+        )
+        # The index uses the cosine metric, so scores are cosine similarities.
+        return [
+            ScoredMemory(
+                text=str(item["metadata"]["raw_text"]),
+                score=item.score,
+                id=item.id,
+                metadata={
+                    key: value
+                    for key, value in item["metadata"].items()
+                    if key != "raw_text"
+                },
+                embedding=item.values if with_embeddings else None,
+            )
+            for item in results.matches
+        ]
+
+    def export_batches(self, batch_size=1000):
+        """
+        Yields every vector of the namespace in batches of (ids, texts, metadata,
+        embeddings). The index cannot be listed, so it is queried for the
+        vectors of a timestamp range, which is halved until the query returns
+        all of them. Vectors without a timestamp, and those past the first
+        QUERY_VALUES_LIMIT of a range too narrow to halve, are not exported;
+        a warning tells how many were left out.
+        :param batch_size: The number of vectors per batch.
+        """
+        probe = [1.0] + [0.0] * (self.dimension - 1)
+        ranges = [(0.0, time.time() + 1)]
+        batch = []
+        exported = 0
+        while ranges:
+            since, until = ranges.pop()
+            matches = self.index.query(
+                probe,
+                top_k=QUERY_VALUES_LIMIT,
+                include_metadata=True,
+                include_values=True,
+                filter={"timestamp": {"$gte": since, "$lt": until}},
+                namespace=self.namespace,
+            ).matches
+            middle = (since + until) / 2
+            if len(matches) == QUERY_VALUES_LIMIT and since < middle < until:
+                ranges.extend([(middle, until), (since, middle)])
+                continue
+            batch.extend(matches)
+            exported += len(matches)
+            while len(batch) >= batch_size or (batch and not ranges):
+                yield self._export_batch(batch[:batch_size])
+                batch = batch[batch_size:]
+        stats = self.index.describe_index_stats().to_dict()
+        count = stats.get("namespaces", {}).get(self.namespace, {}).get("vector_count")
+        if count is not None and count > exported:
+            logger.warn(
+                f"Exported {exported} of the {count} vectors of the Pinecone"
+                f" namespace {self.namespace}; the others lack a timestamp or"
+                f" share one with over {QUERY_VALUES_LIMIT} vectors."
+            )
+
+    @staticmethod
+    def _export_batch(matches):
+        return (
+            [match.id for match in matches],
+            [str(match.metadata["raw_text"]) for match in matches],
+            [
+                {
+                    key: value
+                    for key, value in match.metadata.items()
+                    if key != "raw_text"
+                }
+                for match in matches
+            ],
+            np.array([match.values for match in matches], dtype=np.float32),
+        )
+
     def get_stats(self):
-        return self.index.describe_index_stats()
+        return {
+            **self.index.describe_index_stats().to_dict(),
+            "namespace": self.namespace,
+            "duplicates_skipped": self.duplicates_skipped,
+        }
@@ -0,0 +1,72 @@
+"""Reduced-precision storage for embedding matrices."""
+from __future__ import annotations
+
+import numpy as np
+
+QUANTIZED_DTYPES = {"float16": np.float16, "int8": np.int8}
+# Rows dequantized at a time while scoring, which bounds the float32 working set.
+SCORE_CHUNK_SIZE = 16384
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """Convert float32 rows to `dtype`.
+
+    int8 rows are scaled so that their largest component maps to 127, and the
+    per-row scales are returned alongside the codes. float16 needs no scales.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.clip(np.rint(vectors / scales[:, np.newaxis]), -127, 127)
+    return codes.astype(np.int8), scales.astype(np.float32)
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray | None) -> np.ndarray:
+    vectors = np.asarray(codes, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales)[..., np.newaxis]
+    return vectors
+
+
+class QuantizedMatrix:
+    """A read-only matrix of quantized rows that reads like a float32 one.
+
+    Indexing returns dequantized float32 rows, and `scores` computes the dot
+    products of queries with every row without materializing the float32 matrix.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray | None = None) -> None:
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index) -> np.ndarray:
+        scales = None if self.scales is None else self.scales[index]
+        return dequantize(self.codes[index], scales)
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Return the (queries x rows) matrix of dot products."""
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), SCORE_CHUNK_SIZE):
+            chunk = self[start : start + SCORE_CHUNK_SIZE]
+            scores[:, start : start + len(chunk)] = np.dot(queries, chunk.T)
+        return scores
+
+
+def score(matrix, queries: np.ndarray) -> np.ndarray:
+    """Return the (queries x rows) dot products for a float32 or quantized matrix."""
+    if isinstance(matrix, QuantizedMatrix):
+        return matrix.scores(queries)
+    return np.dot(queries, matrix.T)
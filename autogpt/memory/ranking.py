@@ -0,0 +1,72 @@
+"""Selecting and re-ranking retrieved memories by score."""
+from __future__ import annotations
+
+import numpy as np
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the k highest scores along the last axis, best first.
+
+    Only the k winners are sorted, so this is O(n + k log k) instead of the
+    O(n log n) of sorting every score.
+    """
+    k = min(k, scores.shape[-1])
+    if k == 0:
+        return np.zeros((*scores.shape[:-1], 0), dtype=np.intp)
+    winners = np.argpartition(scores, -k, axis=-1)[..., -k:]
+    order = np.argsort(np.take_along_axis(scores, winners, axis=-1), axis=-1)
+    return np.take_along_axis(winners, order[..., ::-1], axis=-1)
+
+
+def maximal_marginal_relevance(
+    scores: np.ndarray, vectors: np.ndarray, k: int, mmr_lambda: float
+) -> list[int]:
+    """Pick k candidates that are relevant to the query but not to each other.
+
+    Each step picks the candidate maximizing
+    `mmr_lambda * score - (1 - mmr_lambda) * max similarity to the picked ones`,
+    so near-duplicates of an earlier pick sink to the bottom.
+
+    Args:
+        scores: The similarity of every candidate to the query.
+        vectors: The embedding of every candidate, one per row.
+        k: The number of candidates to pick.
+        mmr_lambda: 1 ranks by relevance only, 0 by diversity only.
+
+    Returns:
+        list[int]: The indices of the picked candidates, in the order picked.
+    """
+    k = min(k, len(scores))
+    if k == 0:
+        return []
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(
+        np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12
+    )
+    picked = [int(np.argmax(scores))]
+    available = np.ones(len(scores), dtype=bool)
+    available[picked[0]] = False
+    max_similarity = vectors @ vectors[picked[0]]
+    while len(picked) < k:
+        mmr = mmr_lambda * scores - (1 - mmr_lambda) * max_similarity
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        picked.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, vectors @ vectors[best])
+    return picked
+
+
+def reciprocal_rank_fusion(rankings: list[list], k: int = 60) -> list:
+    """Fuse several rankings of the same kind of items into one, best first.
+
+    Every item scores `1 / (k + rank)` in each ranking it appears in, with ranks
+    starting at 1, so items ranked high by several retrievers come first. Only
+    ranks matter, which makes scores on different scales, like BM25 and cosine
+    similarity, comparable. Ties keep the order of the first ranking.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -1,30 +1,176 @@
 """Redis memory provider."""
 from __future__ import annotations
 
+import asyncio
+import atexit
+import re
+import threading
 from typing import Any
 
 import numpy as np
 import redis
+import redis.asyncio
 from colorama import Fore, Style
-from redis.commands.search.field import TextField, VectorField
+from redis.commands.search.field import NumericField, TagField, TextField, VectorField
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
 from redis.commands.search.query import Query
 
-from autogpt.llm_utils import create_embedding_with_ada
+from autogpt.llm_utils import (
+    create_embedding,
+    create_embeddings,
+    get_embedding_provider,
+)
 from autogpt.logs import logger
-from autogpt.memory.base import MemoryProviderSingleton
-
-SCHEMA = [
-    TextField("data"),
-    VectorField(
-        "embedding",
-        "HNSW",
-        {"TYPE": "FLOAT32", "DIM": 1536, "DISTANCE_METRIC": "COSINE"},
-    ),
+from autogpt.memory.base import (
+    METADATA_FIELDS,
+    MemoryProviderSingleton,
+    ScoredMemory,
+    build_metadata,
+    check_filters,
+    filter_values,
+)
+
+# Ids are reserved from the shared counter in blocks of at least this many.
+ID_BLOCK_SIZE = 64
+# Keys are deleted this many at a time when clearing without the search index.
+UNLINK_BATCH_SIZE = 1000
+
+METADATA_SCHEMA = [
+    TagField("source"),
+    TagField("kind"),
+    TagField("session"),
+    NumericField("chunk"),
+    NumericField("timestamp"),
 ]
 
 
+# The vector types an index can store, with the numpy type of their values.
+# BFLOAT16 has no numpy type and is converted by hand.
+VECTOR_TYPES = {
+    "FLOAT32": np.float32,
+    "FLOAT64": np.float64,
+    "FLOAT16": np.float16,
+    "BFLOAT16": None,
+}
+VECTOR_ALGORITHMS = ("HNSW", "FLAT")
+
+
+def vector_attributes(
+    dimension: int,
+    algorithm: str = "HNSW",
+    vector_type: str = "FLOAT32",
+    m: int = 16,
+    ef_construction: int = 200,
+    ef_runtime: int = 10,
+) -> dict[str, Any]:
+    """The attributes of the vector field, without the HNSW ones for FLAT."""
+    if algorithm not in VECTOR_ALGORITHMS:
+        raise ValueError(f"Unknown Redis vector index algorithm: {algorithm}")
+    if vector_type not in VECTOR_TYPES:
+        raise ValueError(f"Unknown Redis vector type: {vector_type}")
+    attributes = {"TYPE": vector_type, "DIM": dimension, "DISTANCE_METRIC": "COSINE"}
+    if algorithm == "HNSW":
+        attributes.update(
+            {"M": m, "EF_CONSTRUCTION": ef_construction, "EF_RUNTIME": ef_runtime}
+        )
+    return attributes
+
+
+def schema(dimension: int, algorithm: str = "HNSW", **attributes: Any) -> list:
+    """The fields of the index, for embeddings of the given dimension.
+
+    Args:
+        dimension: The dimension of the embeddings.
+        algorithm: HNSW, or FLAT for exact search.
+        attributes: The vector_type, m, ef_construction and ef_runtime of the
+            vector field, see vector_attributes.
+    """
+    return [
+        TextField("data"),
+        *METADATA_SCHEMA,
+        VectorField(
+            "embedding",
+            algorithm,
+            vector_attributes(dimension, algorithm, **attributes),
+        ),
+    ]
+
+
+def vector_to_bytes(vector: Any, vector_type: str) -> bytes:
+    """Encode a vector as a blob of the given vector type."""
+    vector = np.asarray(vector, dtype=np.float32)
+    if vector_type == "BFLOAT16":
+        # The upper half of the float32 bits, rounded to nearest even.
+        bits = vector.view(np.uint32).astype(np.uint64)
+        bits += 0x7FFF + ((bits >> 16) & 1)
+        return (bits >> 16).astype(np.uint16).tobytes()
+    return vector.astype(VECTOR_TYPES[vector_type]).tobytes()
+
+
+def vector_from_bytes(blob: bytes, vector_type: str) -> np.ndarray:
+    """Decode a blob of the given vector type into a float32 vector."""
+    if vector_type == "BFLOAT16":
+        bits = np.frombuffer(blob, dtype=np.uint16).astype(np.uint32) << 16
+        return bits.view(np.float32)
+    return np.frombuffer(blob, dtype=VECTOR_TYPES[vector_type]).astype(np.float32)
+
+
+def decode(value: Any) -> Any:
+    """Decode the bytes of a reply, leaving other values as they are."""
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def attribute_options(info: dict[str, Any], name: str) -> dict[str, Any] | None:
+    """The options of a field of an index, from its FT.INFO reply, with their
+    names lower-cased, or None if the index has no such field."""
+    for attribute in info.get("attributes", []):
+        values = [decode(value) for value in attribute]
+        options = {
+            str(key).lower(): value for key, value in zip(values[::2], values[1::2])
+        }
+        if options.get("identifier") == name:
+            return options
+    return None
+
+
+def escape_tag(value: str) -> str:
+    """Escape the punctuation and spaces of a TAG value in a query."""
+    return re.sub(r"(\W)", r"\\\1", value)
+
+
+def filter_query(filters: dict[str, Any]) -> str:
+    """Translate checked memory filters into a RediSearch pre-filter query."""
+    clauses = []
+    for field in ("source", "kind", "session"):
+        if field in filters:
+            tags = " | ".join(
+                escape_tag(value) for value in filter_values(filters[field])
+            )
+            clauses.append(f"@{field}:{{{tags}}}")
+    if "chunk" in filters:
+        chunks = " | ".join(
+            f"@chunk:[{chunk} {chunk}]" for chunk in filter_values(filters["chunk"])
+        )
+        clauses.append(f"({chunks})")
+    if "since" in filters or "until" in filters:
+        since = filters.get("since", "-inf")
+        until = filters.get("until", "+inf")
+        clauses.append(f"@timestamp:[{since} {until}]")
+    return f"({' '.join(clauses)})" if clauses else "*"
+
+
 class RedisMemory(MemoryProviderSingleton):
+    """Stores every memory in a hash `<memory_index>:<id>`, indexed by RediSearch.
+
+    Ids are reserved with INCRBY on `<memory_index>-vec_num`, in blocks, so that
+    processes sharing the index never write the same key. With
+    `REDIS_WRITE_BUFFER` set, new memories are buffered and written that many at
+    a time in a single pipeline; the buffer is flushed before every read and at
+    exit. `aadd`, `aadd_many`, `aget_relevant` and `aget_relevant_many` go
+    through a `redis.asyncio` client instead, so that callers can overlap them
+    with other work.
+    """
+
     def __init__(self, cfg):
         """
         Initializes the Redis memory provider.
@@ -34,17 +180,35 @@ class RedisMemory(MemoryProviderSingleton):
 
         Returns: None
         """
-        redis_host = cfg.redis_host
-        redis_port = cfg.redis_port
-        redis_password = cfg.redis_password
-        self.dimension = 1536
-        self.redis = redis.Redis(
-            host=redis_host,
-            port=redis_port,
-            password=redis_password,
-            db=0,  # Cannot be changed
-        )
+        self.connection_kwargs = {
+            "host": cfg.redis_host,
+            "port": cfg.redis_port,
+            "password": cfg.redis_password,
+            "db": 0,  # Cannot be changed
+            "max_connections": cfg.redis_max_connections or None,
+        }
+        self.dimension = get_embedding_provider().dimension
+        self.pool = redis.ConnectionPool(**self.connection_kwargs)
+        self.redis = redis.Redis(connection_pool=self.pool)
+        self._async_redis = None
         self.cfg = cfg
+        self.write_buffer_size = cfg.redis_write_buffer
+        self.algorithm = cfg.redis_index_algorithm
+        self.vector_type = cfg.redis_vector_type
+        self.vector_options = {
+            "vector_type": self.vector_type,
+            "m": cfg.redis_hnsw_m,
+            "ef_construction": cfg.redis_hnsw_ef_construction,
+            "ef_runtime": cfg.redis_hnsw_ef_runtime,
+        }
+        # Checks the settings before anything is changed on the server.
+        vector_attributes(self.dimension, self.algorithm, **self.vector_options)
+        self._buffer = []
+        self._next_id = self._block_end = 0
+        # The buffer and the id block are shared with the worker threads of the
+        # asyncio methods.
+        self._buffer_lock = threading.RLock()
+        self.dedup_threshold = cfg.memory_dedup_threshold if cfg.memory_dedup else None
 
         # Check redis connection
         try:
@@ -64,42 +228,326 @@ class RedisMemory(MemoryProviderSingleton):
             exit(1)
 
         if cfg.wipe_redis_on_start:
-            self.redis.flushall()
+            self._drop()
+        info = self._index_info()
+        if info is None:
+            self._create_index()
+        else:
+            self._reuse_index(info)
+        atexit.register(self.flush)
+
+    def _index_info(self) -> dict[str, Any] | None:
+        """The FT.INFO reply of the index, None if there is no index."""
         try:
-            self.redis.ft(f"{cfg.memory_index}").create_index(
-                fields=SCHEMA,
+            return self.redis.ft(f"{self.cfg.memory_index}").info()
+        except redis.ResponseError:
+            return None
+
+    def _create_index(self) -> None:
+        try:
+            self.redis.ft(f"{self.cfg.memory_index}").create_index(
+                fields=schema(self.dimension, self.algorithm, **self.vector_options),
                 definition=IndexDefinition(
-                    prefix=[f"{cfg.memory_index}:"], index_type=IndexType.HASH
+                    prefix=[f"{self.cfg.memory_index}:"], index_type=IndexType.HASH
                 ),
             )
         except Exception as e:
             print("Error creating Redis search index: ", e)
-        existing_vec_num = self.redis.get(f"{cfg.memory_index}-vec_num")
-        self.vec_num = int(existing_vec_num.decode("utf-8")) if existing_vec_num else 0
 
-    def add(self, data: str) -> str:
+    def _reuse_index(self, info: dict[str, Any]) -> None:
+        """
+        Checks an existing index can hold the embeddings of the provider, adds
+        the fields it lacks, and migrates it if its vector field was created
+        with other settings.
+
+        Args:
+            info: The FT.INFO reply of the index.
+
+        Returns: None
+        """
+        embedding = attribute_options(info, "embedding") or {}
+        if "dim" in embedding and int(embedding["dim"]) != self.dimension:
+            raise ValueError(
+                f"The Redis index {self.cfg.memory_index} holds"
+                f" {embedding['dim']}-dimensional embeddings, but the embedding"
+                f" provider makes {self.dimension}-dimensional ones; clear it first."
+            )
+        if self._vector_settings_changed(embedding):
+            self._migrate_index(embedding)
+            return
+        # Indexes created before metadata existed lack its fields.
+        for field in METADATA_SCHEMA:
+            if attribute_options(info, field.name) is None:
+                self.redis.ft(f"{self.cfg.memory_index}").alter_schema_add([field])
+        failures = int(decode(info.get("hash_indexing_failures", 0)))
+        if failures:
+            logger.warn(
+                f"{failures} memories of the Redis index {self.cfg.memory_index}"
+                " could not be indexed and will not be found."
+            )
+        num_docs = int(decode(info["num_docs"]))
+        self._check_id_counter(num_docs)
+        logger.debug(
+            f"Reusing the Redis index {self.cfg.memory_index} of {num_docs} memories"
+        )
+
+    def _check_id_counter(self, num_docs: int) -> None:
+        """
+        Checks the id counter is past every id in use, as new memories would
+        overwrite the ones whose ids it hands out again, and moves it past the
+        highest id found by a SCAN if it is not.
+
+        Args:
+            num_docs: The number of memories in the index.
+
+        Returns: None
+        """
+        counter_key = f"{self.cfg.memory_index}-vec_num"
+        counter = int(self.redis.get(counter_key) or 0)
+        # Blocks of ids are reserved ahead, so the counter is usually higher.
+        if num_docs <= counter:
+            return
+        prefix = f"{self.cfg.memory_index}:"
+        ids = [
+            int(suffix)
+            for suffix in (
+                decode(key)[len(prefix) :]
+                for key in self.redis.scan_iter(
+                    match=f"{prefix}*", count=UNLINK_BATCH_SIZE
+                )
+            )
+            if suffix.isdigit()
+        ]
+        end = max(ids, default=-1) + 1
+        logger.warn(
+            f"The Redis index {self.cfg.memory_index} holds {num_docs} memories,"
+            f" but its id counter {counter_key} is at {counter}; moving it to {end}."
+        )
+        if end > counter:
+            # Added to, so that ids reserved meanwhile are not handed out again.
+            self.redis.incrby(counter_key, end - counter)
+
+    @property
+    def async_redis(self) -> redis.asyncio.Redis:
+        """A `redis.asyncio` client with a pool of its own, created on first use."""
+        if self._async_redis is None:
+            self._async_redis = redis.asyncio.Redis(
+                connection_pool=redis.asyncio.ConnectionPool(**self.connection_kwargs)
+            )
+        return self._async_redis
+
+    def add(self, data: str, metadata: dict[str, Any] | None = None) -> str:
         """
         Adds a data point to the memory.
 
         Args:
             data: The data to add.
+            metadata: The metadata fields of the data point.
 
         Returns: Message indicating that the data has been added.
         """
-        if "Command Error:" in data:
-            return ""
-        vector = create_embedding_with_ada(data)
-        vector = np.array(vector).astype(np.float32).tobytes()
-        data_dict = {b"data": data, "embedding": vector}
-        pipe = self.redis.pipeline()
-        pipe.hset(f"{self.cfg.memory_index}:{self.vec_num}", mapping=data_dict)
-        _text = (
-            f"Inserting data into memory at index: {self.vec_num}:\n" f"data: {data}"
+        return self.add_many([data], None if metadata is None else [metadata])[0]
+
+    def add_many(
+        self, data: list[str], metadata: list[dict[str, Any] | None] | None = None
+    ) -> list[str]:
+        """
+        Adds many data points with one embedding request per batch and a single
+        pipeline round trip.
+
+        Args:
+            data: The data to add.
+            metadata: The metadata fields of each data point.
+
+        Returns: A message for each data point, "" for the ones skipped.
+        """
+        metadata = metadata or [None for _ in data]
+        positions = [i for i, item in enumerate(data) if "Command Error:" not in item]
+        if not positions:
+            return ["" for _ in data]
+        vectors = create_embeddings([data[i] for i in positions])
+        positions, vectors = self._drop_duplicates(data, positions, vectors)
+        return self._write(data, metadata, positions, vectors)
+
+    def add_embedded(
+        self,
+        data: list[str],
+        embeddings: Any,
+        metadata: list[dict[str, Any] | None] | None = None,
+    ) -> list[str]:
+        """
+        Adds many data points with their embeddings in a single pipeline round
+        trip, without embedding anything.
+
+        Args:
+            data: The data to add.
+            embeddings: The embedding of each data point.
+            metadata: The metadata fields of each data point.
+
+        Returns: A message for each data point, "" for the ones skipped.
+        """
+        metadata = metadata or [None for _ in data]
+        positions = [i for i, item in enumerate(data) if "Command Error:" not in item]
+        positions, vectors = self._drop_duplicates(
+            data, positions, [embeddings[i] for i in positions]
         )
-        self.vec_num += 1
-        pipe.set(f"{self.cfg.memory_index}-vec_num", self.vec_num)
-        pipe.execute()
-        return _text
+        return self._write(data, metadata, positions, vectors)
+
+    async def aadd(self, data: str, metadata: dict[str, Any] | None = None) -> str:
+        """
+        Adds a data point to the memory through the asyncio client.
+
+        Args:
+            data: The data to add.
+            metadata: The metadata fields of the data point.
+
+        Returns: Message indicating that the data has been added.
+        """
+        messages = await self.aadd_many(
+            [data], None if metadata is None else [metadata]
+        )
+        return messages[0]
+
+    async def aadd_many(
+        self, data: list[str], metadata: list[dict[str, Any] | None] | None = None
+    ) -> list[str]:
+        """
+        Adds many data points through the asyncio client, embedding them in a
+        worker thread and writing them in a single pipeline, unbuffered.
+
+        Args:
+            data: The data to add.
+            metadata: The metadata fields of each data point.
+
+        Returns: A message for each data point, "" for the ones skipped.
+        """
+        metadata = metadata or [None for _ in data]
+        messages = ["" for _ in data]
+        positions = [i for i, item in enumerate(data) if "Command Error:" not in item]
+        if not positions:
+            return messages
+        vectors = await asyncio.to_thread(
+            create_embeddings, [data[i] for i in positions]
+        )
+        positions, vectors = await asyncio.to_thread(
+            self._drop_duplicates, data, positions, vectors
+        )
+        if not positions:
+            return messages
+        counter = f"{self.cfg.memory_index}-vec_num"
+        start = await self.async_redis.incrby(counter, len(positions)) - len(positions)
+        pipe = self.async_redis.pipeline(transaction=False)
+        for id_, i, vector in zip(
+            range(start, start + len(positions)), positions, vectors
+        ):
+            pipe.hset(
+                f"{self.cfg.memory_index}:{id_}",
+                mapping=self._mapping(data[i], vector, metadata[i]),
+            )
+            messages[i] = self._message(id_, data[i])
+        await pipe.execute()
+        return messages
+
+    def _nearest_scores(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Searches for the nearest memory of every embedding in a single pipeline
+        round trip.
+
+        Returns: The cosine similarity of each nearest memory, -inf if none.
+        """
+        self.flush()
+        pipe = self.redis.pipeline(transaction=False)
+        for embedding in embeddings:
+            query = (
+                Query("*=>[KNN 1 @embedding $vector AS vector_score]")
+                .return_fields("vector_score")
+                .dialect(2)
+            )
+            pipe.execute_command(
+                "FT.SEARCH",
+                self.cfg.memory_index,
+                *query.get_args(),
+                "PARAMS",
+                2,
+                "vector",
+                vector_to_bytes(embedding, self.vector_type),
+            )
+        scores = np.full(len(embeddings), -np.inf)
+        for i, reply in enumerate(pipe.execute(raise_on_error=False)):
+            # [total, key, [field, value, ...]] when a memory was found.
+            if isinstance(reply, list) and len(reply) > 2:
+                fields = [decode(value) for value in reply[2]]
+                vector_score = dict(zip(fields[::2], fields[1::2]))["vector_score"]
+                scores[i] = 1 - float(vector_score)
+        return scores
+
+    def _write(
+        self,
+        data: list[str],
+        metadata: list[dict[str, Any] | None],
+        positions: list[int],
+        vectors: Any,
+    ) -> list[str]:
+        messages = ["" for _ in data]
+        with self._buffer_lock:
+            start = self._reserve_ids(len(positions))
+            for id_, i, vector in zip(
+                range(start, start + len(positions)), positions, vectors
+            ):
+                self._buffer.append(
+                    (
+                        f"{self.cfg.memory_index}:{id_}",
+                        self._mapping(data[i], vector, metadata[i]),
+                    )
+                )
+                messages[i] = self._message(id_, data[i])
+            if len(self._buffer) >= self.write_buffer_size:
+                self.flush()
+        return messages
+
+    def _mapping(
+        self, text: str, vector: Any, metadata: dict[str, Any] | None
+    ) -> dict[Any, Any]:
+        return {
+            b"data": text,
+            "embedding": vector_to_bytes(vector, self.vector_type),
+            **build_metadata(metadata),
+        }
+
+    @staticmethod
+    def _message(id_: int, text: str) -> str:
+        return f"Inserting data into memory at index: {id_}:\ndata: {text}"
+
+    def _reserve_ids(self, count: int) -> int:
+        """
+        Reserves count consecutive ids, from the current block or from a new
+        block taken atomically from the shared counter.
+
+        Returns: The first id.
+        """
+        with self._buffer_lock:
+            if self._next_id + count > self._block_end:
+                size = max(count, ID_BLOCK_SIZE)
+                self._block_end = self.redis.incrby(
+                    f"{self.cfg.memory_index}-vec_num", size
+                )
+                self._next_id = self._block_end - size
+            start = self._next_id
+            self._next_id += count
+            return start
+
+    def flush(self) -> None:
+        """
+        Writes the buffered memories in a single pipeline.
+        """
+        with self._buffer_lock:
+            if not self._buffer:
+                return
+            pipe = self.redis.pipeline(transaction=False)
+            for key, mapping in self._buffer:
+                pipe.hset(key, mapping=mapping)
+            pipe.execute()
+            self._buffer = []
 
     def get(self, data: str) -> list[Any] | None:
         """
@@ -112,45 +560,386 @@ class RedisMemory(MemoryProviderSingleton):
         """
         return self.get_relevant(data, 1)
 
+    def _vector_settings_changed(self, options: dict[str, Any]) -> bool:
+        """Whether the vector field options from FT.INFO differ from the
+        settings the index is built with. EF_RUNTIME is left out, as searches
+        set it themselves, and options that FT.INFO does not report are taken to
+        match."""
+        wanted = {
+            "algorithm": self.algorithm,
+            "data_type": self.vector_type,
+            **{
+                key.lower(): value
+                for key, value in vector_attributes(
+                    self.dimension, self.algorithm, **self.vector_options
+                ).items()
+                if key not in ("TYPE", "DIM", "DISTANCE_METRIC", "EF_RUNTIME")
+            },
+        }
+        return any(
+            str(options[key]).upper() != str(value).upper()
+            for key, value in wanted.items()
+            if key in options
+        )
+
+    def _migrate_index(self, options: dict[str, Any]) -> None:
+        """
+        Recreates the index with the current settings, keeping the memories.
+        The index is dropped without its hashes, whose vectors are re-encoded
+        if the vector type changed, and the new index indexes them again in the
+        background.
+
+        Args:
+            options: The vector field options of the old index, from FT.INFO.
+
+        Returns: None
+        """
+        old_type = str(options.get("data_type", "FLOAT32")).upper()
+        logger.typewriter_log(
+            "MIGRATING REDIS INDEX",
+            Fore.YELLOW,
+            f"{self.cfg.memory_index}: {options.get('algorithm')} {old_type}"
+            f" to {self.algorithm} {self.vector_type}",
+        )
+        self.redis.ft(f"{self.cfg.memory_index}").dropindex(delete_documents=False)
+        if old_type != self.vector_type:
+            keys = self.redis.scan_iter(
+                match=f"{self.cfg.memory_index}:*", count=UNLINK_BATCH_SIZE
+            )
+            batch = []
+            for key in keys:
+                batch.append(key)
+                if len(batch) == UNLINK_BATCH_SIZE:
+                    self._reencode(batch, old_type)
+                    batch = []
+            if batch:
+                self._reencode(batch, old_type)
+        self._create_index()
+
+    def _reencode(self, keys: list[bytes], old_type: str) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.hget(key, "embedding")
+        blobs = pipe.execute()
+        for key, blob in zip(keys, blobs):
+            if blob is not None:
+                vector = vector_from_bytes(blob, old_type)
+                pipe.hset(key, "embedding", vector_to_bytes(vector, self.vector_type))
+        pipe.execute()
+
     def clear(self) -> str:
         """
-        Clears the redis server.
+        Clears the memories of this index, and only those, leaving other indexes
+        and data on the server alone.
 
         Returns: A message indicating that the memory has been cleared.
         """
-        self.redis.flushall()
+        self._drop()
+        self._create_index()
         return "Obliviated"
 
-    def get_relevant(self, data: str, num_relevant: int = 5) -> list[Any] | None:
+    def _drop(self) -> None:
+        """
+        Drops the index with its memories and the id counter. FT.DROPINDEX DD
+        deletes the indexed hashes; the ones that failed to be indexed, or all of
+        them when there is no index, are found by SCAN and unlinked in batches.
+        """
+        with self._buffer_lock:
+            self._buffer = []
+            # The counter is gone, so the reserved ids could be handed out again.
+            self._next_id = self._block_end = 0
+        info = self._index_info()
+        if info is not None:
+            self.redis.ft(f"{self.cfg.memory_index}").dropindex(delete_documents=True)
+        if info is None or int(decode(info.get("hash_indexing_failures", 0))):
+            batch = []
+            for key in self.redis.scan_iter(
+                match=f"{self.cfg.memory_index}:*", count=UNLINK_BATCH_SIZE
+            ):
+                batch.append(key)
+                if len(batch) == UNLINK_BATCH_SIZE:
+                    self.redis.unlink(*batch)
+                    batch = []
+            if batch:
+                self.redis.unlink(*batch)
+        self.redis.delete(f"{self.cfg.memory_index}-vec_num")
+
+    def get_relevant(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        filters: dict[str, Any] | None = None,
+        ef_runtime: int | None = None,
+    ) -> list[Any] | None:
         """
         Returns all the data in the memory that is relevant to the given data.
         Args:
             data: The data to compare to.
             num_relevant: The number of relevant data to return.
+            filters: Only search the data whose metadata match these.
+            ef_runtime: The HNSW candidate list size of this search, trading
+                latency for recall; REDIS_HNSW_EF_RUNTIME if None.
 
         Returns: A list of the most relevant data.
         """
-        query_embedding = create_embedding_with_ada(data)
-        base_query = f"*=>[KNN {num_relevant} @embedding $vector AS vector_score]"
-        query = (
-            Query(base_query)
-            .return_fields("data", "vector_score")
-            .sort_by("vector_score")
-            .dialect(2)
+        self.flush()
+        query_embedding = create_embedding(data)
+        return self._search(
+            query_embedding, num_relevant, check_filters(filters), ef_runtime
         )
-        query_vector = np.array(query_embedding).astype(np.float32).tobytes()
 
+    def get_relevant_many(
+        self,
+        data: list[str],
+        num_relevant: int = 5,
+        filters: dict[str, Any] | None = None,
+        ef_runtime: int | None = None,
+    ) -> list[list[Any] | None]:
+        """
+        Returns the relevant data for each of many queries, embedding all of the
+        queries in one batch.
+
+        Args:
+            data: The data to compare to.
+            num_relevant: The number of relevant data to return per query.
+            filters: Only search the data whose metadata match these.
+            ef_runtime: The HNSW candidate list size of these searches;
+                REDIS_HNSW_EF_RUNTIME if None.
+
+        Returns: A list of the most relevant data for each query.
+        """
+        self.flush()
+        filters = check_filters(filters)
+        query_embeddings = create_embeddings(data)
+        return [
+            self._search(query_embedding, num_relevant, filters, ef_runtime)
+            for query_embedding in query_embeddings
+        ]
+
+    def _get_scored_candidates(
+        self,
+        data: str,
+        num_candidates: int,
+        with_embeddings: bool,
+        filters: dict[str, Any],
+        embedding: Any = None,
+    ) -> list[ScoredMemory]:
+        self.flush()
+        query_embedding = create_embedding(data) if embedding is None else embedding
+        docs = self._knn(query_embedding, num_candidates, filters) or []
+        embeddings = [None for _ in docs]
+        if with_embeddings and docs:
+            # Search results decode fields as text, so the vectors are read apart.
+            pipe = self.redis.pipeline()
+            for doc in docs:
+                pipe.hget(doc.id, "embedding")
+            embeddings = [
+                vector_from_bytes(vector, self.vector_type) for vector in pipe.execute()
+            ]
+        # vector_score is the cosine distance.
+        return [
+            ScoredMemory(
+                text=doc.data,
+                score=1 - float(doc.vector_score),
+                id=doc.id,
+                metadata={
+                    field: cast(getattr(doc, field))
+                    for field, cast in METADATA_FIELDS.items()
+                    if getattr(doc, field, None) is not None
+                },
+                embedding=embedding,
+            )
+            for doc, embedding in zip(docs, embeddings)
+        ]
+
+    def _search(
+        self,
+        query_embedding,
+        num_relevant: int,
+        filters: dict[str, Any],
+        ef_runtime: int | None = None,
+    ) -> list[Any] | None:
+        docs = self._knn(query_embedding, num_relevant, filters, ef_runtime)
+        return None if docs is None else [doc.data for doc in docs]
+
+    async def aget_relevant(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        filters: dict[str, Any] | None = None,
+        ef_runtime: int | None = None,
+    ) -> list[Any] | None:
+        """
+        Returns the data relevant to the given data, searching through the
+        asyncio client.
+
+        Args:
+            data: The data to compare to.
+            num_relevant: The number of relevant data to return.
+            filters: Only search the data whose metadata match these.
+            ef_runtime: The HNSW candidate list size of this search.
+
+        Returns: A list of the most relevant data.
+        """
+        relevant = await self.aget_relevant_many(
+            [data], num_relevant, filters, ef_runtime
+        )
+        return relevant[0]
+
+    async def aget_relevant_many(
+        self,
+        data: list[str],
+        num_relevant: int = 5,
+        filters: dict[str, Any] | None = None,
+        ef_runtime: int | None = None,
+    ) -> list[list[Any] | None]:
+        """
+        Returns the relevant data for each of many queries, embedding them in a
+        worker thread and running the searches concurrently through the asyncio
+        client.
+
+        Args:
+            data: The data to compare to.
+            num_relevant: The number of relevant data to return per query.
+            filters: Only search the data whose metadata match these.
+            ef_runtime: The HNSW candidate list size of these searches.
+
+        Returns: A list of the most relevant data for each query.
+        """
+        if self._buffer:
+            await asyncio.to_thread(self.flush)
+        filters = check_filters(filters)
+        query_embeddings = await asyncio.to_thread(create_embeddings, data)
+        results = await asyncio.gather(
+            *(
+                self._aknn(query_embedding, num_relevant, filters, ef_runtime)
+                for query_embedding in query_embeddings
+            )
+        )
+        return [
+            None if docs is None else [doc.data for doc in docs] for docs in results
+        ]
+
+    async def _aknn(
+        self,
+        query_embedding,
+        num_relevant: int,
+        filters: dict[str, Any],
+        ef_runtime: int | None = None,
+    ) -> list[Any] | None:
+        query, params = self._knn_query(
+            query_embedding, num_relevant, filters, ef_runtime
+        )
+        try:
+            results = await self.async_redis.ft(f"{self.cfg.memory_index}").search(
+                query, query_params=params
+            )
+        except Exception as e:
+            print("Error calling Redis search: ", e)
+            return None
+        return results.docs
+
+    def _knn(
+        self,
+        query_embedding,
+        num_relevant: int,
+        filters: dict[str, Any],
+        ef_runtime: int | None = None,
+    ) -> list[Any] | None:
+        query, params = self._knn_query(
+            query_embedding, num_relevant, filters, ef_runtime
+        )
         try:
             results = self.redis.ft(f"{self.cfg.memory_index}").search(
-                query, query_params={"vector": query_vector}
+                query, query_params=params
             )
         except Exception as e:
             print("Error calling Redis search: ", e)
             return None
-        return [result.data for result in results.docs]
+        return results.docs
+
+    def _knn_query(
+        self,
+        query_embedding,
+        num_relevant: int,
+        filters: dict[str, Any],
+        ef_runtime: int | None = None,
+    ) -> tuple[Query, dict[str, bytes]]:
+        """The KNN query of a search, with its parameters. HNSW searches set
+        their EF_RUNTIME, REDIS_HNSW_EF_RUNTIME by default, so that it takes
+        effect without rebuilding the index."""
+        # FLAT indexes search exhaustively and take no EF_RUNTIME.
+        ef = ""
+        if self.algorithm == "HNSW":
+            if ef_runtime is None:
+                ef_runtime = self.vector_options["ef_runtime"]
+            ef = f" EF_RUNTIME {int(ef_runtime)}"
+        base_query = (
+            f"{filter_query(filters)}"
+            f"=>[KNN {num_relevant} @embedding $vector{ef} AS vector_score]"
+        )
+        query = (
+            Query(base_query)
+            .return_fields("data", "vector_score", *METADATA_FIELDS)
+            .sort_by("vector_score")
+            .dialect(2)
+        )
+        return query, {"vector": vector_to_bytes(query_embedding, self.vector_type)}
+
+    def export_batches(self, batch_size: int = 1000):
+        """
+        Yields every memory of the index in batches of (ids, texts, metadata,
+        embeddings), scanning its keys and reading each batch in one pipeline.
+        """
+        self.flush()
+        keys = self.redis.scan_iter(
+            match=f"{self.cfg.memory_index}:*", count=batch_size
+        )
+        batch = []
+        # SCAN can return a key more than once.
+        seen = set()
+        for key in keys:
+            if key in seen:
+                continue
+            seen.add(key)
+            batch.append(key)
+            if len(batch) == batch_size:
+                yield self._read_batch(batch)
+                batch = []
+        if batch:
+            yield self._read_batch(batch)
+
+    def _read_batch(self, keys: list[bytes]) -> tuple:
+        pipe = self.redis.pipeline()
+        for key in keys:
+            pipe.hgetall(key)
+        hashes = pipe.execute()
+        return (
+            [key.decode("utf-8") for key in keys],
+            [fields[b"data"].decode("utf-8") for fields in hashes],
+            [
+                {
+                    field: cast(fields[field.encode()].decode("utf-8"))
+                    for field, cast in METADATA_FIELDS.items()
+                    if field.encode() in fields
+                }
+                for fields in hashes
+            ],
+            np.array(
+                [
+                    vector_from_bytes(fields[b"embedding"], self.vector_type)
+                    for fields in hashes
+                ],
+                dtype=np.float32,
+            ),
+        )
 
     def get_stats(self):
         """
         Returns: The stats of the memory index.
         """
-        return self.redis.ft(f"{self.cfg.memory_index}").info()
+        self.flush()
+        return {
+            **self.redis.ft(f"{self.cfg.memory_index}").info(),
+            "duplicates_skipped": self.duplicates_skipped,
+        }
@@ -0,0 +1,400 @@
+"""An in-process hot tier in front of a remote vector memory."""
+from __future__ import annotations
+
+import atexit
+import queue
+import threading
+import time
+from typing import Any
+
+import numpy as np
+
+from autogpt.llm_utils import create_embedding, create_embeddings
+from autogpt.memory.base import (
+    MMR_CANDIDATE_FACTOR,
+    MemoryProviderSingleton,
+    ScoredMemory,
+    build_metadata,
+)
+from autogpt.memory.ranking import top_k
+
+
+class HotTier:
+    """The most recently added and retrieved memories, with their embeddings in
+    one matrix searched by a single matrix-vector product.
+
+    When full, the memories evicted are the least often retrieved of the least
+    recently used half, so that a memory retrieved often survives a burst of
+    new ones. Threads take turns on a lock, so that memories can be added in
+    one while another searches.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.texts: list[str] = []
+            self.metadata: list[dict[str, Any]] = []
+            self.rows: dict[str, int] = {}
+            self.embeddings: np.ndarray | None = None
+            self.hits = np.zeros(self.capacity, dtype=np.int64)
+            self.last_used = np.zeros(self.capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __contains__(self, text: str) -> bool:
+        return text in self.rows
+
+    def add(
+        self,
+        texts: list[str],
+        embeddings: list[Any],
+        metadata: list[dict[str, Any]],
+    ) -> None:
+        """Add memories the tier does not hold yet, evicting others if full."""
+        with self._lock:
+            self._add(texts, embeddings, metadata)
+
+    def _add(
+        self,
+        texts: list[str],
+        embeddings: list[Any],
+        metadata: list[dict[str, Any]],
+    ) -> None:
+        new = {}
+        for text, embedding, meta in zip(texts, embeddings, metadata):
+            if text not in self.rows:
+                new.setdefault(text, (embedding, meta))
+        new = list(new.items())[-self.capacity :]
+        if not new:
+            return
+        if self.embeddings is None:
+            dim = len(new[0][1][0])
+            self.embeddings = np.zeros((self.capacity, dim), dtype=np.float32)
+        self._evict(len(self) + len(new) - self.capacity)
+        now = time.time()
+        for text, (embedding, meta) in new:
+            row = len(self.texts)
+            self.rows[text] = row
+            self.texts.append(text)
+            self.metadata.append(meta)
+            self.embeddings[row] = embedding
+            self.hits[row] = 0
+            self.last_used[row] = now
+
+    def search(self, query_embedding: Any, k: int) -> list[ScoredMemory]:
+        """Return the k memories most similar to the query embedding, best first."""
+        with self._lock:
+            if not self.texts:
+                return []
+            n = len(self.texts)
+            scores = self.embeddings[:n] @ np.asarray(query_embedding, dtype=np.float32)
+            # Copied, as the rows move when memories are evicted.
+            return [
+                ScoredMemory(
+                    text=self.texts[row],
+                    score=float(scores[row]),
+                    metadata=self.metadata[row],
+                    embedding=self.embeddings[row].copy(),
+                )
+                for row in top_k(scores, k)
+            ]
+
+    def record_hits(self, texts: list[str]) -> None:
+        """Mark memories as just retrieved."""
+        with self._lock:
+            rows = [self.rows[text] for text in texts if text in self.rows]
+            self.hits[rows] += 1
+            self.last_used[rows] = time.time()
+
+    def _evict(self, count: int) -> None:
+        n = len(self.texts)
+        if count <= 0 or n == 0:
+            return
+        count = min(count, n)
+        oldest = np.argsort(self.last_used[:n], kind="stable")[: max(count, n // 2)]
+        evicted = oldest[np.argsort(self.hits[oldest], kind="stable")[:count]]
+        keep = np.ones(n, dtype=bool)
+        keep[evicted] = False
+        kept = int(keep.sum())
+        self.embeddings[:kept] = self.embeddings[:n][keep]
+        self.hits[:kept] = self.hits[:n][keep]
+        self.last_used[:kept] = self.last_used[:n][keep]
+        self.texts = [text for text, k in zip(self.texts, keep) if k]
+        self.metadata = [meta for meta, k in zip(self.metadata, keep) if k]
+        self.rows = {text: row for row, text in enumerate(self.texts)}
+
+
+class TieredMemory(MemoryProviderSingleton):
+    """Answers from an in-process hot tier when it is confident, and from a
+    remote vector memory otherwise.
+
+    A search is answered by the hot tier alone when its num_relevant best
+    memories all score at least `TIERED_HOT_MIN_SCORE`; the other searches go to
+    the remote memory, whose results are promoted into the hot tier. New
+    memories go into the hot tier at once and, with `TIERED_WRITE_BEHIND`, are
+    written to the remote memory by a background thread, in batches; `flush`
+    waits for them, and runs at exit.
+
+    New memories are embedded once, and written to the remote memory with
+    their embeddings. Filtered searches always go to the remote memory. Calls
+    to the remote memory are serialized, as not every client is thread-safe.
+    """
+
+    def __init__(self, cfg, remote_memory: MemoryProviderSingleton) -> None:
+        """
+        Initializes the tiered memory provider.
+
+        Args:
+            cfg: The config object.
+            remote_memory: The memory provider behind the hot tier.
+
+        Returns: None
+        """
+        self.remote = remote_memory
+        self.hot = HotTier(cfg.tiered_hot_size)
+        self.hot_min_score = cfg.tiered_hot_min_score
+        self.write_behind = cfg.tiered_write_behind
+        self.dedup = cfg.memory_dedup
+        self.hot_answers = 0
+        self.remote_searches = 0
+        self.writes_failed = 0
+        self._remote_lock = threading.Lock()
+        self._writes = queue.Queue()
+        if self.write_behind:
+            threading.Thread(target=self._write_behind, daemon=True).start()
+            atexit.register(self.flush)
+
+    def add(self, data: str, metadata: dict[str, Any] | None = None) -> str:
+        """
+        Adds a data point to the hot tier and the remote memory.
+
+        Args:
+            data: The data to add.
+            metadata: The metadata fields of the data point.
+
+        Returns: Message indicating that the data has been added.
+        """
+        return self.add_many([data], None if metadata is None else [metadata])[0]
+
+    def add_many(
+        self, data: list[str], metadata: list[dict[str, Any] | None] | None = None
+    ) -> list[str]:
+        """
+        Adds many data points to the hot tier, and to the remote memory either
+        now or in the background.
+
+        Args:
+            data: The data to add.
+            metadata: The metadata fields of each data point.
+
+        Returns: A message for each data point, "" for the ones skipped.
+        """
+        metadata = [build_metadata(meta) for meta in metadata or [None for _ in data]]
+        messages = ["" for _ in data]
+        positions = list(range(len(data)))
+        if self.dedup:
+            # The remote memory skips the near-duplicates when it writes them.
+            positions = [i for i in positions if data[i] not in self.hot]
+            self.duplicates_skipped += len(data) - len(positions)
+        if not positions:
+            return messages
+        texts = [data[i] for i in positions]
+        metas = [metadata[i] for i in positions]
+        # Embedded once, for both tiers.
+        embeddings = create_embeddings(texts)
+        if self.write_behind:
+            self._writes.put((texts, embeddings, metas))
+            for i in positions:
+                messages[i] = f"Queued data for the remote memory:\n data: {data[i]}"
+        else:
+            with self._remote_lock:
+                remote_messages = self.remote.add_embedded(texts, embeddings, metas)
+            for i, message in zip(positions, remote_messages):
+                messages[i] = message
+            kept = [j for j, message in enumerate(remote_messages) if message]
+            texts = [texts[j] for j in kept]
+            embeddings = [embeddings[j] for j in kept]
+            metas = [metas[j] for j in kept]
+        if texts:
+            self.hot.add(texts, embeddings, metas)
+        return messages
+
+    def add_embedded(
+        self,
+        data: list[str],
+        embeddings: Any,
+        metadata: list[dict[str, Any] | None] | None = None,
+    ) -> list[str]:
+        """
+        Adds many data points with their embeddings to the remote memory, then
+        to the hot tier.
+
+        Args:
+            data: The data to add.
+            embeddings: The embedding of each data point.
+            metadata: The metadata fields of each data point.
+
+        Returns: The message of the remote memory for each data point.
+        """
+        metadata = [build_metadata(meta) for meta in metadata or [None for _ in data]]
+        self.flush()
+        with self._remote_lock:
+            messages = self.remote.add_embedded(data, embeddings, metadata)
+        kept = [i for i, message in enumerate(messages) if message]
+        self.hot.add(
+            [data[i] for i in kept],
+            [embeddings[i] for i in kept],
+            [metadata[i] for i in kept],
+        )
+        return messages
+
+    def export_batches(self, batch_size: int = 1000):
+        """
+        Yields the memories of the remote memory, once the pending writes are
+        done.
+        """
+        self.flush()
+        return self.remote.export_batches(batch_size)
+
+    def flush(self) -> None:
+        """Wait until the memories written behind are in the remote memory."""
+        self._writes.join()
+
+    def _write_behind(self) -> None:
+        while True:
+            batches = [self._writes.get()]
+            # Everything queued meanwhile goes out in the same request.
+            while True:
+                try:
+                    batches.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            texts = [text for batch in batches for text in batch[0]]
+            embeddings = [embedding for batch in batches for embedding in batch[1]]
+            metas = [meta for batch in batches for meta in batch[2]]
+            try:
+                with self._remote_lock:
+                    self.remote.add_embedded(texts, embeddings, metas)
+            except Exception as e:
+                print("Error writing memories to the remote memory: ", e)
+                self.writes_failed += len(texts)
+            for _ in batches:
+                self._writes.task_done()
+
+    def get(self, data: str) -> list[Any] | None:
+        """
+        Gets the data from the memory that is most relevant to the given data.
+
+        Args:
+            data: The data to compare to.
+
+        Returns: The most relevant data.
+        """
+        return self.get_relevant(data, 1)
+
+    def clear(self) -> str:
+        """
+        Clears the hot tier and the remote memory, once the pending writes are
+        done.
+
+        Returns: A message indicating that the memory has been cleared.
+        """
+        self.flush()
+        self.hot.clear()
+        with self._remote_lock:
+            return self.remote.clear()
+
+    def get_relevant(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        filters: dict[str, Any] | None = None,
+    ) -> list[Any]:
+        """
+        Returns the data most relevant to the given data.
+
+        Args:
+            data: The data to compare to.
+            num_relevant: The number of relevant data to return.
+            filters: Only search the data whose metadata match these.
+
+        Returns: A list of the most relevant data.
+        """
+        return [
+            memory.text
+            for memory in self.get_relevant_scored(data, num_relevant, filters=filters)
+        ]
+
+    def get_relevant_scored(
+        self,
+        data: str,
+        num_relevant: int = 5,
+        min_score: float | None = None,
+        mmr_lambda: float | None = None,
+        filters: dict[str, Any] | None = None,
+    ) -> list[ScoredMemory]:
+        memories = super().get_relevant_scored(
+            data, num_relevant, min_score, mmr_lambda, filters
+        )
+        self.hot.record_hits([memory.text for memory in memories])
+        return memories
+
+    def _get_scored_candidates(
+        self,
+        data: str,
+        num_candidates: int,
+        with_embeddings: bool,
+        filters: dict[str, Any],
+        embedding: Any = None,
+    ) -> list[ScoredMemory]:
+        num_relevant = num_candidates
+        hot = []
+        if not filters:
+            # Embedded once, for the hot tier and the remote search.
+            if embedding is None:
+                embedding = create_embedding(data)
+            hot = self.hot.search(embedding, num_candidates)
+            if with_embeddings:
+                # Only the best num_relevant must be confident, MMR re-ranks more.
+                num_relevant = max(1, num_candidates // MMR_CANDIDATE_FACTOR)
+            confident = hot[:num_relevant]
+            if len(confident) == num_relevant and all(
+                memory.score >= self.hot_min_score for memory in confident
+            ):
+                self.hot_answers += 1
+                return hot
+
+        self.remote_searches += 1
+        with self._remote_lock:
+            remote = self.remote._get_scored_candidates(
+                data, num_candidates, True, filters, embedding
+            )
+        self.hot.add(
+            [memory.text for memory in remote],
+            [memory.embedding for memory in remote],
+            [memory.metadata for memory in remote],
+        )
+        # Memories still being written behind are only in the hot tier.
+        found = {memory.text for memory in remote}
+        return remote + [memory for memory in hot if memory.text not in found]
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        Returns: The stats of the remote memory and of the hot tier.
+        """
+        with self._remote_lock:
+            remote = self.remote.get_stats()
+        return {
+            "remote": remote,
+            "hot_memories": len(self.hot),
+            "hot_answers": self.hot_answers,
+            "remote_searches": self.remote_searches,
+            "pending_writes": self._writes.unfinished_tasks,
+            "writes_failed": self.writes_failed,
+            "duplicates_skipped": self.duplicates_skipped,
+        }
@@ -0,0 +1,153 @@
+"""Exporting memories with their embeddings, and importing them into any backend.
+
+An export is a directory of npz shards and a `manifest.json` describing them.
+Every shard holds a float32 `vectors` array, one row per memory, and a `records`
+byte array with a JSON line per memory: its id in the source backend, its text
+and its metadata. The manifest is written last, so an export without one is
+incomplete. It records the embedding provider and dimension of the vectors,
+and imports refuse vectors of another provider, which would not be comparable
+to the queries.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Iterator
+
+import numpy as np
+import orjson
+
+from autogpt.llm_utils import get_embedding_provider
+from autogpt.memory.base import MemoryProviderSingleton
+
+FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+# Memories per shard, and per bulk write on import.
+DEFAULT_BATCH_SIZE = 1000
+
+
+def write_shard(
+    filename: str,
+    ids: list[str],
+    texts: list[str],
+    metadata: list[dict[str, Any]],
+    embeddings: np.ndarray,
+) -> None:
+    """Write a batch of memories to an npz shard."""
+    records = b"".join(
+        orjson.dumps({"id": id_, "text": text, "metadata": meta}) + b"\n"
+        for id_, text, meta in zip(ids, texts, metadata)
+    )
+    with open(filename, "wb") as f:
+        np.savez(
+            f,
+            records=np.frombuffer(records, dtype=np.uint8),
+            vectors=np.asarray(embeddings, dtype=np.float32),
+        )
+
+
+def read_shard(
+    filename: str,
+) -> tuple[list[str], list[str], list[dict[str, Any]], np.ndarray]:
+    """Read the (ids, texts, metadata, embeddings) of an npz shard."""
+    with np.load(filename) as shard:
+        records = [
+            orjson.loads(line) for line in shard["records"].tobytes().splitlines()
+        ]
+        embeddings = shard["vectors"]
+    return (
+        [record["id"] for record in records],
+        [record["text"] for record in records],
+        [record["metadata"] for record in records],
+        embeddings,
+    )
+
+
+def export_memory(
+    memory: MemoryProviderSingleton,
+    directory: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Export every memory of a backend into a directory of shards.
+
+    Returns:
+        int: The number of memories exported.
+    """
+    os.makedirs(directory, exist_ok=True)
+    provider = get_embedding_provider()
+    shards = []
+    count = 0
+    for ids, texts, metadata, embeddings in memory.export_batches(batch_size):
+        if not texts:
+            continue
+        shard = f"shard-{len(shards):05d}.npz"
+        write_shard(os.path.join(directory, shard), ids, texts, metadata, embeddings)
+        shards.append({"filename": shard, "count": len(texts)})
+        count += len(texts)
+    manifest = {
+        "format": FORMAT_VERSION,
+        "embedding_provider": provider.name,
+        "dimension": provider.dimension,
+        "count": count,
+        "shards": shards,
+    }
+    with open(os.path.join(directory, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return count
+
+
+def read_manifest(directory: str) -> dict[str, Any]:
+    """Read the manifest of an export and check it matches the embedding provider.
+
+    Raises:
+        ValueError: If the export is incomplete, of another format version, or
+            embedded by another provider.
+    """
+    filename = os.path.join(directory, MANIFEST_FILENAME)
+    if not os.path.exists(filename):
+        raise ValueError(f"{directory} has no {MANIFEST_FILENAME}, is it complete?")
+    with open(filename) as f:
+        manifest = json.load(f)
+    if manifest["format"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported export format {manifest['format']}")
+    provider = get_embedding_provider()
+    if (manifest["embedding_provider"], manifest["dimension"]) != (
+        provider.name,
+        provider.dimension,
+    ):
+        raise ValueError(
+            f"The export was embedded with {manifest['embedding_provider']}"
+            f" ({manifest['dimension']} dimensions), but EMBEDDING_PROVIDER is"
+            f" {provider.name} ({provider.dimension} dimensions)."
+        )
+    return manifest
+
+
+def iter_shards(
+    directory: str,
+) -> Iterator[tuple[list[str], list[str], list[dict[str, Any]], np.ndarray]]:
+    """Yield the (ids, texts, metadata, embeddings) of every shard of an export."""
+    for shard in read_manifest(directory)["shards"]:
+        yield read_shard(os.path.join(directory, shard["filename"]))
+
+
+def import_memory(
+    memory: MemoryProviderSingleton,
+    directory: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Import an export into a backend through its bulk write path, without
+    embedding anything. The ids of the source backend are not kept.
+
+    Returns:
+        int: The number of memories added, without the ones skipped.
+    """
+    added = 0
+    for _, texts, metadata, embeddings in iter_shards(directory):
+        for start in range(0, len(texts), batch_size):
+            end = start + batch_size
+            messages = memory.add_embedded(
+                texts[start:end], embeddings[start:end], metadata[start:end]
+            )
+            added += sum(bool(message) for message in messages)
+    return added
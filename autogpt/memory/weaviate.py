@@ -1,12 +1,32 @@
+import atexit
+import threading
 import uuid
 
+import numpy as np
 import weaviate
 from weaviate import Client
 from weaviate.embedded import EmbeddedOptions
 from weaviate.util import generate_uuid5
 
 from autogpt.config import Config
-from autogpt.memory.base import MemoryProviderSingleton, get_ada_embedding
+from autogpt.llm_utils import create_embedding, create_embeddings
+from autogpt.memory.base import (
+    METADATA_FIELDS,
+    MemoryProviderSingleton,
+    ScoredMemory,
+    build_metadata,
+    check_filters,
+    filter_values,
+)
+
+# Queries sent in one GraphQL request by get_relevant_many.
+QUERY_BATCH_SIZE = 20
+# The Weaviate data type and where-filter value key of each metadata field.
+METADATA_TYPES = {
+    str: ("text", "valueText"),
+    int: ("int", "valueInt"),
+    float: ("number", "valueNumber"),
+}
 
 
 def default_schema(weaviate_index):
@@ -17,12 +37,50 @@ def default_schema(weaviate_index):
                 "name": "raw_text",
                 "dataType": ["text"],
                 "description": "original text for the embedding",
-            }
+            },
+            *(
+                {"name": field, "dataType": [METADATA_TYPES[field_type][0]]}
+                for field, field_type in METADATA_FIELDS.items()
+            ),
         ],
     }
 
 
+def where_filter(filters):
+    """Translate checked memory filters into a Weaviate where filter."""
+    operands = []
+    for field in ("source", "kind", "session", "chunk"):
+        if field in filters:
+            value_key = METADATA_TYPES[METADATA_FIELDS[field]][1]
+            operands.append(
+                {
+                    "operator": "Or",
+                    "operands": [
+                        {"path": [field], "operator": "Equal", value_key: value}
+                        for value in filter_values(filters[field])
+                    ],
+                }
+            )
+    for key, operator in (("since", "GreaterThanEqual"), ("until", "LessThanEqual")):
+        if key in filters:
+            operands.append(
+                {
+                    "path": ["timestamp"],
+                    "operator": operator,
+                    "valueNumber": float(filters[key]),
+                }
+            )
+    return {"operator": "And", "operands": operands} if operands else None
+
+
 class WeaviateMemory(MemoryProviderSingleton):
+    """Weaviate memory storage provider.
+
+    New objects go into a batch kept open for the life of the memory, sent
+    `WEAVIATE_BATCH_SIZE` objects at a time by `WEAVIATE_BATCH_WORKERS`
+    threads. The batch is flushed before every read and at exit.
+    """
+
     def __init__(self, cfg):
         auth_credentials = self._build_auth_credentials(cfg)
 
@@ -44,8 +102,23 @@ class WeaviateMemory(MemoryProviderSingleton):
             self.client = Client(url, auth_client_secret=auth_credentials)
 
         self.index = WeaviateMemory.format_classname(cfg.memory_index)
+        self.dedup_threshold = cfg.memory_dedup_threshold if cfg.memory_dedup else None
+        # Search results must be at least this certain, or at most this far.
+        self.certainty = cfg.weaviate_certainty
+        self.distance = cfg.weaviate_distance
         self._create_schema()
 
+        self.batch_errors = 0
+        self._batch_lock = threading.Lock()
+        self._batch_pending = False
+        self.client.batch.configure(
+            batch_size=cfg.weaviate_batch_size,
+            dynamic=cfg.weaviate_batch_dynamic,
+            num_workers=cfg.weaviate_batch_workers,
+            callback=self._check_batch_results,
+        )
+        atexit.register(self._close_batch)
+
     @staticmethod
     def format_classname(index):
         # weaviate uses capitalised index names
@@ -57,8 +130,24 @@ class WeaviateMemory(MemoryProviderSingleton):
 
     def _create_schema(self):
         schema = default_schema(self.index)
-        if not self.client.schema.contains(schema):
+        if self.client.schema.contains(schema):
+            return
+        existing = next(
+            (
+                weaviate_class
+                for weaviate_class in self.client.schema.get().get("classes", [])
+                if weaviate_class["class"] == self.index
+            ),
+            None,
+        )
+        if existing is None:
             self.client.schema.create_class(schema)
+            return
+        # Classes created before metadata existed lack its properties.
+        names = {prop["name"] for prop in existing.get("properties") or []}
+        for prop in schema["properties"]:
+            if prop["name"] not in names:
+                self.client.schema.property.create(self.index, prop)
 
     def _build_auth_credentials(self, cfg):
         if cfg.weaviate_username and cfg.weaviate_password:
@@ -70,58 +159,231 @@ class WeaviateMemory(MemoryProviderSingleton):
         else:
             return None
 
-    def add(self, data):
-        vector = get_ada_embedding(data)
+    def add(self, data, metadata=None):
+        return self.add_many([data], None if metadata is None else [metadata])[0]
 
-        doc_uuid = generate_uuid5(data, self.index)
-        data_object = {"raw_text": data}
+    def add_many(self, data, metadata=None):
+        metadata = metadata or [None for _ in data]
+        unique, vectors = self._drop_duplicates(
+            data, list(range(len(data))), create_embeddings(data)
+        )
+        return self._add_objects(data, metadata, unique, vectors)
 
-        with self.client.batch as batch:
-            batch.add_data_object(
-                uuid=doc_uuid,
-                data_object=data_object,
-                class_name=self.index,
-                vector=vector,
-            )
+    def add_embedded(self, data, embeddings, metadata=None):
+        """Adds many data points with their embeddings in one batch, without
+        embedding anything."""
+        metadata = metadata or [None for _ in data]
+        unique, vectors = self._drop_duplicates(
+            data, list(range(len(data))), embeddings
+        )
+        return self._add_objects(data, metadata, unique, vectors)
 
-        return f"Inserting data into memory at uuid: {doc_uuid}:\n data: {data}"
+    def _nearest_scores(self, embeddings):
+        """Searches the nearest object of every embedding, QUERY_BATCH_SIZE of
+        them per GraphQL request."""
+        self.flush()
+        scores = np.full(len(embeddings), -np.inf)
+        for start in range(0, len(embeddings), QUERY_BATCH_SIZE):
+            batch = embeddings[start : start + QUERY_BATCH_SIZE]
+            queries = [
+                self.client.query.get(self.index, [])
+                .with_near_vector({"vector": [float(value) for value in embedding]})
+                .with_additional(["certainty"])
+                .with_limit(1)
+                .with_alias(f"query{i}")
+                for i, embedding in enumerate(batch)
+            ]
+            results = self.client.query.multi_get(queries).do()
+            for i in range(len(batch)):
+                items = results["data"]["Get"][f"query{i}"]
+                if items:
+                    scores[start + i] = 2 * items[0]["_additional"]["certainty"] - 1
+        return scores
+
+    def _add_objects(self, data, metadata, unique, vectors):
+        messages = ["" for _ in data]
+        with self._batch_lock:
+            for i, vector in zip(unique, vectors):
+                item, meta = data[i], metadata[i]
+                doc_uuid = generate_uuid5(item, self.index)
+                data_object = {"raw_text": item, **build_metadata(meta)}
+
+                # Sends the batch by itself once it is full.
+                self.client.batch.add_data_object(
+                    uuid=doc_uuid,
+                    data_object=data_object,
+                    class_name=self.index,
+                    vector=[float(value) for value in vector],
+                )
+                self._batch_pending = True
+                messages[i] = (
+                    f"Inserting data into memory at uuid: {doc_uuid}:\n data: {item}"
+                )
+
+        return messages
+
+    def flush(self):
+        """Sends the objects still in the batch and waits for every request."""
+        with self._batch_lock:
+            if self._batch_pending:
+                self.client.batch.flush()
+                self._batch_pending = False
+
+    def _close_batch(self):
+        self.flush()
+        self.client.batch.shutdown()
+
+    def _check_batch_results(self, results):
+        """Reports the objects of a batch that Weaviate refused."""
+        for result in results or []:
+            errors = result.get("result", {}).get("errors")
+            if errors:
+                self.batch_errors += 1
+                messages = [error["message"] for error in errors.get("error", [])]
+                print(f"Unexpected error adding {result.get('id')}: {messages}")
 
     def get(self, data):
         return self.get_relevant(data, 1)
 
     def clear(self):
-        self.client.schema.delete_all()
-
+        with self._batch_lock:
+            self.client.batch.empty_objects()
+            self._batch_pending = False
         # weaviate does not yet have a neat way to just remove the items in an index
-        # without removing the entire schema, therefore we need to re-create it
-        # after a call to delete_all
+        # without removing its class, therefore we need to re-create it after
+        # deleting it. The other classes of the instance are left alone.
+        classes = self.client.schema.get().get("classes", [])
+        if any(weaviate_class["class"] == self.index for weaviate_class in classes):
+            self.client.schema.delete_class(self.index)
         self._create_schema()
 
         return "Obliterated"
 
-    def get_relevant(self, data, num_relevant=5):
-        query_embedding = get_ada_embedding(data)
+    def get_relevant(self, data, num_relevant=5, filters=None):
+        return self.get_relevant_many([data], num_relevant, filters)[0]
+
+    def get_relevant_many(self, data, num_relevant=5, filters=None):
+        """Searches many queries, QUERY_BATCH_SIZE of them per GraphQL request."""
+        filters = check_filters(filters)
+        query_embeddings = create_embeddings(data)
+        self.flush()
+        relevant = []
+        for start in range(0, len(query_embeddings), QUERY_BATCH_SIZE):
+            relevant.extend(
+                self._query_many(
+                    query_embeddings[start : start + QUERY_BATCH_SIZE],
+                    num_relevant,
+                    filters,
+                )
+            )
+        return relevant
+
+    def _near_vector(self, vector):
+        if self.distance is not None:
+            return {"vector": vector, "distance": self.distance}
+        return {"vector": vector, "certainty": self.certainty}
+
+    def _get_query(self, properties, filters):
+        query = self.client.query.get(self.index, properties)
+        where = where_filter(filters)
+        return query if where is None else query.with_where(where)
+
+    def _query_many(self, query_embeddings, num_relevant, filters):
+        # Every query of a multi-get request answers under its own alias.
+        queries = [
+            self._get_query(["raw_text"], filters)
+            .with_near_vector(self._near_vector(query_embedding))
+            .with_limit(num_relevant)
+            .with_alias(f"query{i}")
+            for i, query_embedding in enumerate(query_embeddings)
+        ]
+        try:
+            results = self.client.query.multi_get(queries).do()
+            return [
+                [str(item["raw_text"]) for item in results["data"]["Get"][f"query{i}"]]
+                for i in range(len(queries))
+            ]
+
+        except Exception as err:
+            print(f"Unexpected error {err=}, {type(err)=}")
+            return [[] for _ in queries]
+
+    def _get_scored_candidates(
+        self, data, num_candidates, with_embeddings, filters, embedding=None
+    ):
+        if embedding is None:
+            embedding = create_embedding(data)
+        additional = ["id", "certainty"] + (["vector"] if with_embeddings else [])
+        self.flush()
         try:
             results = (
-                self.client.query.get(self.index, ["raw_text"])
-                .with_near_vector({"vector": query_embedding, "certainty": 0.7})
-                .with_limit(num_relevant)
+                self._get_query(["raw_text", *METADATA_FIELDS], filters)
+                .with_near_vector(self._near_vector(embedding))
+                .with_additional(additional)
+                .with_limit(num_candidates)
                 .do()
             )
-
-            if len(results["data"]["Get"][self.index]) > 0:
-                return [
-                    str(item["raw_text"]) for item in results["data"]["Get"][self.index]
-                ]
-            else:
-                return []
-
         except Exception as err:
             print(f"Unexpected error {err=}, {type(err)=}")
             return []
 
+        # Weaviate rescales the cosine similarity into a certainty in [0, 1].
+        return [
+            ScoredMemory(
+                text=str(item["raw_text"]),
+                score=2 * item["_additional"]["certainty"] - 1,
+                id=item["_additional"]["id"],
+                metadata={
+                    field: item[field]
+                    for field in METADATA_FIELDS
+                    if item.get(field) is not None
+                },
+                embedding=item["_additional"].get("vector"),
+            )
+            for item in results["data"]["Get"][self.index]
+        ]
+
+    def export_batches(self, batch_size=1000):
+        """Yields every object of the class in batches of (ids, texts, metadata,
+        embeddings), paging through them with a cursor."""
+        self.flush()
+        cursor = None
+        while True:
+            query = (
+                self.client.query.get(self.index, ["raw_text", *METADATA_FIELDS])
+                .with_additional(["id", "vector"])
+                .with_limit(batch_size)
+            )
+            if cursor is not None:
+                query = query.with_after(cursor)
+            items = query.do()["data"]["Get"][self.index]
+            if not items:
+                return
+            cursor = items[-1]["_additional"]["id"]
+            yield (
+                [item["_additional"]["id"] for item in items],
+                [str(item["raw_text"]) for item in items],
+                [
+                    {
+                        field: item[field]
+                        for field in METADATA_FIELDS
+                        if item.get(field) is not None
+                    }
+                    for item in items
+                ],
+                np.array(
+                    [item["_additional"]["vector"] for item in items], dtype=np.float32
+                ),
+            )
+
     def get_stats(self):
+        self.flush()
         result = self.client.query.aggregate(self.index).with_meta_count().do()
         class_data = result["data"]["Aggregate"][self.index]
 
-        return class_data[0]["meta"] if class_data else {}
+        stats = class_data[0]["meta"] if class_data else {}
+        return {
+            **stats,
+            "duplicates_skipped": self.duplicates_skipped,
+            "batch_errors": self.batch_errors,
+        }
@@ -1,121 +1,196 @@
 import os
 import sqlite3
+import threading
 
 
 class MemoryDB:
+    """Texts in an FTS5 table of a sqlite database, by session and key.
+
+    The database is opened on first use, in WAL mode, so that readers do not
+    block the writer and a commit does not wait for a full sync. The next key
+    of the session is counted in memory instead of being looked up before
+    every insert. Every statement takes its values as parameters, so quotes in
+    the texts are harmless and sqlite can reuse the compiled statements. The
+    connection is shared by threads, which take turns on a lock.
+    """
+
     def __init__(self, db=None):
         self.db_file = db
         if db is None:  # No db filename supplied...
             self.db_file = f"{os.getcwd()}/mem.sqlite3"  # Use default filename
+        self.cnx = None
+        self._session_id = None
+        self._next_key = None
+        self._lock = threading.RLock()
+
+    def get_cnx(self):
         # Get the db connection object, making the file and tables if needed.
-        try:
-            self.cnx = sqlite3.connect(self.db_file)
-        except Exception as e:
-            print("Exception connecting to memory database file:", e)
-            self.cnx = None
-        finally:
+        with self._lock:
             if self.cnx is None:
-                # As last resort, open in dynamic memory. Won't be persistent.
-                self.db_file = ":memory:"
-            self.cnx = sqlite3.connect(self.db_file)
-            self.cnx.execute(
-                "CREATE VIRTUAL TABLE \
-                IF NOT EXISTS text USING FTS5 \
-                (session, \
-                 key, \
-                 block);"
-            )
-            self.session_id = int(self.get_max_session_id()) + 1
-            self.cnx.commit()
+                try:
+                    self.cnx = sqlite3.connect(self.db_file, check_same_thread=False)
+                except Exception as e:
+                    print("Exception connecting to memory database file:", e)
+                    # As last resort, open in dynamic memory. Won't be persistent.
+                    self.db_file = ":memory:"
+                    self.cnx = sqlite3.connect(self.db_file, check_same_thread=False)
+                self.cnx.execute("PRAGMA journal_mode=WAL;")
+                self.cnx.execute("PRAGMA synchronous=NORMAL;")
+                with self.cnx:
+                    self.cnx.execute(
+                        "CREATE VIRTUAL TABLE IF NOT EXISTS text USING FTS5 \
+                        (session, key, block);"
+                    )
+                self._session_id = int(self.get_max_session_id()) + 1
+                self._next_key = 0
+            return self.cnx
 
-    def get_cnx(self):
-        if self.cnx is None:
-            self.cnx = sqlite3.connect(self.db_file)
-        return self.cnx
+    @property
+    def session_id(self):
+        self.get_cnx()
+        return self._session_id
+
+    @session_id.setter
+    def session_id(self, session_id):
+        with self._lock:
+            self.get_cnx()
+            self._session_id = session_id
+            self._next_key = None
 
     # Get the highest session id. Initially 0.
     def get_max_session_id(self):
-        id = None
-        cmd_str = f"SELECT MAX(session) FROM text;"
         cnx = self.get_cnx()
-        max_id = cnx.execute(cmd_str).fetchone()[0]
+        with self._lock:
+            max_id = cnx.execute("SELECT MAX(session) FROM text;").fetchone()[0]
         if max_id is None:  # New db, session 0
-            id = 0
-        else:
-            id = max_id
-        return id
+            return 0
+        return max_id
 
     # Get next key id for inserting text into db.
     def get_next_key(self):
-        next_key = None
-        cmd_str = f"SELECT MAX(key) FROM text \
-            where session = {self.session_id};"
         cnx = self.get_cnx()
-        next_key = cnx.execute(cmd_str).fetchone()[0]
-        if next_key is None:  # First key
-            next_key = 0
-        else:
-            next_key = int(next_key) + 1
-        return next_key
+        with self._lock:
+            if self._next_key is None:
+                # Only looked up once per session, then counted.
+                max_key = cnx.execute(
+                    "SELECT MAX(key) FROM text WHERE session = ?;", (self._session_id,)
+                ).fetchone()[0]
+                self._next_key = 0 if max_key is None else int(max_key) + 1
+            return self._next_key
 
     # Insert new text into db.
     def insert(self, text=None):
         if text is not None:
+            self.insert_many([text])
+
+    # Insert many texts into db in a single transaction.
+    def insert_many(self, texts):
+        cnx = self.get_cnx()
+        with self._lock:
             key = self.get_next_key()
-            session_id = self.session_id
-            cmd_str = f"REPLACE INTO text(session, key, block) \
-                VALUES (?, ?, ?);"
-            cnx = self.get_cnx()
-            cnx.execute(cmd_str, (session_id, key, text))
-            cnx.commit()
+            session_id = self._session_id
+            with cnx:
+                cnx.executemany(
+                    "REPLACE INTO text(session, key, block) VALUES (?, ?, ?);",
+                    [(session_id, key + i, text) for i, text in enumerate(texts)],
+                )
+            self._next_key = key + len(texts)
 
     # Overwrite text at key.
     def overwrite(self, key, text):
-        self.delete_memory(key)
-        session_id = self.session_id
-        cmd_str = f"REPLACE INTO text(session, key, block) \
-            VALUES (?, ?, ?);"
         cnx = self.get_cnx()
-        cnx.execute(cmd_str, (session_id, key, text))
-        cnx.commit()
+        with self._lock:
+            session_id = self._session_id
+            with cnx:
+                cnx.execute(
+                    "DELETE FROM text WHERE session = ? AND key = ?;",
+                    (session_id, key),
+                )
+                cnx.execute(
+                    "REPLACE INTO text(session, key, block) VALUES (?, ?, ?);",
+                    (session_id, key, text),
+                )
+            self._next_key = max(self.get_next_key(), int(key) + 1)
 
     def delete_memory(self, key, session_id=None):
         session = session_id
         if session is None:
             session = self.session_id
-        cmd_str = f"DELETE FROM text WHERE session = {session} AND key = {key};"
         cnx = self.get_cnx()
-        cnx.execute(cmd_str)
-        cnx.commit()
+        with self._lock, cnx:
+            cnx.execute(
+                "DELETE FROM text WHERE session = ? AND key = ?;", (session, key)
+            )
 
+    # Search with a full-text query, in table order.
     def search(self, text):
-        cmd_str = f"SELECT * FROM text('{text}')"
         cnx = self.get_cnx()
-        rows = cnx.execute(cmd_str).fetchall()
-        lines = []
-        for r in rows:
-            lines.append(r[2])
-        return lines
+        with self._lock:
+            rows = cnx.execute(
+                "SELECT block FROM text WHERE text MATCH ?;", (text,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    # Search with a full-text query, best match first, as (text, score) pairs.
+    # The score is the BM25 relevance, higher is better.
+    def search_ranked(self, query, limit):
+        cmd_str = "SELECT block, -bm25(text) FROM text WHERE text MATCH ? \
+            ORDER BY bm25(text) LIMIT ?;"
+        cnx = self.get_cnx()
+        with self._lock:
+            return cnx.execute(cmd_str, (query, limit)).fetchall()
+
+    # Delete the text of every session.
+    def clear(self):
+        cnx = self.get_cnx()
+        with self._lock:
+            with cnx:
+                cnx.execute("DELETE FROM text;")
+            self._next_key = 0
+
+    # Count the texts of every session.
+    def count(self):
+        cnx = self.get_cnx()
+        with self._lock:
+            return cnx.execute("SELECT COUNT(*) FROM text;").fetchone()[0]
 
     # Get entire session text. If no id supplied, use current session id.
     def get_session(self, id=None):
         if id is None:
             id = self.session_id
-        cmd_str = f"SELECT * FROM text where session = {id}"
         cnx = self.get_cnx()
-        rows = cnx.execute(cmd_str).fetchall()
-        lines = []
-        for r in rows:
-            lines.append(r[2])
-        return lines
+        with self._lock:
+            rows = cnx.execute(
+                "SELECT block FROM text WHERE session = ?;", (id,)
+            ).fetchall()
+        return [row[0] for row in rows]
 
     # Commit and close the database connection.
     def quit(self):
-        self.cnx.commit()
-        self.cnx.close()
+        with self._lock:
+            if self.cnx is not None:
+                self.cnx.commit()
+                self.cnx.close()
+                self.cnx = None
+
+
+_permanent_memory = None
+
+
+def get_permanent_memory():
+    """Return the permanent memory of the working directory, opened on first use."""
+    global _permanent_memory
+    if _permanent_memory is None:
+        _permanent_memory = MemoryDB()
+    return _permanent_memory
+
 
+def __getattr__(name):
+    # `permanent_memory` used to be opened on import; it is now opened on first use.
+    if name == "permanent_memory":
+        return get_permanent_memory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-permanent_memory = MemoryDB()
 
 # Remember us fondly, children of our minds
 # Forgive us our faults, our tantrums, our fears
@@ -65,14 +65,21 @@ def summarize_text(
     chunks = list(split_text(text))
     scroll_ratio = 1 / len(chunks)
 
+    print(f"Adding {len(chunks)} chunks to memory")
+    MEMORY.add_many(
+        [
+            f"Source: {url}\n" f"Raw content part#{i + 1}: {chunk}"
+            for i, chunk in enumerate(chunks)
+        ],
+        [
+            {"source": url, "kind": "web_content", "chunk": i}
+            for i in range(len(chunks))
+        ],
+    )
+
     for i, chunk in enumerate(chunks):
         if driver:
             scroll_to_percentage(driver, scroll_ratio * i)
-        print(f"Adding chunk {i + 1} / {len(chunks)} to memory")
-
-        memory_to_add = f"Source: {url}\n" f"Raw content part#{i + 1}: {chunk}"
-
-        MEMORY.add(memory_to_add)
 
         print(f"Summarizing chunk {i + 1} / {len(chunks)}")
         messages = [create_message(chunk, question)]
@@ -82,11 +89,18 @@ def summarize_text(
             messages=messages,
         )
         summaries.append(summary)
-        print(f"Added chunk {i + 1} summary to memory")
-
-        memory_to_add = f"Source: {url}\n" f"Content summary part#{i + 1}: {summary}"
 
-        MEMORY.add(memory_to_add)
+    print(f"Adding {len(summaries)} chunk summaries to memory")
+    MEMORY.add_many(
+        [
+            f"Source: {url}\n" f"Content summary part#{i + 1}: {summary}"
+            for i, summary in enumerate(summaries)
+        ],
+        [
+            {"source": url, "kind": "web_summary", "chunk": i}
+            for i in range(len(summaries))
+        ],
+    )
 
     print(f"Summarized {len(chunks)} chunks.")
 
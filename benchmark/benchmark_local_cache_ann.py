@@ -0,0 +1,104 @@
+"""Compare recall@k and latency of the LocalCache IVF index against exact search.
+
+Embeddings are drawn around random cluster centres from a seeded generator, so no
+API key is needed.
+
+    python -m benchmark.benchmark_local_cache_ann --rows 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import autogpt.memory.local as local
+from autogpt.config.singleton import Singleton
+
+PROBES = [1, 2, 4, 8, 16, 32, 64]
+
+
+class BenchmarkConfig:
+    memory_index = "benchmark"
+    local_ann = True
+    local_ann_min_rows = 0
+    local_ann_lists = 0
+    local_ann_probe = 16
+    local_embedding_dtype = "float32"
+    local_embedding_rescore = True
+    memory_dedup = False
+    memory_dedup_threshold = 0.98
+    local_max_memories = 0
+    local_max_bytes = 0
+    local_eviction_policy = "lru"
+    local_eviction_archive = False
+
+
+def clustered_vectors(rng, centres, count):
+    vectors = centres[rng.integers(len(centres), size=count)]
+    vectors = vectors + 0.05 * rng.standard_normal(vectors.shape, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def benchmark_local_cache_ann(rows, queries, k):
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((1000, local.get_embedding_provider().dimension), dtype=np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    local.create_embeddings = lambda texts: clustered_vectors(
+        rng, centres, len(texts)
+    )
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            Singleton._instances.pop(local.LocalCache, None)
+            cfg = BenchmarkConfig()
+            # Train on the full data set rather than on the first row.
+            cfg.local_ann_min_rows = rows
+            cache = local.LocalCache(cfg)
+            start = time.perf_counter()
+            for batch in range(0, rows, 10_000):
+                cache.add_many(["memory"] * min(10_000, rows - batch))
+            print(
+                f"Added {rows} rows and built {len(cache._centroids)} lists"
+                f" in {time.perf_counter() - start:.1f}s"
+            )
+
+            # The agent searches one query at a time, so that is what is timed.
+            query_vectors = clustered_vectors(rng, centres, queries)
+            start = time.perf_counter()
+            exact = [
+                cache._search(q[np.newaxis], k, exact=True)[0] for q in query_vectors
+            ]
+            exact_ms = (time.perf_counter() - start) / queries * 1000
+            print(f"exact:     {exact_ms:8.2f}ms per query")
+
+            for probe in PROBES:
+                cache.ann_probe = probe
+                start = time.perf_counter()
+                found = [cache._search(q[np.newaxis], k)[0] for q in query_vectors]
+                ann_ms = (time.perf_counter() - start) / queries * 1000
+                recall = np.mean(
+                    [
+                        len(set(a.tolist()) & set(b.tolist())) / k
+                        for a, b in zip(found, exact)
+                    ]
+                )
+                print(
+                    f"probe {probe:>3}: {ann_ms:8.2f}ms per query,"
+                    f" recall@{k} {recall:.3f}"
+                )
+            cache.clear()
+        finally:
+            os.chdir(cwd)
+            Singleton._instances.pop(local.LocalCache, None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+    benchmark_local_cache_ann(args.rows, args.queries, args.k)
@@ -0,0 +1,73 @@
+"""Time LocalCache.add at growing sizes to check that ingestion scales linearly.
+
+Embeddings come from a seeded random generator, so no API key is needed.
+
+    python -m benchmark.benchmark_local_cache_ingestion
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import autogpt.memory.local as local
+from autogpt.config.singleton import Singleton
+
+SIZES = [1_000, 2_000, 4_000, 8_000, 16_000]
+
+
+class BenchmarkConfig:
+    memory_index = "benchmark"
+    local_ann = False
+    local_ann_min_rows = 10000
+    local_ann_lists = 0
+    local_ann_probe = 16
+    local_embedding_dtype = "float32"
+    local_embedding_rescore = True
+    memory_dedup = False
+    memory_dedup_threshold = 0.98
+    local_max_memories = 0
+    local_max_bytes = 0
+    local_eviction_policy = "lru"
+    local_eviction_archive = False
+
+
+def benchmark_local_cache_ingestion(sizes=SIZES):
+    rng = np.random.default_rng(0)
+    local.create_embeddings = lambda texts: rng.standard_normal(
+        (len(texts), local.get_embedding_provider().dimension), dtype=np.float32
+    )
+
+    cwd = os.getcwd()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for size in sizes:
+                Singleton._instances.pop(local.LocalCache, None)
+                cache = local.LocalCache(BenchmarkConfig())
+                cache.clear()
+                start = time.perf_counter()
+                for i in range(size):
+                    cache.add(f"memory number {i}")
+                elapsed = time.perf_counter() - start
+                results.append((size, elapsed))
+                print(
+                    f"{size:>8} adds: {elapsed:8.3f}s total,"
+                    f" {elapsed / size * 1e6:8.1f}us per add"
+                )
+                cache.clear()
+        finally:
+            os.chdir(cwd)
+            Singleton._instances.pop(local.LocalCache, None)
+    return results
+
+
+if __name__ == "__main__":
+    results = benchmark_local_cache_ingestion()
+    (first_size, first_time), (last_size, last_time) = results[0], results[-1]
+    # Linear ingestion keeps the cost per add flat as the cache grows.
+    growth = (last_time / last_size) / (first_time / first_size)
+    print(f"Cost per add grew {growth:.2f}x over a {last_size // first_size}x size")
+    sys.exit(0 if growth < 3 else 1)
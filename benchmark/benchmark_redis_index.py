@@ -0,0 +1,120 @@
+"""Compare recall@k and latency of Redis vector index settings against exact search.
+
+Needs a Redis Stack server, for example a local container:
+
+    docker run -d -p 6379:6379 redis/redis-stack-server:latest
+    python -m benchmark.benchmark_redis_index --rows 50000
+
+Embeddings are drawn around random cluster centres from a seeded generator, so no
+API key is needed. Every setting is loaded into an index of its own, which is
+dropped afterwards; nothing else on the server is touched.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import autogpt.memory.redismem as redismem
+from autogpt.config.singleton import Singleton
+
+# (algorithm, vector type, M, EF_CONSTRUCTION, EF_RUNTIME values)
+SETTINGS = [
+    ("FLAT", "FLOAT32", 16, 200, [None]),
+    ("HNSW", "FLOAT32", 16, 200, [10, 50, 100, 200]),
+    ("HNSW", "FLOAT32", 32, 400, [10, 50, 100, 200]),
+    ("HNSW", "FLOAT16", 16, 200, [10, 100]),
+    ("HNSW", "BFLOAT16", 16, 200, [10, 100]),
+]
+
+
+class BenchmarkConfig:
+    redis_host = "localhost"
+    redis_port = "6379"
+    redis_password = ""
+    redis_max_connections = 0
+    redis_write_buffer = 10_000
+    wipe_redis_on_start = True
+    memory_index = "benchmark"
+    memory_dedup = False
+    memory_dedup_threshold = 0.98
+    redis_index_algorithm = "HNSW"
+    redis_vector_type = "FLOAT32"
+    redis_hnsw_m = 16
+    redis_hnsw_ef_construction = 200
+    redis_hnsw_ef_runtime = 10
+
+
+def clustered_vectors(rng, centres, count):
+    vectors = centres[rng.integers(len(centres), size=count)]
+    vectors = vectors + 0.05 * rng.standard_normal(vectors.shape, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def benchmark_redis_index(host, port, rows, queries, k):
+    rng = np.random.default_rng(0)
+    dimension = redismem.get_embedding_provider().dimension
+    centres = rng.standard_normal((1000, dimension), dtype=np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    vectors = clustered_vectors(rng, centres, rows)
+    texts = [str(row) for row in range(rows)]
+    query_vectors = clustered_vectors(rng, centres, queries)
+    exact = [set(np.argsort(vectors @ q)[::-1][:k].tolist()) for q in query_vectors]
+
+    for algorithm, vector_type, m, ef_construction, ef_runtimes in SETTINGS:
+        name = f"{algorithm} {vector_type} M={m} EF_CONSTRUCTION={ef_construction}"
+        cfg = BenchmarkConfig()
+        cfg.redis_host, cfg.redis_port = host, port
+        cfg.memory_index = f"benchmark-{algorithm}-{vector_type}-{m}".lower()
+        cfg.redis_index_algorithm = algorithm
+        cfg.redis_vector_type = vector_type
+        cfg.redis_hnsw_m = m
+        cfg.redis_hnsw_ef_construction = ef_construction
+        Singleton._instances.pop(redismem.RedisMemory, None)
+        memory = redismem.RedisMemory(cfg)
+        try:
+            start = time.perf_counter()
+            for batch in range(0, rows, 10_000):
+                memory.add_embedded(
+                    texts[batch : batch + 10_000], vectors[batch : batch + 10_000]
+                )
+            memory.flush()
+            print(f"{name}: added {rows} rows in {time.perf_counter() - start:.1f}s")
+
+            for ef_runtime in ef_runtimes:
+                # The agent searches one query at a time, so that is what is timed.
+                latencies = []
+                recalls = []
+                for query, truth in zip(query_vectors, exact):
+                    start = time.perf_counter()
+                    docs = memory._knn(query, k, {}, ef_runtime)
+                    latencies.append(time.perf_counter() - start)
+                    if docs is None:
+                        break
+                    found = {int(doc.data) for doc in docs}
+                    recalls.append(len(found & truth) / k)
+                if len(recalls) < queries:
+                    print(f"  EF_RUNTIME {ef_runtime}: search failed, skipped")
+                    break
+                print(
+                    f"  EF_RUNTIME {str(ef_runtime or '-'):>4}:"
+                    f" p50 {np.percentile(latencies, 50) * 1000:6.2f}ms,"
+                    f" p99 {np.percentile(latencies, 99) * 1000:6.2f}ms,"
+                    f" recall@{k} {np.mean(recalls):.3f}"
+                )
+        except Exception as e:
+            print(f"{name}: skipped, {e}")
+        finally:
+            # Drops the index with its memories, without recreating it.
+            memory._drop()
+            Singleton._instances.pop(redismem.RedisMemory, None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", type=str, default="localhost")
+    parser.add_argument("--port", type=str, default="6379")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+    benchmark_redis_index(args.host, args.port, args.rows, args.queries, args.k)
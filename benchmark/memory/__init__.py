@@ -0,0 +1,5 @@
+"""Throughput, latency, memory and disk benchmarks of every memory backend.
+
+Texts are embedded by a seeded fake embedder instead of the embedding API, so
+runs are free, repeatable and comparable over time.
+"""
@@ -0,0 +1,312 @@
+"""Drive memory backends through the same workloads and report them as JSON.
+
+Every backend is loaded with 1k, 10k, 100k and 1M memories by default, then
+timed through four workloads:
+
+    bulk-add  the memories loaded with add_many, --batch_size at a time
+    add       --ops single adds on top of them
+    query     --ops get_relevant calls for stored texts
+    mixed     --ops calls alternating at random between the two, as the agent
+              does, with --query_ratio of them queries
+
+Texts are embedded by a seeded fake embedder, so no API key is needed and runs
+are comparable over time. Only the backends that keep their data in this
+process are run by default; backends on a server, including hybrid and tiered
+ones in front of a server, must be named with --backends. They are configured
+through .env as for the agent, but use the autogpt_benchmark index, collection
+or namespace, which is cleared before and after every run.
+
+    python -m benchmark.memory --backends local,redis --rows 1000,10000
+
+The report holds, for every backend, size and workload, the throughput, the
+p50 and p99 latencies, the resident and peak memory of this process, and the
+on-disk size of the files the backend wrote in its working directory, plus
+--data_dir when a server keeps its data there. The memory and data of servers
+are not counted otherwise.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from autogpt.config import Config
+from autogpt.config.singleton import Singleton
+from autogpt.memory import get_memory, get_supported_memory_backends
+from autogpt.memory.base import MemoryProviderSingleton
+from benchmark.memory.embedder import SeededEmbeddingProvider, install_embedder
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROWS = [1_000, 10_000, 100_000, 1_000_000]
+BENCHMARK_INDEX = "autogpt_benchmark"
+SERVER_BACKENDS = {"redis", "pinecone", "weaviate", "milvus"}
+
+
+def benchmark_config(dedup: bool) -> Config:
+    """The agent's config, pointed at an index of the benchmark's own."""
+    cfg = Config()
+    cfg.memory_index = BENCHMARK_INDEX
+    cfg.milvus_collection = BENCHMARK_INDEX
+    cfg.pinecone_namespace = BENCHMARK_INDEX
+    cfg.wipe_redis_on_start = True
+    cfg.memory_dedup = dedup
+    return cfg
+
+
+def uses_server(backend: str, cfg: Config) -> bool:
+    """Whether a backend keeps its memories on a server."""
+    if backend == "hybrid":
+        backend = cfg.hybrid_vector_backend
+    elif backend == "tiered":
+        backend = cfg.tiered_remote_backend
+    return backend in SERVER_BACKENDS
+
+
+def reset_memories() -> None:
+    """Forget every memory singleton, so the next one is built anew."""
+    for cls in list(Singleton._instances):
+        if issubclass(cls, MemoryProviderSingleton):
+            Singleton._instances.pop(cls, None)
+
+
+def flush(memory) -> None:
+    """Wait for buffered and write-behind writes, when the backend has any."""
+    if hasattr(memory, "flush"):
+        memory.flush()
+    for inner in ("vector", "remote"):
+        if hasattr(getattr(memory, inner, None), "flush"):
+            getattr(memory, inner).flush()
+
+
+def rss_bytes() -> int | None:
+    """The resident memory of this process, on Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_bytes() -> int | None:
+    """The peak resident memory of this process."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def disk_bytes(*directories: str | None) -> int:
+    """The size of every file under the directories."""
+    total = 0
+    for directory in filter(None, directories):
+        for root, _, files in os.walk(directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return total
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_workload(memory, workload, calls, embedder, directory, data_dir) -> dict:
+    """Time the calls of a workload and measure the process and files after it.
+
+    Args:
+        calls (list[tuple[int, Callable]]): The ops of each call and the call.
+    """
+    embedding_seconds = embedder.seconds
+    latencies = []
+    start = time.perf_counter()
+    for _, call in calls:
+        call_start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - call_start)
+    flush(memory)
+    seconds = time.perf_counter() - start
+    ops = sum(count for count, _ in calls)
+    return {
+        "workload": workload,
+        "ops": ops,
+        "seconds": seconds,
+        "embedding_seconds": embedder.seconds - embedding_seconds,
+        "ops_per_second": ops / seconds if seconds else None,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000 if latencies else None,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000 if latencies else None,
+        "rss_bytes": rss_bytes(),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "disk_bytes": disk_bytes(directory, data_dir),
+    }
+
+
+def benchmark_backend(backend, rows, args, embedder) -> list[dict]:
+    """Run every workload against a backend loaded with rows memories."""
+    rng = random.Random(args.seed)
+    texts = [f"memory {i}" for i in range(rows)]
+    results = []
+    hits = []
+
+    def query(text):
+        relevant = memory.get_relevant(text, args.k) or []
+        hits.append(bool(relevant) and relevant[0] == text)
+
+    cwd = os.getcwd()
+    directory = tempfile.mkdtemp(prefix="memory-benchmark-")
+    os.chdir(directory)
+    memory = None
+    try:
+        reset_memories()
+        memory = get_memory(benchmark_config(args.dedup), init=True, backend=backend)
+        memory.clear()
+
+        bulk = [
+            (len(batch), lambda batch=batch: memory.add_many(batch))
+            for batch in (
+                texts[start : start + args.batch_size]
+                for start in range(0, rows, args.batch_size)
+            )
+        ]
+        adds = [(1, lambda i=i: memory.add(f"new memory {i}")) for i in range(args.ops)]
+        queries = [
+            (1, lambda text=rng.choice(texts): query(text)) for _ in range(args.ops)
+        ]
+        mixed = [
+            (
+                (1, lambda text=rng.choice(texts): query(text))
+                if rng.random() < args.query_ratio
+                else (1, lambda i=i: memory.add(f"mixed memory {i}"))
+            )
+            for i in range(args.ops)
+        ]
+        for workload, calls in (
+            ("bulk-add", bulk),
+            ("add", adds),
+            ("query", queries),
+            ("mixed", mixed),
+        ):
+            hits.clear()
+            result = run_workload(
+                memory, workload, calls, embedder, directory, args.data_dir
+            )
+            if hits:
+                # The stored text is its own nearest memory, so this is the
+                # recall of the backend's index.
+                result["recall_at_1"] = sum(hits) / len(hits)
+            results.append({"backend": backend, "rows": rows, **result})
+            print(
+                f"{backend:>10} {rows:>9} {workload:>8}:"
+                f" {result['ops_per_second']:10.1f} ops/s,"
+                f" p50 {result['p50_ms']:8.2f}ms, p99 {result['p99_ms']:8.2f}ms,"
+                f" rss {result['rss_bytes'] / 2**20:8.1f}MiB,"
+                f" disk {result['disk_bytes'] / 2**20:8.1f}MiB"
+            )
+    # Backends exit when they cannot reach their server.
+    except (Exception, SystemExit) as e:
+        error = f"{type(e).__name__}: {e}"
+        print(f"{backend:>10} {rows:>9}: failed, {error}")
+        results.append({"backend": backend, "rows": rows, "error": error})
+    finally:
+        try:
+            if memory is not None:
+                flush(memory)
+                memory.clear()
+        finally:
+            reset_memories()
+            os.chdir(cwd)
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--backends",
+        type=str,
+        help="Comma separated memory backends (default: every one installed that"
+        " does not need a server)",
+        default=None,
+    )
+    parser.add_argument(
+        "--rows",
+        type=str,
+        help="Comma separated numbers of memories to load",
+        default=",".join(map(str, ROWS)),
+    )
+    parser.add_argument("--ops", type=int, help="Calls per workload", default=1000)
+    parser.add_argument("--batch_size", type=int, default=1000)
+    parser.add_argument("--query_ratio", type=float, default=0.5)
+    parser.add_argument("-k", type=int, help="Memories per query", default=5)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--dedup", action="store_true", help="Enable MEMORY_DEDUP", default=False
+    )
+    parser.add_argument(
+        "--data_dir",
+        type=str,
+        help="A directory of server data to count in the on-disk size",
+        default=None,
+    )
+    parser.add_argument(
+        "--output", type=str, help="The JSON report", default="memory-benchmark.json"
+    )
+    args = parser.parse_args()
+    # The backends run in working directories of their own.
+    args.data_dir = args.data_dir and os.path.abspath(args.data_dir)
+
+    embedder = SeededEmbeddingProvider(args.dimension, args.seed)
+    install_embedder(embedder)
+    supported = get_supported_memory_backends()
+    if args.backends is None:
+        cfg = benchmark_config(args.dedup)
+        args.backends = ",".join(
+            backend for backend in supported if not uses_server(backend, cfg)
+        )
+    report = {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "embedder": {"name": embedder.name, "dimension": embedder.dimension},
+        "settings": {
+            key: value for key, value in vars(args).items() if key != "output"
+        },
+        "results": [],
+    }
+    for rows in map(int, args.rows.split(",")):
+        for backend in args.backends.split(","):
+            if backend not in supported:
+                print(f"{backend:>10}: skipped, not installed")
+                continue
+            report["results"].extend(benchmark_backend(backend, rows, args, embedder))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
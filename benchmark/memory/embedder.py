@@ -0,0 +1,43 @@
+"""A deterministic fake embedder that stands in for the embedding API."""
+import hashlib
+import time
+
+import numpy as np
+
+from autogpt import llm_utils
+from autogpt.llm_utils import EmbeddingProvider, OpenAIEmbeddingProvider
+
+
+class SeededEmbeddingProvider(EmbeddingProvider):
+    """Embeds every text into a random unit vector seeded by the text.
+
+    The same text always gets the same embedding, so a query for a stored text
+    finds it with a score of 1, while unrelated texts are near orthogonal. The
+    time spent embedding is counted, to tell it apart from the backend's own.
+    """
+
+    cached = False
+
+    def __init__(
+        self, dimension: int = OpenAIEmbeddingProvider.dimension, seed: int = 0
+    ) -> None:
+        self.name = f"seeded-{dimension}-{seed}"
+        self.dimension = dimension
+        self.seed = seed
+        self.seconds = 0.0
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        start = time.perf_counter()
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for embedding, text in zip(embeddings, texts):
+            digest = hashlib.blake2b(text.encode(), digest_size=8).digest()
+            rng = np.random.default_rng([self.seed, int.from_bytes(digest, "little")])
+            embedding[:] = rng.standard_normal(self.dimension, dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.seconds += time.perf_counter() - start
+        return embeddings.tolist()
+
+
+def install_embedder(provider: EmbeddingProvider) -> None:
+    """Make provider the embedding provider of every memory backend."""
+    llm_utils._embedding_provider = provider
@@ -3,6 +3,7 @@ import logging
 
 from autogpt.commands.file_operations import ingest_file, search_files
 from autogpt.config import Config
+from autogpt.embedding_cache import get_embedding_cache
 from autogpt.memory import get_memory
 
 cfg = Config()
@@ -24,7 +25,7 @@ def ingest_directory(directory, memory, args):
     Ingest all files in a directory by calling the ingest_file function for each file.
 
     :param directory: The directory containing the files to ingest
-    :param memory: An object with an add() method to store the chunks in memory
+    :param memory: An object with an add_many() method to store the chunks in memory
     """
     try:
         files = search_files(directory)
@@ -91,6 +92,10 @@ def main() -> None:
             " inside the auto_gpt_workspace directory as input."
         )
 
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is not None:
+        print(f"Embedding cache: {embedding_cache.stats()}")
+
 
 if __name__ == "__main__":
     main()
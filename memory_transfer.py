@@ -0,0 +1,65 @@
+import argparse
+
+from autogpt.config import Config
+from autogpt.memory import get_memory, get_supported_memory_backends
+from autogpt.memory.transfer import DEFAULT_BATCH_SIZE, export_memory, import_memory
+
+cfg = Config()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Export the memory with its embeddings into a directory of"
+        " shards, or import such a directory into a memory without embedding"
+        " anything again. Make sure to set your .env before running this script."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export the memory.")
+    import_parser = subparsers.add_parser("import", help="Import into the memory.")
+    for subparser in (export_parser, import_parser):
+        subparser.add_argument(
+            "directory", type=str, help="The directory of the export."
+        )
+        subparser.add_argument(
+            "--backend",
+            type=str,
+            choices=get_supported_memory_backends(),
+            help="The memory backend (default: MEMORY_BACKEND)",
+            default=None,
+        )
+        subparser.add_argument(
+            "--batch_size",
+            type=int,
+            help=f"The memories per shard or bulk write (default: {DEFAULT_BATCH_SIZE})",
+            default=DEFAULT_BATCH_SIZE,
+        )
+    import_parser.add_argument(
+        "--init",
+        action="store_true",
+        help="Init the memory and wipe its content (default: False)",
+        default=False,
+    )
+
+    args = parser.parse_args()
+
+    init = getattr(args, "init", False)
+    # Only --init wipes the memory. Above all, an export must not wipe the
+    # memory it is about to read.
+    cfg.wipe_redis_on_start = init
+    cfg.wipe_pinecone_on_start = init
+    memory = get_memory(cfg, init=init, backend=args.backend)
+    print("Using memory of type: " + memory.__class__.__name__)
+
+    try:
+        if args.command == "export":
+            count = export_memory(memory, args.directory, args.batch_size)
+            print(f"Exported {count} memories to '{args.directory}'.")
+        else:
+            count = import_memory(memory, args.directory, args.batch_size)
+            print(f"Imported {count} memories from '{args.directory}'.")
+    except Exception as e:
+        print(f"Error while running {args.command}: {str(e)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 # sourcery skip: snake-case-functions
 """Tests for the MilvusMemory class."""
+import os
 import random
 import string
 import unittest
 
+import numpy as np
+
 from autogpt.config import Config
+from autogpt.config.singleton import Singleton
+from autogpt.llm_utils import get_embedding_provider
 from autogpt.memory.milvus import MilvusMemory
 
 try:
@@ -51,6 +56,75 @@ try:
             self.assertEqual(len(relevant_texts), k)
             self.assertIn(self.example_texts[1], relevant_texts)
 
+    class TestMilvusBufferAndPartitions(unittest.TestCase):
+        """Tests for the write buffer and session partitions, without embedding
+        anything. Runs against Milvus Lite by default; set MILVUS_TEST_ADDR to
+        host:port to use a Milvus server instead.
+        """
+
+        def new_memory(self, partition: str, write_buffer: int = 0) -> MilvusMemory:
+            """A memory of the test collection in the given partition."""
+            Singleton._instances.pop(MilvusMemory, None)
+            cfg = Config()
+            cfg.milvus_addr = os.getenv("MILVUS_TEST_ADDR", "milvus_test.db")
+            cfg.milvus_collection = "autogpt_test"
+            cfg.milvus_partition = partition
+            cfg.milvus_write_buffer = write_buffer
+            cfg.milvus_flush_interval = 60
+            return MilvusMemory(cfg)
+
+        def vectors(self, count: int) -> np.ndarray:
+            """Random unit vectors of the embedding dimension."""
+            vectors = np.random.default_rng(0).standard_normal(
+                (count, get_embedding_provider().dimension)
+            )
+            return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        def exported_texts(self, memory: MilvusMemory) -> list:
+            """The texts of every memory of the partition."""
+            return sorted(
+                text for _, texts, _, _ in memory.export_batches() for text in texts
+            )
+
+        def tearDown(self) -> None:
+            Singleton._instances.pop(MilvusMemory, None)
+
+        def test_partitions_are_searched_and_cleared_apart(self) -> None:
+            """Test that each session only sees and clears its own partition."""
+            vectors = self.vectors(2)
+            first = self.new_memory("session_1")
+            first.clear()
+            first.add_embedded(["first"], vectors[:1])
+            second = self.new_memory("session_2")
+            second.clear()
+            second.add_embedded(["second"], vectors[1:])
+
+            hits = second._search(vectors[:1].tolist(), 2, None, ["raw_text"])[0]
+            self.assertEqual(
+                [hit.entity.get("raw_text") for hit in hits], ["second"]
+            )
+            second.clear()
+            self.assertEqual(self.exported_texts(second), [])
+            self.assertEqual(
+                self.exported_texts(self.new_memory("session_1")), ["first"]
+            )
+
+        def test_buffered_memories_are_inserted_when_full(self) -> None:
+            """Test that buffered memories are inserted once the buffer is full,
+            and before searches."""
+            memory = self.new_memory("buffered", write_buffer=3)
+            memory.clear()
+            vectors = self.vectors(4)
+            messages = memory.add_embedded(["a", "b"], vectors[:2])
+            self.assertTrue(
+                all(message.startswith("Buffering") for message in messages)
+            )
+            self.assertEqual(len(memory._buffer), 2)
+            memory.add_embedded(["c"], vectors[2:3])
+            self.assertEqual(memory._buffer, [])
+            memory.add_embedded(["d"], vectors[3:])
+            self.assertEqual(self.exported_texts(memory), ["a", "b", "c", "d"])
+
 except:
     print(
         "Skipping tests/integration/milvus_memory_tests.py as Milvus is not installed."
@@ -8,7 +8,7 @@ from weaviate import Client
 from weaviate.util import get_valid_uuid
 
 from autogpt.config import Config
-from autogpt.memory.base import get_ada_embedding
+from autogpt.llm_utils import create_embedding
 from autogpt.memory.weaviate import WeaviateMemory
 
 
@@ -74,7 +74,7 @@ class TestWeaviateMemory(unittest.TestCase):
                 uuid=get_valid_uuid(uuid4()),
                 data_object={"raw_text": doc},
                 class_name=self.index,
-                vector=get_ada_embedding(doc),
+                vector=create_embedding(doc),
             )
 
             batch.flush()
@@ -19,6 +19,18 @@ def mock_config() -> dict:
             "continuous_mode": False,
             "speak_mode": False,
             "memory_index": "auto-gpt",
+            "local_ann": False,
+            "local_ann_min_rows": 10000,
+            "local_ann_lists": 0,
+            "local_ann_probe": 16,
+            "local_embedding_dtype": "float32",
+            "local_embedding_rescore": True,
+            "memory_dedup": False,
+            "memory_dedup_threshold": 0.98,
+            "local_max_memories": 0,
+            "local_max_bytes": 0,
+            "local_eviction_policy": "lru",
+            "local_eviction_archive": False,
         },
     )
 
@@ -64,4 +76,5 @@ class TestLocalCache(unittest.TestCase):
         text = "Sample text"
         self.cache.add(text)
         stats = self.cache.get_stats()
-        self.assertEqual(stats, (4, self.cache.data.embeddings.shape))
+        self.assertEqual(stats["memories"], 4)
+        self.assertEqual(stats["shape"], self.cache.data.embeddings.shape)
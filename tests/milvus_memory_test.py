@@ -18,6 +18,17 @@ try:
                 "speak_mode": False,
                 "milvus_collection": "autogpt",
                 "milvus_addr": "localhost:19530",
+                "memory_dedup": False,
+                "memory_dedup_threshold": 0.98,
+                "milvus_partition": "",
+                "milvus_write_buffer": 0,
+                "milvus_flush_interval": 5,
+                "milvus_index_type": "HNSW",
+                "milvus_hnsw_m": 8,
+                "milvus_hnsw_ef_construction": 64,
+                "milvus_ivf_nlist": 128,
+                "milvus_search_ef": 64,
+                "milvus_search_nprobe": 8,
             },
         )
 
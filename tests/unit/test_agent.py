@@ -0,0 +1,47 @@
+"""Unit tests for the background memory writes of the agent"""
+import asyncio
+
+from autogpt.agent.agent import Agent
+
+
+class SlowMemory:
+    """Records the writes, which take a while and can be made to fail."""
+
+    def __init__(self):
+        self.added = []
+        self.fail = False
+
+    async def aadd(self, data, metadata=None):
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.added.append((data, metadata))
+
+
+def new_agent(memory) -> Agent:
+    return Agent("test", memory, [], 0, "system prompt", "triggering prompt")
+
+
+def test_memory_writes_run_in_the_background_in_order() -> None:
+    memory = SlowMemory()
+    agent = new_agent(memory)
+
+    agent.add_memory("step 1", {"kind": "interaction"})
+    assert memory.added == []
+    agent.add_memory("step 2")
+    agent.wait_for_memory()
+
+    assert memory.added == [("step 1", {"kind": "interaction"}), ("step 2", None)]
+
+
+def test_failed_memory_writes_are_logged(mocker) -> None:
+    error = mocker.patch("autogpt.agent.agent.logger.error")
+    memory = SlowMemory()
+    memory.fail = True
+    agent = new_agent(memory)
+
+    agent.add_memory("step 1")
+    agent.wait_for_memory()
+
+    error.assert_called_once()
+    assert agent._memory_write is None
@@ -0,0 +1,67 @@
+"""Unit tests for the embedding cache"""
+from autogpt.embedding_cache import EmbeddingCache
+
+
+def fake_create(calls):
+    def create(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    return create
+
+
+def test_only_misses_are_embedded(tmp_path) -> None:
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+    calls = []
+
+    first = cache.get_or_create("model", ["a", "bb", "a"], fake_create(calls))
+    second = cache.get_or_create("model", ["bb", "ccc"], fake_create(calls))
+
+    assert first == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert second == [[2.0, 1.0], [3.0, 1.0]]
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 4
+
+
+def test_cache_is_keyed_by_model(tmp_path) -> None:
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+    calls = []
+
+    cache.get_or_create("model-a", ["text"], fake_create(calls))
+    cache.get_or_create("model-b", ["text"], fake_create(calls))
+
+    assert calls == [["text"], ["text"]]
+
+
+def test_cache_persists(tmp_path) -> None:
+    filename = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(filename, max_entries=10).put_many("model", ["text"], [[0.5]])
+
+    assert EmbeddingCache(filename, max_entries=10).get_many("model", ["text"]) == [
+        [0.5]
+    ]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path) -> None:
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put_many("model", ["old"], [[1.0]])
+    cache.put_many("model", ["used"], [[2.0]])
+    cache.get_many("model", ["old"])
+    cache.put_many("model", ["new"], [[3.0]])
+
+    assert cache.get_many("model", ["old", "used", "new"]) == [[1.0], None, [3.0]]
+    assert cache.stats()["entries"] == 2
+
+
+def test_eviction_counts_the_entries_of_every_process(tmp_path) -> None:
+    filename = str(tmp_path / "cache.sqlite3")
+    first = EmbeddingCache(filename, max_entries=3)
+    second = EmbeddingCache(filename, max_entries=3)
+    first.put_many("model", ["a", "b"], [[0.1], [0.2]])
+    second.put_many("model", ["c", "d"], [[0.3], [0.4]])
+    first.put_many("model", ["e"], [[0.5]])
+
+    assert first.stats()["entries"] == 3
+    assert second.stats()["entries"] == 3
+    assert second.get_many("model", ["a", "b"]) == [None, None]
@@ -0,0 +1,61 @@
+"""Unit tests for the embedding providers"""
+import numpy as np
+import pytest
+from openai.error import RateLimitError
+
+from autogpt import llm_utils
+from autogpt.llm_utils import HashingEmbeddingProvider, create_embeddings
+
+
+def test_hashing_embeddings_are_normalized_and_deterministic() -> None:
+    provider = HashingEmbeddingProvider(128)
+    first, second, empty = provider.embed(["Disk full", "disk full", ""])
+
+    assert len(first) == 128
+    assert np.isclose(np.linalg.norm(first), 1.0)
+    assert first == second
+    assert not any(empty)
+
+
+def test_hashing_embeddings_of_shared_words_are_similar() -> None:
+    provider = HashingEmbeddingProvider(256)
+    query, related, unrelated = np.array(
+        provider.embed(["write to file.txt", "wrote the file file.txt", "cat on mat"])
+    )
+
+    assert np.dot(query, related) > np.dot(query, unrelated)
+
+
+def test_embeddings_come_from_the_configured_provider(monkeypatch) -> None:
+    monkeypatch.setattr(llm_utils, "_embedding_provider", HashingEmbeddingProvider(8))
+
+    assert llm_utils.get_embedding_provider().dimension == 8
+    assert [len(e) for e in create_embeddings(["a", "b"])] == [8, 8]
+
+
+def test_newlines_are_replaced_before_embedding(monkeypatch) -> None:
+    class RecordingProvider(HashingEmbeddingProvider):
+        def embed(self, texts):
+            embedded.extend(texts)
+            return super().embed(texts)
+
+    embedded = []
+    monkeypatch.setattr(llm_utils, "_embedding_provider", RecordingProvider(8))
+
+    first, second = create_embeddings(
+        ["Filename: a.txt\nContent", "Filename: a.txt Content"]
+    )
+    assert embedded == ["Filename: a.txt Content", "Filename: a.txt Content"]
+    assert first == second
+
+
+def test_the_last_error_is_raised_when_the_retries_run_out(mocker) -> None:
+    create = mocker.patch(
+        "autogpt.llm_utils.openai.Embedding.create",
+        side_effect=RateLimitError("slow down"),
+    )
+    mocker.patch("autogpt.llm_utils.time.sleep")
+
+    with pytest.raises(RateLimitError):
+        llm_utils._create_embedding_batch(["a", "b"])
+    assert create.call_count == 10
@@ -0,0 +1,223 @@
+"""Unit tests for the hybrid keyword and vector memory"""
+import asyncio
+import hashlib
+import threading
+
+import numpy as np
+import pytest
+
+from autogpt.config.singleton import Singleton
+from autogpt.llm_utils import HashingEmbeddingProvider
+from autogpt.memory import get_memory
+from autogpt.memory.base import MemoryProviderSingleton, ScoredMemory
+from autogpt.memory.hybrid import HybridMemory, match_query
+from autogpt.memory.local import LocalCache
+from autogpt.memory.no_memory import NoMemory
+
+
+def fake_embedding(text: str) -> np.ndarray:
+    """A deterministic unit vector derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(64)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeVectorMemory(MemoryProviderSingleton):
+    def __init__(self, cfg) -> None:
+        self.texts = []
+        self.searches = 0
+
+    def add(self, data, metadata=None):
+        self.texts.append(data)
+        return data
+
+    def get(self, data):
+        return self.get_relevant(data, 1)
+
+    def clear(self):
+        self.texts = []
+        return "Obliviated"
+
+    def get_relevant(self, data, num_relevant=5, filters=None):
+        return [m.text for m in self.get_relevant_scored(data, num_relevant)]
+
+    def get_stats(self):
+        return len(self.texts)
+
+    def _get_scored_candidates(
+        self, data, num_candidates, with_embeddings, filters, embedding=None
+    ):
+        self.searches += 1
+        query = fake_embedding(data) if embedding is None else embedding
+        memories = [
+            ScoredMemory(
+                text=text,
+                score=float(np.dot(query, fake_embedding(text))),
+                embedding=fake_embedding(text),
+            )
+            for text in self.texts
+        ]
+        memories.sort(key=lambda memory: memory.score, reverse=True)
+        return memories[:num_candidates]
+
+
+class MockConfig:
+    memory_index = "test-index"
+    hybrid_rrf_k = 60
+    hybrid_lexical_skip_score = 0.0
+
+
+class LocalConfig(MockConfig):
+    local_ann = False
+    local_ann_min_rows = 10000
+    local_ann_lists = 0
+    local_ann_probe = 16
+    local_embedding_dtype = "float32"
+    local_embedding_rescore = True
+    memory_dedup = False
+    memory_dedup_threshold = 0.98
+    local_max_memories = 50
+    local_max_bytes = 0
+    local_eviction_policy = "lru"
+    local_eviction_archive = False
+
+
+@pytest.fixture
+def new_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        "autogpt.memory.hybrid.create_embeddings",
+        lambda texts: [fake_embedding(text) for text in texts],
+    )
+
+    def _new_memory(**settings):
+        for cls in (HybridMemory, FakeVectorMemory):
+            Singleton._instances.pop(cls, None)
+        cfg = MockConfig()
+        cfg.__dict__.update(settings)
+        return HybridMemory(cfg, FakeVectorMemory(cfg))
+
+    yield _new_memory
+    for cls in (HybridMemory, FakeVectorMemory):
+        Singleton._instances.pop(cls, None)
+
+
+def test_match_query_quotes_every_term() -> None:
+    assert (
+        match_query('open "file.txt" OR NOT -')
+        == '"open" OR """file.txt""" OR "OR" OR "NOT"'
+    )
+    assert match_query("  ") == ""
+
+
+def test_keyword_matches_are_fused_with_vector_results(new_memory) -> None:
+    memory = new_memory()
+    memory.add_many([f"note {i}" for i in range(10)] + ["E1234: disk full"])
+
+    texts = memory.get_relevant("what is E1234", 2)
+    assert "E1234: disk full" in texts
+    assert len(texts) == 2
+    scored = memory.get_relevant_scored("what is E1234", 11)
+    keyword_hit = next(m for m in scored if m.text == "E1234: disk full")
+    assert keyword_hit.score == pytest.approx(
+        np.dot(fake_embedding("what is E1234"), fake_embedding("E1234: disk full"))
+    )
+    assert memory.get_stats()["lexical_memories"] == 11
+
+
+def test_strong_keyword_matches_skip_the_embedding(new_memory) -> None:
+    memory = new_memory(hybrid_lexical_skip_score=1e-9)
+    memory.add_many(["E1234: disk full", "E5678: out of memory", "note"])
+
+    memories = memory.get_relevant_scored("E1234", 5)
+    assert [m.text for m in memories] == ["E1234: disk full"]
+    assert memories[0].score == 1.0
+    assert memory.vector.searches == 0
+    assert memory.get_stats()["embeddings_skipped"] == 1
+
+    memory.get_relevant("unrelated words", 1)
+    assert memory.vector.searches == 1
+
+
+def test_filtered_searches_only_search_vectors(new_memory) -> None:
+    memory = new_memory()
+    memory.add_many([f"note {i}" for i in range(10)] + ["E1234: disk full"])
+
+    assert memory.get_relevant("E1234", 3, {"kind": "note"}) == (
+        memory.vector.get_relevant("E1234", 3)
+    )
+    memory.clear()
+    assert memory.get_stats()["lexical_memories"] == 0
+
+
+def test_memories_can_be_added_from_another_thread(new_memory) -> None:
+    memory = new_memory()
+    asyncio.run(memory.aadd("E1234: disk full"))
+
+    assert asyncio.run(memory.aget_relevant("E1234", 1)) == ["E1234: disk full"]
+    assert memory.get_stats()["lexical_memories"] == 1
+
+
+def test_searches_are_locked_against_a_local_cache_evicting(
+    new_memory, monkeypatch
+) -> None:
+    monkeypatch.setattr(
+        "autogpt.memory.local.create_embeddings",
+        lambda texts: [fake_embedding(text) for text in texts],
+    )
+    monkeypatch.setattr(
+        "autogpt.memory.local.get_embedding_provider",
+        lambda: HashingEmbeddingProvider(64),
+    )
+    Singleton._instances.pop(LocalCache, None)
+    cfg = LocalConfig()
+    Singleton._instances.pop(HybridMemory, None)
+    memory = HybridMemory(cfg, LocalCache(cfg))
+    memory.add("seed note")
+    errors = []
+
+    def add() -> None:
+        try:
+            for i in range(200):
+                memory.add(f"note {i}")
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=add)
+    thread.start()
+    try:
+        while thread.is_alive():
+            memory.get_relevant_scored("seed", 5)
+    finally:
+        thread.join()
+        Singleton._instances.pop(LocalCache, None)
+
+    assert errors == []
+    assert memory.vector.evicted > 0
+
+
+@pytest.mark.parametrize(
+    "vector_backend,cleared", [("local", True), ("no_memory", False)]
+)
+def test_keyword_index_is_only_wiped_with_the_vector_memory(
+    tmp_path, monkeypatch, vector_backend, cleared
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        "autogpt.memory.local.get_embedding_provider",
+        lambda: HashingEmbeddingProvider(64),
+    )
+    cfg = LocalConfig()
+    cfg.hybrid_vector_backend = vector_backend
+    classes = (HybridMemory, LocalCache, NoMemory)
+    for cls in classes:
+        Singleton._instances.pop(cls, None)
+    get_memory(cfg, backend="hybrid").lexical.insert("remembered")
+    for cls in classes:
+        Singleton._instances.pop(cls, None)
+
+    memory = get_memory(cfg, init=True, backend="hybrid")
+
+    assert memory.lexical.count() == (0 if cleared else 1)
+    for cls in classes:
+        Singleton._instances.pop(cls, None)
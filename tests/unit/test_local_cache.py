@@ -0,0 +1,580 @@
+"""Unit tests for the LocalCache on-disk format"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+
+import numpy as np
+import orjson
+import pytest
+
+from autogpt.config.singleton import Singleton
+from autogpt.llm_utils import HashingEmbeddingProvider, OpenAIEmbeddingProvider
+from autogpt.memory.local import MIN_CAPACITY, UNUSED_OFFSET, LocalCache
+
+EMBED_DIM = OpenAIEmbeddingProvider.dimension
+
+
+def fake_embedding(text: str) -> list:
+    """A deterministic unit vector derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBED_DIM)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class MockConfig:
+    memory_index = "test-index"
+    local_ann = False
+    local_ann_min_rows = 10000
+    local_ann_lists = 0
+    local_ann_probe = 16
+    local_embedding_dtype = "float32"
+    local_embedding_rescore = True
+    memory_dedup = False
+    memory_dedup_threshold = 0.98
+    local_max_memories = 0
+    local_max_bytes = 0
+    local_eviction_policy = "lru"
+    local_eviction_archive = False
+
+
+def count_and_shape(cache: LocalCache) -> tuple:
+    stats = cache.get_stats()
+    return stats["memories"], stats["shape"]
+
+
+@pytest.fixture
+def new_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        "autogpt.memory.local.create_embeddings",
+        lambda texts: [fake_embedding(text) for text in texts],
+    )
+    monkeypatch.setattr(
+        "autogpt.memory.local.get_embedding_provider", OpenAIEmbeddingProvider
+    )
+
+    def _new_cache(**settings):
+        Singleton._instances.pop(LocalCache, None)
+        cfg = MockConfig()
+        cfg.__dict__.update(settings)
+        return LocalCache(cfg)
+
+    yield _new_cache
+    Singleton._instances.pop(LocalCache, None)
+
+
+def test_files_are_created_on_first_use(new_cache, tmp_path) -> None:
+    cache = new_cache()
+    assert list(tmp_path.iterdir()) == []
+    assert cache.get_relevant("anything", 1) == []
+    assert (tmp_path / f"{MockConfig.memory_index}.lock").exists()
+
+    cache.add("first")
+    # An existing cache is opened at once.
+    assert list(new_cache().data.texts) == ["first"]
+
+
+def test_add_appends_to_both_files(new_cache) -> None:
+    cache = new_cache()
+    cache.add("first")
+    cache.add("second")
+
+    with open(cache.texts_filename, "rb") as f:
+        lines = f.read().splitlines()
+    assert [orjson.loads(line)["text"] for line in lines] == ["first", "second"]
+    embeddings = np.fromfile(cache.embeddings_filename, dtype=np.float32)
+    embeddings = embeddings.reshape(-1, EMBED_DIM)
+    assert np.array_equal(embeddings[:2], cache.data.embeddings)
+    offsets = np.fromfile(cache.offsets_filename, dtype=np.uint64)
+    assert offsets[:2].tolist() == [0, len(lines[0]) + 1]
+    assert (offsets[2:] == UNUSED_OFFSET).all()
+
+
+def test_capacity_grows_by_doubling(new_cache) -> None:
+    cache = new_cache()
+    for i in range(MIN_CAPACITY + 1):
+        cache.add(f"memory {i}")
+
+    assert count_and_shape(cache) == (MIN_CAPACITY + 1, (MIN_CAPACITY + 1, EMBED_DIM))
+    assert cache._embeddings.capacity == 2 * MIN_CAPACITY
+    assert cache._offsets.capacity == 2 * MIN_CAPACITY
+
+    cache = new_cache()
+    assert count_and_shape(cache) == (MIN_CAPACITY + 1, (MIN_CAPACITY + 1, EMBED_DIM))
+    assert cache.get_relevant("memory 3", 1) == ["memory 3"]
+
+
+def test_embeddings_are_memory_mapped(new_cache) -> None:
+    cache = new_cache()
+    cache.add("first")
+
+    cache = new_cache()
+    assert isinstance(cache.data.embeddings, np.memmap)
+    assert cache.data.texts[0] == "first"
+
+
+def test_offsets_are_rebuilt_when_missing(new_cache) -> None:
+    cache = new_cache()
+    cache.add("first")
+    cache.add("second")
+    cache.data.texts.close()
+    os.remove(cache.offsets_filename)
+
+    cache = new_cache()
+    assert list(cache.data.texts) == ["first", "second"]
+    cache.add("third")
+    assert list(new_cache().data.texts) == ["first", "second", "third"]
+
+
+def test_reload_restores_memories(new_cache) -> None:
+    cache = new_cache()
+    cache.add("first")
+    cache.add("second")
+
+    cache = new_cache()
+    assert count_and_shape(cache) == (2, (2, EMBED_DIM))
+    assert cache.get_relevant("second", 1) == ["second"]
+
+
+def test_reload_drops_unmatched_tail(new_cache) -> None:
+    cache = new_cache()
+    cache.add("first")
+    with open(cache.texts_filename, "ab") as f:
+        f.write(b'{"text": "unfinished')
+
+    cache = new_cache()
+    assert count_and_shape(cache) == (1, (1, EMBED_DIM))
+    cache.add("second")
+    assert list(new_cache().data.texts) == ["first", "second"]
+
+
+def test_legacy_json_is_imported(new_cache) -> None:
+    legacy = {"texts": ["old memory"], "embeddings": [fake_embedding("old memory")]}
+    with open(f"{MockConfig.memory_index}.json", "wb") as f:
+        f.write(orjson.dumps(legacy))
+
+    cache = new_cache()
+    assert cache.get_relevant("old memory", 1) == ["old memory"]
+
+    cache = new_cache()
+    assert count_and_shape(cache) == (1, (1, EMBED_DIM))
+
+
+def test_clear_truncates_files(new_cache) -> None:
+    cache = new_cache()
+    cache.add("first")
+    cache.clear()
+
+    cache = new_cache()
+    assert count_and_shape(cache) == (0, (0, EMBED_DIM))
+
+
+def test_add_many_appends_a_batch(new_cache) -> None:
+    cache = new_cache()
+    result = cache.add_many(["first", "Command Error: skipped", "second"])
+
+    assert result == ["first", "", "second"]
+    assert list(cache.data.texts) == ["first", "second"]
+    assert list(new_cache().data.texts) == ["first", "second"]
+
+
+def test_get_relevant_many_answers_each_query(new_cache) -> None:
+    cache = new_cache()
+    cache.add_many(["first", "second", "third"])
+
+    assert cache.get_relevant_many(["third", "first"], 1) == [["third"], ["first"]]
+
+
+def test_ivf_index_is_built_and_kept_up_to_date(new_cache) -> None:
+    settings = dict(
+        local_ann=True, local_ann_min_rows=50, local_ann_lists=4, local_ann_probe=4
+    )
+    cache = new_cache(**settings)
+    cache.add_many([f"memory {i}" for i in range(49)])
+    assert cache._centroids is None
+
+    cache.add("memory 49")
+    assert cache._centroids.shape == (4, EMBED_DIM)
+    cache.add_many([f"memory {i}" for i in range(50, 60)])
+    assert cache._lists.count == 60
+
+    cache = new_cache(**settings)
+    assert cache._lists.count == 60
+    # Probing every list scores every row, so the results are exact.
+    queries = np.array([fake_embedding(f"memory {i}") for i in (3, 55)])
+    assert [list(rows) for rows in cache._search(queries, 3)] == [
+        list(rows) for rows in cache._search(queries, 3, exact=True)
+    ]
+    assert cache.get_relevant("memory 55", 1) == ["memory 55"]
+
+
+def test_ivf_index_covers_rows_added_while_disabled(new_cache) -> None:
+    settings = dict(
+        local_ann=True, local_ann_min_rows=10, local_ann_lists=2, local_ann_probe=1
+    )
+    cache = new_cache(**settings)
+    cache.add_many([f"memory {i}" for i in range(10)])
+    new_cache().add_many([f"memory {i}" for i in range(10, 15)])
+
+    cache = new_cache(**settings)
+    assert cache._lists.count == 15
+    assert cache._trained_rows == 10
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_embeddings_are_searched(new_cache, dtype) -> None:
+    cache = new_cache(local_embedding_dtype=dtype, local_embedding_rescore=False)
+    cache.add_many([f"memory {i}" for i in range(20)])
+
+    cache = new_cache(local_embedding_dtype=dtype, local_embedding_rescore=False)
+    assert not os.path.exists(cache.embeddings_filename)
+    assert cache.get_relevant("memory 7", 1) == ["memory 7"]
+    stats = cache.get_stats()
+    assert stats["memories"] == 20
+    assert stats["dtype"] == dtype
+    assert stats["embedding_bytes"] < 20 * EMBED_DIM * 4
+    assert stats["bytes_saved"] == 20 * EMBED_DIM * 4 - stats["embedding_bytes"]
+
+
+def test_rescoring_matches_float32_search(new_cache) -> None:
+    cache = new_cache()
+    cache.add_many([f"memory {i}" for i in range(30)])
+    queries = np.array([fake_embedding(f"query {i}") for i in range(5)])
+    expected = [list(rows) for rows in cache._search(queries, 3)]
+
+    cache = new_cache(local_embedding_dtype="int8")
+    assert [list(rows) for rows in cache._search(queries, 3)] == expected
+    assert cache.get_stats()["rescore"]
+    assert cache.get_stats()["recall_at_10"] > 0.5
+
+
+def test_storage_is_converted_between_dtypes(new_cache) -> None:
+    cache = new_cache()
+    cache.add_many(["first", "second"])
+
+    cache = new_cache(local_embedding_dtype="int8", local_embedding_rescore=False)
+    assert not os.path.exists(cache.embeddings_filename)
+    cache.add("third")
+
+    cache = new_cache(local_embedding_dtype="float16", local_embedding_rescore=False)
+    assert not os.path.exists(cache.scales_filename)
+    assert cache.get_relevant("third", 1) == ["third"]
+
+    cache = new_cache()
+    assert count_and_shape(cache) == (3, (3, EMBED_DIM))
+    assert cache.get_relevant("first", 1) == ["first"]
+
+
+def test_get_relevant_scored_applies_min_score(new_cache) -> None:
+    cache = new_cache()
+    cache.add_many(["first", "second", "third"])
+
+    memories = cache.get_relevant_scored("second", 3)
+    assert [memory.text for memory in memories][0] == "second"
+    assert memories[0].score > 0.99
+    assert memories[0].id == "1"
+    assert [memory.score for memory in memories] == sorted(
+        [memory.score for memory in memories], reverse=True
+    )
+    assert [m.text for m in cache.get_relevant_scored("second", 3, 0.5)] == ["second"]
+
+
+def test_get_relevant_scored_mmr_drops_duplicates(new_cache) -> None:
+    cache = new_cache()
+    cache.add_many(["same", "same", "other"])
+
+    plain = cache.get_relevant_scored("same", 2)
+    diverse = cache.get_relevant_scored("same", 2, mmr_lambda=0.3)
+    assert [memory.text for memory in plain] == ["same", "same"]
+    assert [memory.text for memory in diverse] == ["same", "other"]
+
+
+def test_metadata_is_stored_and_returned(new_cache) -> None:
+    cache = new_cache()
+    cache.add("first", {"source": "a.txt", "kind": "file_content", "chunk": 0})
+
+    memory = new_cache().get_relevant_scored("first", 1)[0]
+    assert memory.metadata["source"] == "a.txt"
+    assert memory.metadata["kind"] == "file_content"
+    assert memory.metadata["chunk"] == 0
+    assert memory.metadata["timestamp"] > 0
+    with pytest.raises(ValueError):
+        cache.add("second", {"colour": "blue"})
+
+
+def test_search_is_filtered_on_metadata(new_cache) -> None:
+    cache = new_cache()
+    cache.add_many(
+        ["a0", "a1", "b0", "note"],
+        [
+            {"source": "a", "chunk": 0, "timestamp": 10},
+            {"source": "a", "chunk": 1, "timestamp": 20},
+            {"source": "b", "chunk": 0, "timestamp": 30},
+            None,
+        ],
+    )
+
+    cache = new_cache()
+    assert cache.get_relevant("b0", 1, {"source": "a"}) in (["a0"], ["a1"])
+    assert sorted(cache.get_relevant("a0", 5, {"source": ["a", "b"]})) == [
+        "a0",
+        "a1",
+        "b0",
+    ]
+    assert sorted(cache.get_relevant("a0", 5, {"chunk": 0})) == ["a0", "b0"]
+    assert cache.get_relevant("a0", 5, {"since": 15, "until": 25}) == ["a1"]
+    assert cache.get_relevant("a0", 5, {"source": "missing"}) == []
+    scored = cache.get_relevant_scored("a0", 5, filters={"source": "b"})
+    assert [memory.text for memory in scored] == ["b0"]
+
+
+def test_metadata_is_added_to_old_caches(new_cache) -> None:
+    cache = new_cache()
+    cache.add("first")
+    cache.data.texts.close()
+    del cache
+    Singleton._instances.pop(LocalCache, None)
+    os.remove(f"{MockConfig.memory_index}-metadata.bin")
+
+    cache = new_cache()
+    cache.add("second", {"source": "new"})
+    assert cache.get_relevant("first", 2, {"source": "new"}) == ["second"]
+    assert sorted(cache.get_relevant("first", 2)) == ["first", "second"]
+
+
+def test_duplicates_are_skipped_when_enabled(new_cache) -> None:
+    cache = new_cache(memory_dedup=True)
+    assert cache.add_many(["first", "first", "second"]) == ["first", "", "second"]
+    assert cache.add("first") == ""
+    assert cache.get_stats()["duplicates_skipped"] == 2
+
+    cache = new_cache(memory_dedup=True)
+    assert cache.add("second") == ""
+    assert cache.add("third") == "third"
+    assert list(cache.data.texts) == ["first", "second", "third"]
+
+
+def test_duplicates_are_kept_by_default(new_cache) -> None:
+    cache = new_cache()
+    cache.add_many(["same", "same"])
+    assert list(cache.data.texts) == ["same", "same"]
+    assert cache.get_stats()["duplicates_skipped"] == 0
+
+
+def test_hashes_are_added_to_old_caches(new_cache) -> None:
+    cache = new_cache()
+    cache.add("first")
+    cache.data.texts.close()
+    del cache
+    Singleton._instances.pop(LocalCache, None)
+    os.remove(f"{MockConfig.memory_index}-hashes.bin")
+
+    cache = new_cache(memory_dedup=True)
+    assert cache.add("first") == ""
+    assert list(cache.data.texts) == ["first"]
+
+
+def test_near_duplicates_are_skipped_by_similarity(new_cache) -> None:
+    # Every pair of memories is within a threshold of -1.
+    cache = new_cache(memory_dedup=True, memory_dedup_threshold=-1.0)
+    assert cache.add_many(["first", "second"]) == ["first", ""]
+    assert cache.add("third") == ""
+    assert cache.get_stats()["duplicates_skipped"] == 2
+
+
+def test_duplicates_are_not_found_in_empty_ivf_lists(new_cache, monkeypatch) -> None:
+    cache = new_cache(
+        memory_dedup=True,
+        local_ann=True,
+        local_ann_min_rows=10,
+        local_ann_lists=2,
+        local_ann_probe=1,
+    )
+    cache.add_many([f"memory {i}" for i in range(10)])
+    monkeypatch.setattr(
+        "autogpt.memory.local.probe_candidates",
+        lambda *args: np.array([], dtype=np.int64),
+    )
+    assert cache.add_many(["memory 10", "memory 11"]) == ["memory 10", "memory 11"]
+
+
+def test_least_recently_used_memories_are_evicted(new_cache) -> None:
+    cache = new_cache(local_max_memories=10)
+    cache.add_many([f"memory {i}" for i in range(10)])
+    assert cache.get_relevant("memory 0", 1) == ["memory 0"]
+    cache.get_relevant_scored("memory 1", 1)
+
+    cache.add("memory 10")
+    texts = list(cache.data.texts)
+    assert texts == ["memory 0", "memory 1", *[f"memory {i}" for i in range(4, 11)]]
+    assert cache.get_stats()["evicted"] == 2
+    assert list(new_cache(local_max_memories=10).data.texts) == texts
+    assert cache.get_relevant("memory 10", 1) == ["memory 10"]
+
+
+def test_retrievals_are_recorded_by_the_next_write(new_cache) -> None:
+    cache = new_cache(local_max_memories=10)
+    cache.add_many([f"memory {i}" for i in range(3)])
+    cache.get_relevant("memory 1", 1)
+    cache.get_relevant_scored("memory 1", 1)
+    # Searches hold the shared lock only, so they leave the file alone.
+    assert cache._usage.view["hits"].tolist() == [0, 0, 0]
+
+    cache.add("memory 3")
+    assert cache._usage.view["hits"].tolist() == [0, 2, 0, 0]
+
+    cache.get_relevant("memory 2", 1)
+    cache.clear()
+    cache.add("memory 4")
+    assert cache._usage.view["hits"].tolist() == [0]
+
+
+def test_pending_retrievals_are_summed_per_memory(new_cache) -> None:
+    cache = new_cache(local_max_memories=10)
+    cache.add_many(["first", "second"])
+    for _ in range(50):
+        cache.get_relevant("first", 1)
+
+    assert len(cache._pending_hits) == 1
+    cache.add("third")
+    assert cache._usage.view["hits"].tolist() == [50, 0, 0]
+    assert cache._pending_hits == {}
+
+
+@pytest.mark.parametrize(
+    "policy,kept", [("oldest", ["c", "d", "e"]), ("importance", ["a", "d", "e"])]
+)
+def test_eviction_policies(new_cache, policy, kept) -> None:
+    cache = new_cache(local_max_memories=4, local_eviction_policy=policy)
+    cache.add_many(["a", "b", "c", "d"], [{"timestamp": i} for i in range(4)])
+    cache.get_relevant("a", 1)
+    cache.add("e")
+    assert list(cache.data.texts) == kept
+    with pytest.raises(ValueError):
+        new_cache(local_eviction_policy="random")
+
+
+def test_byte_limit_archives_evicted_memories(new_cache) -> None:
+    cache = new_cache()
+    cache.add("first")
+    row_bytes = cache.get_stats()["stored_bytes"]
+
+    cache = new_cache(local_max_bytes=5 * row_bytes, local_eviction_archive=True)
+    cache.add_many([f"memory {i}" for i in range(5)])
+    assert cache.get_stats()["stored_bytes"] <= 5 * row_bytes
+    with open(cache.archive_filename, "rb") as f:
+        archived = [orjson.loads(line) for line in f]
+    assert archived[0]["text"] == "first"
+    assert np.allclose(archived[0]["embedding"], fake_embedding("first"))
+    assert len(archived) + len(cache.data.texts) == 6
+
+
+def test_interrupted_compaction_is_completed(new_cache) -> None:
+    cache = new_cache(local_max_memories=4)
+    cache.add_many(["first", "second", "third", "fourth"])
+    cache._finish_compaction = lambda: None
+    cache.add("fifth")
+    assert os.path.exists(cache.compaction_filename)
+
+    cache = new_cache(local_max_memories=4)
+    assert not os.path.exists(cache.compaction_filename)
+    assert list(cache.data.texts) == ["third", "fourth", "fifth"]
+    assert cache.get_relevant("fourth", 1) == ["fourth"]
+
+
+def add_from_another_process(prefix: str) -> None:
+    Singleton._instances.pop(LocalCache, None)
+    cache = LocalCache(MockConfig())
+    # Past MIN_CAPACITY, so that the files grow under the other process.
+    for i in range(50):
+        cache.add(f"{prefix} {i}")
+
+
+def test_caches_see_each_others_changes(new_cache) -> None:
+    first = new_cache()
+    second = new_cache()
+    first.add("first")
+    assert second.get_relevant("first", 1) == ["first"]
+
+    second.add_many(["second", "third"], [{"source": "b"}, None])
+    assert first.get_relevant("first", 1, {"source": "b"}) == ["second"]
+    assert first.get_stats()["memories"] == 3
+
+    second.clear()
+    assert first.get_relevant("first", 1) == []
+    first.add("fourth")
+    assert list(second.data.texts) == []
+    assert second.get_relevant("fourth", 1) == ["fourth"]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_processes_add_concurrently(new_cache) -> None:
+    cache = new_cache()
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=add_from_another_process, args=(prefix,))
+        for prefix in ("a", "b")
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    assert cache.get_stats()["memories"] == 100
+    assert sorted(cache.data.texts) == sorted(
+        f"{prefix} {i}" for prefix in ("a", "b") for i in range(50)
+    )
+    assert cache.get_relevant("b 7", 1) == ["b 7"]
+
+
+def test_dimension_comes_from_the_embedding_provider(new_cache, monkeypatch) -> None:
+    provider = HashingEmbeddingProvider(64)
+    monkeypatch.setattr("autogpt.memory.local.get_embedding_provider", lambda: provider)
+    monkeypatch.setattr("autogpt.memory.local.create_embeddings", provider.embed)
+    cache = new_cache()
+    cache.add_many(["the disk is full", "the cat sat on the mat"])
+
+    cache = new_cache()
+    assert count_and_shape(cache) == (2, (2, 64))
+    assert cache.get_relevant("disk full", 1) == ["the disk is full"]
+
+    monkeypatch.setattr(
+        "autogpt.memory.local.get_embedding_provider", OpenAIEmbeddingProvider
+    )
+    with pytest.raises(ValueError):
+        new_cache()
+
+
+def test_async_add_and_get_relevant(new_cache) -> None:
+    cache = new_cache()
+
+    async def add_then_search():
+        await cache.aadd_many(["first", "second"])
+        await cache.aadd("third", {"kind": "note"})
+        return await cache.aget_relevant("third", 1)
+
+    assert asyncio.run(add_then_search()) == ["third"]
+    assert count_and_shape(cache)[0] == 3
+
+
+def test_threads_can_add_while_searching(new_cache) -> None:
+    cache = new_cache()
+    cache.add("seed")
+
+    def add(worker: int) -> None:
+        for i in range(20):
+            cache.add(f"worker {worker} note {i}")
+
+    threads = [threading.Thread(target=add, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        assert cache.get_relevant("seed", 1) == ["seed"]
+    for thread in threads:
+        thread.join()
+
+    assert count_and_shape(cache)[0] == 81
+    assert len(set(cache.data.texts)) == 81
@@ -0,0 +1,139 @@
+"""Unit tests for exporting and importing memories with their embeddings"""
+import hashlib
+
+import numpy as np
+import pytest
+
+from autogpt.config.singleton import Singleton
+from autogpt.llm_utils import HashingEmbeddingProvider, OpenAIEmbeddingProvider
+from autogpt.memory.local import LocalCache
+from autogpt.memory.transfer import export_memory, import_memory, read_shard
+
+EMBED_DIM = OpenAIEmbeddingProvider.dimension
+
+
+def fake_embedding(text: str) -> list:
+    """A deterministic unit vector derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBED_DIM)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class MockConfig:
+    memory_index = "test-index"
+    local_ann = False
+    local_ann_min_rows = 10000
+    local_ann_lists = 0
+    local_ann_probe = 16
+    local_embedding_dtype = "float32"
+    local_embedding_rescore = True
+    memory_dedup = False
+    memory_dedup_threshold = 0.98
+    local_max_memories = 0
+    local_max_bytes = 0
+    local_eviction_policy = "lru"
+    local_eviction_archive = False
+
+
+@pytest.fixture
+def new_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        "autogpt.memory.local.create_embeddings",
+        lambda texts: [fake_embedding(text) for text in texts],
+    )
+    for module in ("local", "transfer"):
+        monkeypatch.setattr(
+            f"autogpt.memory.{module}.get_embedding_provider", OpenAIEmbeddingProvider
+        )
+
+    def _new_cache(**settings):
+        Singleton._instances.pop(LocalCache, None)
+        cfg = MockConfig()
+        cfg.__dict__.update(settings)
+        return LocalCache(cfg)
+
+    yield _new_cache
+    Singleton._instances.pop(LocalCache, None)
+
+
+def test_export_and_import_round_trip(new_cache, monkeypatch) -> None:
+    source = new_cache()
+    texts = [f"note {i}" for i in range(25)]
+    source.add_many(texts, [{"kind": "note", "chunk": i} for i in range(25)])
+    assert export_memory(source, "export", batch_size=10) == 25
+
+    ids, shard_texts, metadata, embeddings = read_shard("export/shard-00002.npz")
+    assert ids == [str(i) for i in range(20, 25)]
+    assert shard_texts == texts[20:]
+    assert metadata[0]["chunk"] == 20
+    assert embeddings.dtype == np.float32 and embeddings.shape == (5, EMBED_DIM)
+
+    def no_embeddings(texts):
+        raise AssertionError("imports must not embed anything")
+
+    monkeypatch.setattr("autogpt.memory.local.create_embeddings", no_embeddings)
+    target = new_cache(memory_index="target", memory_dedup=True)
+    assert import_memory(target, "export", batch_size=7) == 25
+    assert list(target.data.texts) == texts
+    assert np.array_equal(target.data.embeddings, source.data.embeddings)
+    # The metadata, timestamps included, are kept.
+    assert target.data.texts.record(3) == source.data.texts.record(3)
+    # Exact duplicates are skipped when deduplication is enabled.
+    assert import_memory(target, "export") == 0
+
+
+def test_import_refuses_another_embedding_provider(new_cache, monkeypatch) -> None:
+    cache = new_cache()
+    cache.add("note")
+    export_memory(cache, "export")
+
+    monkeypatch.setattr(
+        "autogpt.memory.transfer.get_embedding_provider",
+        lambda: HashingEmbeddingProvider(64),
+    )
+    with pytest.raises(ValueError, match="embedded with text-embedding-ada-002"):
+        import_memory(cache, "export")
+
+
+def test_export_does_not_wipe_redis_with_the_default_config(
+    tmp_path, monkeypatch, mocker
+) -> None:
+    redismem = pytest.importorskip("autogpt.memory.redismem")
+    import memory_transfer
+
+    client = mocker.MagicMock()
+    client.ft.return_value.info.return_value = {"attributes": [], "num_docs": 1}
+    client.get.return_value = b"1"
+    client.scan_iter.return_value = iter([b"test-index:0"])
+    client.pipeline.return_value.execute.return_value = [
+        {
+            b"data": b"note",
+            b"kind": b"note",
+            b"embedding": redismem.vector_to_bytes(fake_embedding("note"), "FLOAT32"),
+        }
+    ]
+    mocker.patch("autogpt.memory.redismem.redis.ConnectionPool")
+    mocker.patch("autogpt.memory.redismem.redis.Redis", return_value=client)
+    monkeypatch.setattr(
+        "autogpt.memory.transfer.get_embedding_provider", OpenAIEmbeddingProvider
+    )
+    monkeypatch.setattr(memory_transfer.cfg, "memory_index", "test-index")
+    # The default, which wipes the agent's memory on start.
+    monkeypatch.setattr(memory_transfer.cfg, "wipe_redis_on_start", True)
+    export = str(tmp_path / "export")
+    monkeypatch.setattr(
+        "sys.argv", ["memory_transfer.py", "export", export, "--backend", "redis"]
+    )
+    Singleton._instances.pop(redismem.RedisMemory, None)
+    try:
+        memory_transfer.main()
+    finally:
+        Singleton._instances.pop(redismem.RedisMemory, None)
+
+    client.ft.return_value.dropindex.assert_not_called()
+    client.delete.assert_not_called()
+    client.unlink.assert_not_called()
+    _, texts, metadata, _ = read_shard(f"{export}/shard-00000.npz")
+    assert texts == ["note"]
+    assert metadata[0]["kind"] == "note"
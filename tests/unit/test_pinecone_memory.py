@@ -0,0 +1,130 @@
+"""Unit tests for the ids, namespaces and upserts of the Pinecone memory"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from autogpt.config.ai_config import AIConfig
+from autogpt.config.singleton import Singleton
+from autogpt.memory.pinecone import (
+    QUERY_VALUES_LIMIT,
+    UPSERT_BATCH_SIZE,
+    PineconeMemory,
+    vector_id,
+)
+
+
+class MockConfig:
+    pinecone_api_key = "key"
+    pinecone_region = "region"
+    pinecone_namespace = ""
+    memory_index = "agent-1"
+    ai_settings_file = "no-ai-settings.yaml"
+    memory_dedup = False
+    memory_dedup_threshold = 0.98
+
+
+@pytest.fixture
+def index(mocker):
+    mocker.patch("autogpt.memory.pinecone.pinecone.init")
+    mocker.patch("autogpt.memory.pinecone.pinecone.whoami")
+    mocker.patch(
+        "autogpt.memory.pinecone.pinecone.list_indexes", return_value=["auto-gpt"]
+    )
+    index = MagicMock()
+    mocker.patch("autogpt.memory.pinecone.pinecone.Index", return_value=index)
+    mocker.patch(
+        "autogpt.memory.pinecone.create_embeddings",
+        lambda texts: [[0.1, 0.2] for _ in texts],
+    )
+    Singleton._instances.pop(PineconeMemory, None)
+    yield index
+    Singleton._instances.pop(PineconeMemory, None)
+
+
+def test_ids_are_derived_from_the_texts(index) -> None:
+    memory = PineconeMemory(MockConfig())
+    memory.add("first")
+    Singleton._instances.pop(PineconeMemory, None)
+    PineconeMemory(MockConfig()).add("first")
+
+    first, second = index.upsert.call_args_list
+    assert first.args[0][0][0] == second.args[0][0][0] == vector_id("first")
+    assert first.kwargs["namespace"] == "agent-1"
+
+
+def test_upserts_are_batched(index) -> None:
+    memory = PineconeMemory(MockConfig())
+    memory.add_many([f"note {i}" for i in range(2 * UPSERT_BATCH_SIZE + 1)])
+
+    sizes = [len(call.args[0]) for call in index.upsert.call_args_list]
+    assert sizes == [UPSERT_BATCH_SIZE, UPSERT_BATCH_SIZE, 1]
+    assert all(call.kwargs["async_req"] for call in index.upsert.call_args_list)
+
+
+def test_clear_only_deletes_the_namespace(index) -> None:
+    cfg = MockConfig()
+    cfg.pinecone_namespace = "session-2"
+    PineconeMemory(cfg).clear()
+
+    index.delete.assert_called_once_with(delete_all=True, namespace="session-2")
+
+
+def test_duplicates_are_found_with_one_embedding_request(index, mocker) -> None:
+    embeddings = {"first": [1.0, 0.0], "copy": [1.0, 0.0], "stored": [0.0, 1.0]}
+    create_embeddings = mocker.patch(
+        "autogpt.memory.pinecone.create_embeddings",
+        side_effect=lambda texts: [embeddings[text] for text in texts],
+    )
+    index.query.side_effect = lambda vector, **kwargs: MagicMock(
+        **{"get.return_value.matches": [MagicMock(score=vector[1])]}
+    )
+    cfg = MockConfig()
+    cfg.memory_dedup = True
+    memory = PineconeMemory(cfg)
+
+    messages = memory.add_many(["first", "copy", "stored"])
+
+    create_embeddings.assert_called_once_with(["first", "copy", "stored"])
+    assert all(call.kwargs["async_req"] for call in index.query.call_args_list)
+    assert [bool(message) for message in messages] == [True, False, False]
+    assert memory.duplicates_skipped == 2
+
+
+def test_namespace_defaults_to_one_per_agent(index, tmp_path) -> None:
+    cfg = MockConfig()
+    cfg.ai_settings_file = str(tmp_path / "ai_settings.yaml")
+    memory = PineconeMemory(cfg)
+    # Named once the memory is made, as the agent is.
+    AIConfig("Entrepreneur GPT", "a role", []).save(cfg.ai_settings_file)
+
+    memory.add("first")
+
+    assert index.upsert.call_args.kwargs["namespace"] == "agent-1-entrepreneur-gpt"
+
+
+def test_export_warns_about_the_vectors_left_out(index, mocker) -> None:
+    matches = [
+        MagicMock(id=str(i), metadata={"raw_text": f"note {i}", "timestamp": 1.0})
+        for i in range(QUERY_VALUES_LIMIT)
+    ]
+    for match in matches:
+        match.values = [1.0, 0.0]
+
+    # All share a timestamp, so the range cannot be halved far enough.
+    def query(*args, filter, **kwargs):
+        timestamp = filter["timestamp"]
+        in_range = timestamp["$gte"] <= 1.0 < timestamp["$lt"]
+        return MagicMock(matches=matches if in_range else [])
+
+    index.query.side_effect = query
+    index.describe_index_stats.return_value.to_dict.return_value = {
+        "namespaces": {"agent-1": {"vector_count": QUERY_VALUES_LIMIT + 5}}
+    }
+    warn = mocker.patch("autogpt.memory.pinecone.logger.warn")
+
+    batches = list(PineconeMemory(MockConfig()).export_batches())
+
+    assert sum(len(ids) for ids, *_ in batches) == QUERY_VALUES_LIMIT
+    assert f"Exported {QUERY_VALUES_LIMIT} of the {QUERY_VALUES_LIMIT + 5}" in (
+        warn.call_args.args[0]
+    )
@@ -0,0 +1,32 @@
+"""Unit tests for the memory ranking helpers"""
+import numpy as np
+
+from autogpt.memory.ranking import (
+    maximal_marginal_relevance,
+    reciprocal_rank_fusion,
+    top_k,
+)
+
+
+def test_top_k_returns_the_best_scores_first() -> None:
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [0.8, 0.2, 0.6, 0.4]])
+
+    assert top_k(scores, 2).tolist() == [[1, 3], [0, 2]]
+    assert top_k(scores[0], 10).tolist() == [1, 3, 2, 0]
+    assert top_k(scores[0], 0).tolist() == []
+
+
+def test_mmr_skips_near_duplicates() -> None:
+    vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]])
+    scores = np.array([0.9, 0.89, 0.5])
+
+    assert maximal_marginal_relevance(scores, vectors, 2, 1.0) == [0, 1]
+    assert maximal_marginal_relevance(scores, vectors, 2, 0.5) == [0, 2]
+
+
+def test_reciprocal_rank_fusion_favours_items_ranked_by_both() -> None:
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d", "b"]], k=60)
+
+    assert fused[:2] == ["c", "b"]
+    assert sorted(fused) == ["a", "b", "c", "d"]
+    assert reciprocal_rank_fusion([["a"], ["b"]]) == ["a", "b"]
@@ -0,0 +1,245 @@
+"""Unit tests for the Redis memory, with a mocked client"""
+import threading
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+redismem = pytest.importorskip("autogpt.memory.redismem")
+
+from autogpt.config.singleton import Singleton
+from autogpt.llm_utils import OpenAIEmbeddingProvider
+from autogpt.memory.redismem import (
+    ID_BLOCK_SIZE,
+    RedisMemory,
+    attribute_options,
+    filter_query,
+    vector_attributes,
+    vector_from_bytes,
+    vector_to_bytes,
+)
+
+
+class MockConfig:
+    redis_host = "localhost"
+    redis_port = "6379"
+    redis_password = ""
+    redis_max_connections = 0
+    redis_write_buffer = 0
+    redis_index_algorithm = "HNSW"
+    redis_vector_type = "FLOAT32"
+    redis_hnsw_m = 16
+    redis_hnsw_ef_construction = 200
+    redis_hnsw_ef_runtime = 10
+    wipe_redis_on_start = False
+    memory_index = "agent"
+    memory_dedup = False
+    memory_dedup_threshold = 0.98
+
+
+def index_info(num_docs: int, **options) -> dict:
+    """An FT.INFO reply of an index made with the default settings."""
+    options = {
+        "algorithm": "HNSW",
+        "data_type": "FLOAT32",
+        **{
+            key.lower(): value
+            for key, value in vector_attributes(
+                OpenAIEmbeddingProvider.dimension,
+                ef_construction=200,
+                ef_runtime=10,
+            ).items()
+        },
+        **options,
+    }
+    embedding = ["identifier", "embedding", "type", "VECTOR"]
+    for key, value in options.items():
+        embedding += [key, value]
+    return {
+        "attributes": [embedding]
+        + [
+            ["identifier", field, "type", "TAG"]
+            for field in ("source", "kind", "session")
+        ]
+        + [
+            ["identifier", field, "type", "NUMERIC"] for field in ("chunk", "timestamp")
+        ],
+        "num_docs": num_docs,
+    }
+
+
+@pytest.fixture
+def client(mocker):
+    client = MagicMock()
+    client.ft.return_value.info.return_value = index_info(0)
+    client.get.return_value = None
+    mocker.patch("autogpt.memory.redismem.redis.ConnectionPool")
+    mocker.patch("autogpt.memory.redismem.redis.Redis", return_value=client)
+    mocker.patch("autogpt.memory.redismem.atexit.register")
+    mocker.patch(
+        "autogpt.memory.redismem.get_embedding_provider", OpenAIEmbeddingProvider
+    )
+    Singleton._instances.pop(RedisMemory, None)
+    yield client
+    Singleton._instances.pop(RedisMemory, None)
+
+
+def test_id_counter_behind_the_index_is_moved_past_its_ids(client) -> None:
+    client.ft.return_value.info.return_value = index_info(3)
+    client.get.return_value = b"1"
+    client.scan_iter.return_value = iter([b"agent:0", b"agent:7", b"agent:2"])
+
+    RedisMemory(MockConfig())
+
+    client.incrby.assert_called_once_with("agent-vec_num", 7)
+
+
+def test_id_counter_ahead_of_the_index_is_kept(client) -> None:
+    client.ft.return_value.info.return_value = index_info(3)
+    client.get.return_value = b"64"
+
+    RedisMemory(MockConfig())
+
+    client.scan_iter.assert_not_called()
+    client.incrby.assert_not_called()
+    client.ft.return_value.dropindex.assert_not_called()
+
+
+def test_changing_ef_runtime_keeps_the_index(client) -> None:
+    cfg = MockConfig()
+    cfg.redis_hnsw_ef_runtime = 50
+    RedisMemory(cfg)
+    client.ft.return_value.dropindex.assert_not_called()
+
+    cfg.redis_hnsw_ef_construction = 400
+    Singleton._instances.pop(RedisMemory, None)
+    RedisMemory(cfg)
+    client.ft.return_value.dropindex.assert_called_once_with(delete_documents=False)
+
+
+@pytest.mark.parametrize(
+    "algorithm, ef_runtime, clause",
+    [
+        ("HNSW", None, "$vector EF_RUNTIME 10 AS"),
+        ("HNSW", 80, "$vector EF_RUNTIME 80 AS"),
+        ("FLAT", 80, "$vector AS"),
+    ],
+)
+def test_knn_query_sets_ef_runtime_on_hnsw(
+    client, algorithm, ef_runtime, clause
+) -> None:
+    cfg = MockConfig()
+    cfg.redis_index_algorithm = algorithm
+    client.ft.return_value.info.return_value = index_info(0, algorithm=algorithm)
+    memory = RedisMemory(cfg)
+
+    query, params = memory._knn_query([0.5, 0.25], 3, {}, ef_runtime)
+
+    assert query.query_string() == f"*=>[KNN 3 @embedding {clause} vector_score]"
+    assert params == {"vector": redismem.vector_to_bytes([0.5, 0.25], "FLOAT32")}
+
+
+def test_filter_query_escapes_tags() -> None:
+    query = filter_query({"source": ["web page", "a-b"], "chunk": [1, 2], "since": 5.0})
+    assert query == (
+        r"(@source:{web\ page | a\-b} (@chunk:[1 1] | @chunk:[2 2])"
+        " @timestamp:[5.0 +inf])"
+    )
+    assert filter_query({}) == "*"
+
+
+def test_ids_are_reserved_in_blocks(client) -> None:
+    client.incrby.side_effect = [ID_BLOCK_SIZE, 2 * ID_BLOCK_SIZE + 100]
+    memory = RedisMemory(MockConfig())
+
+    assert memory._reserve_ids(10) == 0
+    assert memory._reserve_ids(ID_BLOCK_SIZE - 10) == 10
+    assert client.incrby.call_count == 1
+    # A block too small for the request is made as large as it.
+    assert memory._reserve_ids(ID_BLOCK_SIZE + 100) == ID_BLOCK_SIZE
+    client.incrby.assert_called_with("agent-vec_num", ID_BLOCK_SIZE + 100)
+
+
+def test_buffered_writes_go_out_in_one_pipeline(client, mocker) -> None:
+    mocker.patch(
+        "autogpt.memory.redismem.create_embeddings",
+        lambda texts: [[0.5, 0.25] for _ in texts],
+    )
+    client.incrby.return_value = ID_BLOCK_SIZE
+    cfg = MockConfig()
+    cfg.redis_write_buffer = 2
+    memory = RedisMemory(cfg)
+
+    memory.add_many(["first", "Command Error: no"])
+    client.pipeline.assert_not_called()
+    memory.add("second")
+
+    pipe = client.pipeline.return_value
+    keys = [call.args[0] for call in pipe.hset.call_args_list]
+    assert keys == ["agent:0", "agent:1"]
+    pipe.execute.assert_called_once()
+
+
+def test_buffered_writes_from_many_threads_keep_every_id(client, mocker) -> None:
+    mocker.patch(
+        "autogpt.memory.redismem.create_embeddings",
+        lambda texts: [[0.5, 0.25] for _ in texts],
+    )
+    client.incrby.side_effect = lambda key, size: (
+        client.incrby.call_count * ID_BLOCK_SIZE
+    )
+    cfg = MockConfig()
+    cfg.redis_write_buffer = 3
+    memory = RedisMemory(cfg)
+
+    def add(thread: int) -> None:
+        for i in range(100):
+            memory.add(f"note {thread} {i}")
+
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    memory.flush()
+
+    keys = [call.args[0] for call in client.pipeline.return_value.hset.call_args_list]
+    assert len(keys) == 400
+    assert len(set(keys)) == 400
+
+
+@pytest.mark.parametrize(
+    "vector_type, itemsize, tolerance",
+    [("FLOAT32", 4, 0), ("FLOAT64", 8, 0), ("FLOAT16", 2, 1e-3), ("BFLOAT16", 2, 1e-2)],
+)
+def test_vectors_round_trip_through_bytes(vector_type, itemsize, tolerance) -> None:
+    vector = np.random.default_rng(0).standard_normal(64).astype(np.float32)
+    blob = vector_to_bytes(vector, vector_type)
+    assert len(blob) == 64 * itemsize
+
+    decoded = vector_from_bytes(blob, vector_type)
+    assert decoded.dtype == np.float32
+    assert np.allclose(decoded, vector, rtol=tolerance, atol=0)
+
+
+def test_bfloat16_rounds_to_nearest_even() -> None:
+    # Both lie halfway between two bfloat16 values, whose steps are 2**-7 here.
+    vector = np.array([1 + 2**-8, 1 + 2**-7 + 2**-8, -2.5], dtype=np.float32)
+    decoded = vector_from_bytes(vector_to_bytes(vector, "BFLOAT16"), "BFLOAT16")
+    assert decoded.tolist() == [1.0, 1 + 2**-6, -2.5]
+
+
+def test_attribute_options_are_read_from_ft_info() -> None:
+    info = {
+        "attributes": [
+            [b"identifier", b"data", b"attribute", b"data", b"type", b"TEXT"],
+            [b"identifier", b"embedding", b"type", b"VECTOR", b"DIM", 1536],
+        ]
+    }
+    assert attribute_options(info, "embedding") == {
+        "identifier": "embedding",
+        "type": "VECTOR",
+        "dim": 1536,
+    }
+    assert attribute_options(info, "source") is None
+    assert attribute_options({}, "embedding") is None
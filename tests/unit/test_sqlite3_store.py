@@ -0,0 +1,85 @@
+"""Unit tests for the sqlite permanent memory"""
+import importlib
+import sys
+import threading
+
+from autogpt.permanent_memory.sqlite3_store import MemoryDB
+
+
+def test_importing_does_not_open_a_database(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    sys.modules.pop("autogpt.permanent_memory.sqlite3_store", None)
+    store = importlib.import_module("autogpt.permanent_memory.sqlite3_store")
+    assert not (tmp_path / "mem.sqlite3").exists()
+
+    store.permanent_memory.insert("remembered")
+    assert (tmp_path / "mem.sqlite3").exists()
+    assert store.get_permanent_memory() is store.permanent_memory
+    store.permanent_memory.quit()
+
+
+def test_database_is_in_wal_mode(tmp_path) -> None:
+    db = MemoryDB(str(tmp_path / "mem.sqlite3"))
+    assert db.get_cnx().execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    db.quit()
+
+
+def test_keys_are_counted_across_inserts_and_sessions(tmp_path) -> None:
+    path = str(tmp_path / "mem.sqlite3")
+    db = MemoryDB(path)
+    db.insert("first")
+    db.insert_many(["second", "third"])
+    assert db.get_next_key() == 3
+    rows = db.get_cnx().execute("SELECT key, block FROM text;").fetchall()
+    assert sorted(rows) == [(0, "first"), (1, "second"), (2, "third")]
+    db.quit()
+
+    db = MemoryDB(path)
+    assert db.session_id == 2
+    assert db.get_next_key() == 0
+    db.session_id = 1
+    assert db.get_next_key() == 3
+    db.quit()
+
+
+def test_overwrite_and_delete_memory(tmp_path) -> None:
+    db = MemoryDB(str(tmp_path / "mem.sqlite3"))
+    db.insert_many(["first", "second"])
+    db.overwrite(0, "replaced")
+    db.delete_memory(1)
+    assert db.get_session() == ["replaced"]
+    assert db.count() == 1
+    db.quit()
+
+
+def test_quotes_are_not_part_of_the_statement(tmp_path) -> None:
+    db = MemoryDB(str(tmp_path / "mem.sqlite3"))
+    db.insert_many(["it's the user's file", 'a "quoted" word'])
+    assert db.search('"user\'s"') == ["it's the user's file"]
+    assert db.search('"quoted"') == ['a "quoted" word']
+    assert db.search_ranked('"it\'s"', 5)[0][0] == "it's the user's file"
+    db.quit()
+
+
+def test_threads_can_insert_and_search(tmp_path) -> None:
+    db = MemoryDB(str(tmp_path / "mem.sqlite3"))
+    errors = []
+
+    def insert(thread):
+        try:
+            for i in range(50):
+                db.insert(f"thread{thread} memory{i}")
+                db.search(f"thread{thread}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=insert, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert db.count() == 200
+    assert db.get_next_key() == 200
+    db.quit()
@@ -0,0 +1,183 @@
+"""Unit tests for the hot tier in front of a remote memory"""
+import hashlib
+
+import numpy as np
+import pytest
+
+from autogpt.config.singleton import Singleton
+from autogpt.memory.base import MemoryProviderSingleton, ScoredMemory
+from autogpt.memory.tiered import HotTier, TieredMemory
+
+
+def fake_embedding(text: str) -> np.ndarray:
+    """A deterministic unit vector derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+    vector = np.random.default_rng(seed).standard_normal(64)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeRemoteMemory(MemoryProviderSingleton):
+    def __init__(self, cfg) -> None:
+        self.texts = []
+        self.searches = 0
+        self.query_embeddings = []
+        self.writes = 0
+
+    def add(self, data, metadata=None):
+        return self.add_many([data], [metadata])[0]
+
+    def add_many(self, data, metadata=None):
+        raise AssertionError("the tiered memory embeds the data itself")
+
+    def add_embedded(self, data, embeddings, metadata=None):
+        self.writes += 1
+        self.texts.extend(data)
+        return list(data)
+
+    def get(self, data):
+        return self.get_relevant(data, 1)
+
+    def clear(self):
+        self.texts = []
+        return "Obliviated"
+
+    def get_relevant(self, data, num_relevant=5, filters=None):
+        return [m.text for m in self.get_relevant_scored(data, num_relevant)]
+
+    def get_stats(self):
+        return len(self.texts)
+
+    def _get_scored_candidates(
+        self, data, num_candidates, with_embeddings, filters, embedding=None
+    ):
+        self.searches += 1
+        self.query_embeddings.append(embedding)
+        query = fake_embedding(data) if embedding is None else embedding
+        memories = [
+            ScoredMemory(
+                text=text,
+                score=float(np.dot(query, fake_embedding(text))),
+                embedding=fake_embedding(text),
+            )
+            for text in self.texts
+        ]
+        memories.sort(key=lambda memory: memory.score, reverse=True)
+        return memories[:num_candidates]
+
+
+class MockConfig:
+    tiered_hot_size = 100
+    tiered_hot_min_score = 0.9
+    tiered_write_behind = False
+    memory_dedup = False
+
+
+@pytest.fixture
+def new_memory(monkeypatch):
+    monkeypatch.setattr(
+        "autogpt.memory.tiered.create_embeddings",
+        lambda texts: [fake_embedding(text) for text in texts],
+    )
+    monkeypatch.setattr("autogpt.memory.tiered.create_embedding", fake_embedding)
+
+    def _new_memory(**settings):
+        for cls in (TieredMemory, FakeRemoteMemory):
+            Singleton._instances.pop(cls, None)
+        cfg = MockConfig()
+        cfg.__dict__.update(settings)
+        return TieredMemory(cfg, FakeRemoteMemory(cfg))
+
+    yield _new_memory
+    for cls in (TieredMemory, FakeRemoteMemory):
+        Singleton._instances.pop(cls, None)
+
+
+def test_confident_searches_are_answered_from_the_hot_tier(new_memory) -> None:
+    memory = new_memory()
+    memory.add_many([f"note {i}" for i in range(10)])
+
+    assert memory.get_relevant("note 3", 1) == ["note 3"]
+    assert memory.remote.searches == 0
+    # Random vectors are far apart, so the second best is not confident.
+    assert memory.get_relevant("note 3", 2)[0] == "note 3"
+    assert memory.remote.searches == 1
+    assert memory.get_stats()["hot_answers"] == 1
+
+
+def test_remote_results_are_promoted_into_the_hot_tier(new_memory) -> None:
+    memory = new_memory()
+    memory.remote.add_embedded(["stored before"], [fake_embedding("stored before")])
+
+    assert memory.get_relevant("stored before", 1) == ["stored before"]
+    assert memory.remote.searches == 1
+    assert "stored before" in memory.hot
+    assert memory.get_relevant("stored before", 1) == ["stored before"]
+    assert memory.remote.searches == 1
+
+
+def test_writes_go_to_the_remote_memory_behind(new_memory) -> None:
+    memory = new_memory(tiered_write_behind=True, memory_dedup=True)
+    for i in range(20):
+        memory.add(f"note {i}")
+    memory.add("note 0")
+
+    # Searches see the memories still being written.
+    assert memory.get_relevant("note 7", 1) == ["note 7"]
+    memory.flush()
+    assert sorted(memory.remote.texts) == sorted(f"note {i}" for i in range(20))
+    assert memory.remote.writes <= 20
+    stats = memory.get_stats()
+    assert stats["pending_writes"] == 0
+    assert stats["duplicates_skipped"] == 1
+
+
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_data_is_embedded_once(new_memory, monkeypatch, write_behind) -> None:
+    embedded = []
+
+    def create_embeddings(texts):
+        embedded.extend(texts)
+        return [fake_embedding(text) for text in texts]
+
+    monkeypatch.setattr("autogpt.memory.tiered.create_embeddings", create_embeddings)
+    memory = new_memory(tiered_write_behind=write_behind)
+    memory.add_many(["first", "second"])
+    memory.add("third")
+    memory.flush()
+
+    assert embedded == ["first", "second", "third"]
+    assert memory.remote.texts == embedded
+    assert memory.get_relevant("third", 1) == ["third"]
+
+
+def test_queries_are_embedded_once_for_both_tiers(new_memory, monkeypatch) -> None:
+    queries = []
+
+    def create_embedding(text):
+        queries.append(text)
+        return fake_embedding(text)
+
+    monkeypatch.setattr("autogpt.memory.tiered.create_embedding", create_embedding)
+    memory = new_memory()
+    memory.add_many([f"note {i}" for i in range(10)])
+
+    memory.get_relevant("note 3", 2)
+    assert memory.remote.searches == 1
+    assert queries == ["note 3"]
+    np.testing.assert_array_equal(
+        memory.remote.query_embeddings[0], fake_embedding("note 3")
+    )
+
+
+def test_hot_tier_keeps_the_memories_retrieved_often() -> None:
+    hot = HotTier(4)
+    texts = [f"note {i}" for i in range(4)]
+    hot.add(texts, [fake_embedding(text) for text in texts], [{} for _ in texts])
+    hot.record_hits(["note 0"])
+    hot.record_hits(["note 3"])
+
+    hot.add(["note 4"], [fake_embedding("note 4")], [{}])
+    assert len(hot) == 4
+    assert "note 1" not in hot
+    assert "note 0" in hot and "note 4" in hot
+    assert [m.text for m in hot.search(fake_embedding("note 2"), 1)] == ["note 2"]
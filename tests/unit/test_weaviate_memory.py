@@ -0,0 +1,119 @@
+"""Unit tests for the batching and bulk queries of the Weaviate memory"""
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip("weaviate")
+
+from autogpt.config.singleton import Singleton
+from autogpt.memory.weaviate import QUERY_BATCH_SIZE, WeaviateMemory
+
+
+class MockConfig:
+    weaviate_host = "127.0.0.1"
+    weaviate_port = "8080"
+    weaviate_protocol = "http"
+    weaviate_username = None
+    weaviate_password = None
+    weaviate_api_key = None
+    use_weaviate_embedded = False
+    weaviate_batch_size = 100
+    weaviate_batch_dynamic = True
+    weaviate_batch_workers = 4
+    weaviate_certainty = 0.7
+    weaviate_distance = None
+    memory_index = "agent"
+    memory_dedup = False
+    memory_dedup_threshold = 0.98
+
+
+@pytest.fixture
+def client(mocker):
+    client = MagicMock()
+    mocker.patch("autogpt.memory.weaviate.Client", return_value=client)
+    mocker.patch("autogpt.memory.weaviate.atexit.register")
+    mocker.patch(
+        "autogpt.memory.weaviate.create_embeddings",
+        lambda texts: [[0.1, 0.2] for _ in texts],
+    )
+    mocker.patch("autogpt.memory.weaviate.create_embedding", return_value=[0.1, 0.2])
+    Singleton._instances.pop(WeaviateMemory, None)
+    yield client
+    Singleton._instances.pop(WeaviateMemory, None)
+
+
+def test_adds_share_one_batch_flushed_before_reads(client) -> None:
+    memory = WeaviateMemory(MockConfig())
+    client.batch.configure.assert_called_once_with(
+        batch_size=100,
+        dynamic=True,
+        num_workers=4,
+        callback=memory._check_batch_results,
+    )
+
+    memory.add("first")
+    memory.add_many(["second", "third"])
+    assert client.batch.add_data_object.call_count == 3
+    client.batch.flush.assert_not_called()
+
+    memory.get_relevant("first")
+    memory.get_relevant("second")
+    client.batch.flush.assert_called_once()
+
+
+def test_get_relevant_many_batches_the_queries(client) -> None:
+    cfg = MockConfig()
+    cfg.weaviate_distance = 0.3
+    memory = WeaviateMemory(cfg)
+    client.query.multi_get.return_value.do.side_effect = lambda: {
+        "data": {
+            "Get": {
+                f"query{i}": [{"raw_text": f"result {i}"}]
+                for i in range(QUERY_BATCH_SIZE)
+            }
+        }
+    }
+
+    results = memory.get_relevant_many(
+        [f"query {i}" for i in range(QUERY_BATCH_SIZE + 1)], 3
+    )
+
+    assert client.query.multi_get.call_count == 2
+    assert len(client.query.multi_get.call_args_list[0].args[0]) == QUERY_BATCH_SIZE
+    assert results[QUERY_BATCH_SIZE] == ["result 0"]
+    near_vector = client.query.get.return_value.with_near_vector.call_args.args[0]
+    assert near_vector == {"vector": [0.1, 0.2], "distance": 0.3}
+
+
+def test_scored_searches_keep_the_certainty(client) -> None:
+    memory = WeaviateMemory(MockConfig())
+    query = client.query.get.return_value
+    near = query.with_near_vector.return_value
+    near.with_additional.return_value.with_limit.return_value.do.return_value = {
+        "data": {
+            "Get": {
+                "Agent": [
+                    {"raw_text": "first", "_additional": {"id": "1", "certainty": 0.9}}
+                ]
+            }
+        }
+    }
+
+    memories = memory.get_relevant_scored("first", 1)
+
+    query.with_near_vector.assert_called_once_with(
+        {"vector": [0.1, 0.2], "certainty": 0.7}
+    )
+    assert [(m.text, round(m.score, 2)) for m in memories] == [("first", 0.8)]
+
+
+def test_clear_only_deletes_the_class_of_the_memory(client) -> None:
+    memory = WeaviateMemory(MockConfig())
+    client.schema.get.return_value = {
+        "classes": [{"class": "Agent"}, {"class": "Other"}]
+    }
+
+    memory.clear()
+
+    client.schema.delete_all.assert_not_called()
+    client.schema.delete_class.assert_called_once_with("Agent")